@@ -4,18 +4,28 @@ import os
 import re
 from core.immune_system import ImmuneSystem
 from core.dictionary import FrenchDictionary
+from core.gazetteer import Gazetteer
 
 class AntibodyLearner:
     """
     Analyzes Arena matches to automatically update the Immune System.
     - Learns new Antibodies (Blacklist) from Hallucinations.
     - Learns new WhiteList entries from successful Inertia defenses.
+    [Gazetteer] A confirmed named entity (any series) is never blacklisted: names are missing
+    from the dictionary, yet they are not hallucinations.
     """
     
-    def __init__(self):
+    def __init__(self, gazetteer: Gazetteer = None):
         self.immune_system = ImmuneSystem()
         self.dictionary = FrenchDictionary()
         self.whitelist_path = "data/knowledge/whitelist.json"
+        self.gazetteer = gazetteer or Gazetteer()
+
+    def _is_toxic(self, word: str) -> bool:
+        """Added word unknown to the dictionary, and not a confirmed named entity."""
+        if self.dictionary.validate(word):
+            return False
+        return self.gazetteer.lookup_any_series(word) is None
         
     def learn_from_failures(self, trap: str, defense: str):
         """
@@ -31,7 +41,7 @@ class AntibodyLearner:
         for word in added_words:
             if len(word) > 3:
                 # If word is NOT in dictionary -> It's likely a hallucination (or English)
-                if not self.dictionary.validate(word):
+                if self._is_toxic(word):
                     # It's a toxic hallucination!
                     success = self.immune_system.learn_antigen(word, "[BLOCKED]")
                     if success:
@@ -66,7 +76,7 @@ class AntibodyLearner:
                 for word in added_words:
                     if len(word) > 3:
                         # If word is NOT in dictionary -> It's likely a hallucination (or English)
-                        if not self.dictionary.validate(word):
+                        if self._is_toxic(word):
                             # It's a toxic hallucination!
                             # We learn to Block this transition? 
                             # Or just blacklist the word?
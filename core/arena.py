@@ -18,6 +18,7 @@ from core.saboteur import SaboteurAgent # Updated Import
 from core.defender_agent import DefenderAgent
 from core.antibody_learning import AntibodyLearner
 from core.analyst_agent import AnalystAgent
+from core.resource_planner import plan_resources
 
 class Arena:
     """
@@ -32,7 +33,10 @@ class Arena:
         self.saboteur = SaboteurAgent() 
         
         print("🛡️ Connecting to Defender Agent...")
-        self.defender = DefenderAgent(model_path)
+        # [Resource Planner] A single Defender: all physical cores, no hyperthread oversubscription
+        plan = plan_resources(model_path, requested=1)
+        print(f"   🧮 Resource plan: {plan.describe()}")
+        self.defender = DefenderAgent(model_path, env=plan.env(0, base={}))
         self.learner = AntibodyLearner()
         
         print("🔥 Igniting The Analyst (SmartRule Inference)...")
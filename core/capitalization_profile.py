@@ -0,0 +1,111 @@
+"""
+[Capitalization Profile] Détection statistique des noms propres sur tout le livre, sans modèle.
+
+Une passe compte, pour chaque mot, ses occurrences en milieu de phrase écrites avec majuscule
+et sans majuscule (plus celles de début de phrase, non informatives) :
+- toujours capitalisé en milieu de phrase (Malko, Mogadiscio) : nom propre ;
+- presque toujours en minuscules en milieu de phrase (personne, rien) : mot commun, même
+  quand il ouvre une phrase (« Personne ne l'attendait. ») ;
+- profil mixte ou trop peu d'observations : ambigu, la question part au NER.
+"""
+import re
+from typing import Dict, Iterable, List, Optional
+
+from core.gazetteer import ELISION, PUNCTUATION
+
+# Ponctuation (fin du mot précédent) après laquelle la majuscule vient de la phrase, pas du mot
+SENTENCE_END = (".", "!", "?", "…", ":")
+# Guillemets et tirets : transparents. Un guillemet ouvrant ouvre une phrase seulement après une fin
+# de phrase (ou en début de ligne) ; un guillemet fermant en milieu de phrase n'en ouvre pas
+QUOTES_AND_DASHES = "«»\"“”‹›—–"
+# Occurrences en milieu de phrase nécessaires pour trancher
+MIN_OCCURRENCES = 2
+# Part des occurrences capitalisées en milieu de phrase : au-dessus, nom propre ; en dessous, mot commun
+ENTITY_RATIO = 0.9
+COMMON_RATIO = 0.1
+
+TOKEN = re.compile(r"\S+")
+
+
+def follows_sentence_end(before: str) -> bool:
+    """`before` (le texte qui précède un mot) est vide ou finit une phrase, guillemets et tirets ignorés."""
+    before = before.rstrip().rstrip(QUOTES_AND_DASHES + " \t")
+    return not before or before.endswith(SENTENCE_END)
+
+
+def is_sentence_initial(line: str, start: int) -> bool:
+    """Le mot qui commence à `start` ouvre-t-il une phrase (début de ligne ou après ponctuation forte) ?"""
+    return follows_sentence_end(line[:start])
+
+
+def _surface(token: str) -> str:
+    return ELISION.sub("", token.strip(PUNCTUATION)).strip(PUNCTUATION)
+
+
+class CapitalizationProfile:
+    """Compteurs par mot (minuscules) : [capitalisé en milieu de phrase, minuscule en milieu de phrase, début de phrase]."""
+
+    def __init__(self):
+        self.counts: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "CapitalizationProfile":
+        profile = cls()
+        for text in texts:
+            profile.add_text(text)
+        return profile
+
+    def add_text(self, text: str):
+        """Ajoute les occurrences d'un texte (un chapitre) ; chaque ligne commence une phrase."""
+        for line in text.split("\n"):
+            initial = True
+            for m in TOKEN.finditer(line):
+                token = m.group(0)
+                word = _surface(token)
+                # Sigles et titres en capitales ne disent rien de la casse du mot
+                if len(word) >= 2 and word[0].isalpha() and not word.isupper():
+                    counts = self.counts.setdefault(word.lower(), [0, 0, 0])
+                    if initial:
+                        counts[2] += 1
+                    elif word[0].isupper():
+                        counts[0] += 1
+                    else:
+                        counts[1] += 1
+                # Un guillemet ou un tiret isolé ne change rien : « Arrête ! » Malko... / il dit " Malko
+                if token.strip(QUOTES_AND_DASHES):
+                    initial = token.rstrip(QUOTES_AND_DASHES).endswith(SENTENCE_END)
+
+    def verdict(self, word: str) -> Optional[bool]:
+        """True : nom propre ; False : mot commun ; None : profil ambigu ou trop peu d'observations."""
+        counts = self.counts.get(_surface(word).lower())
+        if counts is None:
+            return None
+        upper, lower = counts[0], counts[1]
+        if upper + lower < MIN_OCCURRENCES:
+            return None
+        ratio = upper / (upper + lower)
+        if ratio >= ENTITY_RATIO:
+            return True
+        if ratio <= COMMON_RATIO:
+            return False
+        return None
+
+    def decide(self, word: str, sentence_initial: bool) -> Optional[bool]:
+        """
+        Nom propre à cette position ? True / False quand le profil tranche, None pour le NER.
+        Un mot commun capitalisé en milieu de phrase reste une question (emphase, nom homographe).
+        """
+        verdict = self.verdict(word)
+        if verdict is False and not sentence_initial and _surface(word)[:1].isupper():
+            return None
+        return verdict
+
+    def stats(self) -> Dict[str, int]:
+        decided = {True: 0, False: 0, None: 0}
+        for word in self.counts:
+            decided[self.verdict(word)] += 1
+        return {"words": len(self.counts), "entities": decided[True], "common": decided[False],
+                "ambiguous": decided[None]}
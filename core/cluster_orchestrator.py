@@ -1,16 +1,22 @@
 
+import concurrent.futures
+import io
+import itertools
 import threading
 import queue
 import time
 import math
 import sys
 import os
-from typing import List, Tuple
+from collections import deque
+from typing import Iterable, List, Optional, TextIO, Tuple
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.defender_agent import DefenderAgent
+from core.llama_server import LlamaServerProcess
+from core.resource_planner import ResourcePlan, plan_resources
 
 class ClusterFactory:
     """
@@ -20,23 +26,72 @@ class ClusterFactory:
     - Slicer: Splits text into chunks.
     - Worker Pool: N concurrent DefenderAgents (using Threading, as they wait on IO).
     - Assembler: Merges results in order.
+    [Streaming Scheduler] Chunks are sized from the measured per-line latency, dealt to
+    per-worker deques with work stealing, retried on another daemon when one fails, and
+    written out as soon as every earlier chunk is done (bounded number of chunks in memory).
+    [Model Server] shared_model=True (or an explicit server_url): one llama-server process owns
+    the model and continuously batches the workers' requests (--parallel slots). Each worker's
+    daemon then holds no weights, so RAM no longer caps the number of workers.
     """
-    def __init__(self, model_path: str = "models/mistral-7b-instruct-v0.3.Q4_K_M.gguf", num_workers: int = 2):
+    def __init__(self, model_path: str = "models/mistral-7b-instruct-v0.3.Q4_K_M.gguf", num_workers: Optional[int] = 2,
+                 shared_model: bool = False, server_url: str = None, parallel: int = None,
+                 target_chunk_seconds: float = 30.0, min_chunk_lines: int = 10, max_chunk_lines: int = 200,
+                 max_pending_chunks: int = None, chunk_retries: int = 2, plan: ResourcePlan = None,
+                 line_timeout: float = 30.0, min_chunk_timeout: float = 60.0):
         self.model_path = model_path
         self.num_workers = num_workers
         self.agents = []
         self.is_running = False
+        self.shared_model = shared_model or bool(server_url)
+        self.server_url = server_url
+        # Slots of the model server: one per worker by default (each worker has one request in flight)
+        self.parallel = parallel
+        self.plan = plan
+        self.model_server = None
+        # [Streaming Scheduler] Chunk sizing, backpressure and retries
+        self.target_chunk_seconds = target_chunk_seconds
+        self.min_chunk_lines = min_chunk_lines
+        self.max_chunk_lines = max_chunk_lines
+        self.max_pending_chunks = max_pending_chunks # Default: 4 chunks per worker
+        self.chunk_retries = chunk_retries
+        self.latency_smoothing = 0.3
+        self.line_latency = None # Seconds per non-empty line (EWMA), measured on completed chunks
+        # Per-chunk request timeout: line_timeout per line before any measure, then a multiple
+        # of the measured latency (never below min_chunk_timeout)
+        self.line_timeout = line_timeout
+        self.min_chunk_timeout = min_chunk_timeout
+        self.timeout_factor = 4.0
+        self._stats_lock = threading.Lock()
 
     def start_factory(self):
         """
         Initializes the fleet of Agents.
         """
+        if self.plan is None and not self.server_url:
+            self.plan = plan_resources(self.model_path, requested=self.num_workers, shared=self.shared_model)
+        if self.plan and not self.shared_model:
+            self.num_workers = self.plan.instances
+        self.num_workers = self.num_workers or 1
         print(f"🏭 CLUSTER FACTORY STARTING ({self.num_workers} Workers)...")
+        if self.plan:
+            print(f"   🧮 Resource plan: {self.plan.describe()}")
+        agent_model = self.model_path
+        if self.shared_model:
+            if not self.server_url:
+                self.model_server = LlamaServerProcess(self.model_path, parallel=self.parallel or self.num_workers,
+                                                       n_threads=self.plan.threads if self.plan else None).start()
+                self.server_url = self.model_server.url
+            agent_model = self.server_url
+            print(f"   🧠 Shared model server: {self.server_url}")
         for i in range(self.num_workers):
             print(f"   🔧 Spawning Worker #{i+1}...")
-            agent = DefenderAgent(self.model_path)
+            # Daemons of a shared model only forward requests: no threads or CPU set to assign
+            env = self.plan.env(i, base={}) if self.plan and not self.shared_model else None
+            # Long-running workers: heartbeat on, so a hung daemon is killed and restarted
+            agent = DefenderAgent(agent_model, env=env, heartbeat_interval=10.0)
             self.agents.append(agent)
-            time.sleep(1) # Stagger start to avoid disk/cpu spike
+            if not self.shared_model:
+                time.sleep(1) # Stagger start to avoid disk/cpu spike (each worker loads the model)
         self.is_running = True
         print("✅ FACTORY OPERATIONAL.")
 
@@ -47,117 +102,254 @@ class ClusterFactory:
         print("🏭 FACTORY SHUTDOWN initiated...")
         for i, agent in enumerate(self.agents):
             print(f"   💤 Stopping Worker #{i+1}...")
-            agent.stop()
+            agent.close()
+        self.agents = []
+        if self.model_server:
+            self.model_server.stop()
+            self.model_server = None
+            self.server_url = None
         self.is_running = False
         print("✅ FACTORY OFFLINE.")
 
-    def _worker_task(self, agent: DefenderAgent, task_queue: queue.Queue, results: dict, worker_id: int):
+    # --- Scheduling ---
+
+    def _record_latency(self, seconds: float, lines: int):
+        """Per-line latency, smoothed (EWMA) over the chunks completed so far."""
+        if lines <= 0:
+            return
+        per_line = seconds / lines
+        with self._stats_lock:
+            if self.line_latency is None:
+                self.line_latency = per_line
+            else:
+                self.line_latency += self.latency_smoothing * (per_line - self.line_latency)
+
+    def _chunk_size(self) -> int:
+        """
+        [Adaptive Chunks] Lines per chunk so that one chunk takes ~target_chunk_seconds.
+        Before the first latency sample: min_chunk_lines (a first chunk must not time out on
+        the slowest model and leave the EWMA without any sample).
+        """
+        with self._stats_lock:
+            latency = self.line_latency
+        if not latency:
+            return self.min_chunk_lines
+        return max(self.min_chunk_lines, min(self.max_chunk_lines, int(self.target_chunk_seconds / latency)))
+
+    def _chunk_timeout(self, lines: int) -> float:
+        """Request timeout for a chunk of `lines` non-empty lines, scaled with its size."""
+        with self._stats_lock:
+            latency = self.line_latency
+        per_line = self.timeout_factor * latency if latency else self.line_timeout
+        return max(self.min_chunk_timeout, lines * per_line)
+
+    def _correct_chunk(self, agent: DefenderAgent, lines: List[str], timeout: float = None) -> Optional[List[str]]:
+        """
+        One correct_batch request per chunk (non-empty lines only, line endings kept).
+        Returns None if the daemon failed, so that the chunk can be retried elsewhere.
+        """
+        indices = [i for i, line in enumerate(lines) if line.strip()]
+        if not indices:
+            return list(lines)
+        resp = agent.send_command("correct_batch", {"texts": [lines[i].strip() for i in indices]},
+                                  timeout=timeout, retries=0)
+        data = resp.get("data") if resp and resp.get("status") == "ok" else None
+        if not data or len(data) != len(indices):
+            return None
+        corrected = list(lines)
+        for i, text in zip(indices, data):
+            corrected[i] = text + lines[i][len(lines[i].rstrip("\r\n")):]
+        return corrected
+
+    def _worker_task(self, agent: DefenderAgent, worker_id: int, scheduler: "ChunkScheduler", done: queue.Queue):
         """
-        Thread loop for a single worker.
+        Thread loop for a single worker: own chunks first, then stolen ones, until the scheduler closes.
+        A failed chunk is handed back (to another worker first) up to chunk_retries times.
         """
         while True:
+            chunk = scheduler.get(worker_id)
+            if chunk is None:
+                return
+            index, lines, attempts = chunk
+            count = sum(1 for line in lines if line.strip())
+            timeout = self._chunk_timeout(count)
+            start = time.monotonic()
             try:
-                # Non-blocking get to allow periodic check
-                chunk_index, chunk_text = task_queue.get(timeout=1)
-            except queue.Empty:
-                if not self.is_running: # Should we stop?
-                    break
-                # If running but empty, just break (work done)
-                # But we usually fill queue before starting threads
-                continue
-
-            if chunk_text is None: # Sentinel
-                break
-
-            print(f"   🔨 Worker #{worker_id} processing Chunk #{chunk_index} ({len(chunk_text)} lines)...")
-            
-            # Process lines
-            corrected_lines = []
-            for line in chunk_text:
-                if not line.strip():
-                    corrected_lines.append(line)
+                corrected = self._correct_chunk(agent, lines, timeout=timeout)
+            except Exception as e:
+                print(f"   ❌ Worker #{worker_id + 1} failed on Chunk #{index}: {e}")
+                corrected = None
+
+            if corrected is None:
+                elapsed = time.monotonic() - start
+                if elapsed >= timeout:
+                    # Timed out: the elapsed time is a lower bound of the latency, later chunks shrink
+                    self._record_latency(elapsed, count)
+                if attempts < self.chunk_retries:
+                    print(f"   🔁 Chunk #{index} failed on Worker #{worker_id + 1}, retry {attempts + 1}/{self.chunk_retries}.")
+                    scheduler.retry(worker_id, (index, lines, attempts + 1))
                     continue
-                
-                # Call the Agent
-                # Retry logic is handled inside DefenderAgent for Daemon crashes
-                # But here we assume Agent is robust.
-                correction = agent.correct_segment(line.strip())
-                corrected_lines.append(correction + "\n") # Restore newline? (simplified)
-            
-            results[chunk_index] = "".join(corrected_lines)
-            task_queue.task_done()
-            print(f"   ✅ Worker #{worker_id} finished Chunk #{chunk_index}.")
+                print(f"   ⚠️ Chunk #{index} kept uncorrected after {attempts + 1} attempts.")
+                corrected = lines # Fallback to original
+            else:
+                self._record_latency(time.monotonic() - start, count)
+            done.put((index, "".join(corrected)))
+            scheduler.task_done()
 
-    def process_text(self, full_text: str) -> str:
+    def process_stream(self, lines: Iterable[str], out: TextIO, total_lines: Optional[int] = None) -> int:
         """
-        Main entry point.
-        1. Slice text.
-        2. Distribute to workers.
-        3. Collect and merge.
+        [Streaming Scheduler] Corrects `lines` (an iterable, read lazily) into `out`.
+        - Slicer (thread): cuts chunks sized from the measured per-line latency; it blocks when
+          max_pending_chunks are not yet written (backpressure: bounded memory on huge books).
+        - Workers: one thread per agent, each with its own deque; an idle worker steals from the others.
+        - Assembler (this thread): writes every chunk as soon as all the previous ones are written.
+        Returns the number of chunks.
         """
         if not self.agents:
             raise RuntimeError("Factory not started! Call start_factory() first.")
 
+        scheduler = ChunkScheduler(len(self.agents))
+        done = queue.Queue()
+        max_pending = self.max_pending_chunks or len(self.agents) * 4
+        slots = threading.Semaphore(max_pending)
+
+        def slicer():
+            count = 0
+            try:
+                iterator = iter(lines)
+                while True:
+                    chunk = list(itertools.islice(iterator, self._chunk_size()))
+                    if not chunk:
+                        break
+                    slots.acquire()
+                    if scheduler.cancelled:
+                        break
+                    scheduler.put((count, chunk, 0))
+                    count += 1
+            except Exception as e:
+                print(f"   ❌ Slicer failed after {count} chunks: {e}")
+                scheduler.cancel()
+            finally:
+                scheduler.close()
+                done.put((None, count)) # End of input: total number of chunks
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.agents) + 1) as executor:
+            executor.submit(slicer)
+            for worker_id, agent in enumerate(self.agents):
+                executor.submit(self._worker_task, agent, worker_id, scheduler, done)
+
+            pending, next_index, total = {}, 0, None
+            try:
+                while total is None or next_index < total:
+                    index, text = done.get()
+                    if index is None:
+                        total = text
+                        if scheduler.cancelled:
+                            raise RuntimeError("input could not be read to the end")
+                        continue
+                    pending[index] = text
+                    while next_index in pending:
+                        out.write(pending.pop(next_index))
+                        out.flush()
+                        next_index += 1
+                        slots.release()
+            except BaseException:
+                # Output failed (or interrupted): unblock the slicer and let the workers drain out
+                scheduler.cancel()
+                for _ in range(max_pending):
+                    slots.release()
+                raise
+
+        with self._stats_lock:
+            latency = self.line_latency
+        print(f"🔗 ASSEMBLER: {next_index} chunks written in order"
+              + (f" ({latency:.2f}s/line)." if latency else "."))
+        return next_index
+
+    def process_file(self, input_path: str, output_path: str) -> int:
+        """Streams a text file through the factory; the output grows as its prefix completes."""
+        with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+            return self.process_stream(src, dst)
+
+    def process_text(self, full_text: str) -> str:
+        """
+        Main entry point (in memory).
+        1. Slice text.
+        2. Distribute to workers.
+        3. Collect and merge (in order).
+        """
         lines = full_text.splitlines(keepends=True)
-        total_lines = len(lines)
-        if total_lines == 0:
+        if not lines:
             return ""
+        out = io.StringIO()
+        self.process_stream(lines, out, total_lines=len(lines))
+        return out.getvalue()
+
+
+class ChunkScheduler:
+    """
+    [Streaming Scheduler] Work-stealing deques: chunks are dealt round-robin to one deque per
+    worker; a worker takes from the front of its own deque, and when it is empty steals from
+    the back of the longest other one. get() returns None once closed and every chunk is done
+    (a chunk being retried still counts: it may come back to any worker).
+    """
+
+    def __init__(self, num_workers: int):
+        self.deques = [deque() for _ in range(num_workers)]
+        self.cond = threading.Condition()
+        self.closed = False
+        self.cancelled = False
+        self.unfinished = 0
+        self._next = 0
+
+    def put(self, chunk):
+        with self.cond:
+            self.deques[self._next % len(self.deques)].append(chunk)
+            self._next += 1
+            self.unfinished += 1
+            self.cond.notify_all()
+
+    def task_done(self):
+        with self.cond:
+            self.unfinished -= 1
+            self.cond.notify_all()
+
+    def close(self):
+        """No more chunks will be put (end of input)."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def cancel(self):
+        """Drops queued chunks; workers stop after their current one."""
+        with self.cond:
+            self.cancelled = self.closed = True
+            for d in self.deques:
+                d.clear()
+            self.unfinished = 0
+            self.cond.notify_all()
+
+    def retry(self, worker_id: int, chunk):
+        """A failed chunk goes to the front of the next worker's deque (another daemon, served first)."""
+        with self.cond:
+            self.deques[(worker_id + 1) % len(self.deques)].appendleft(chunk)
+            self.cond.notify_all()
+
+    def get(self, worker_id: int):
+        with self.cond:
+            while True:
+                if self.cancelled:
+                    return None
+                own = self.deques[worker_id]
+                if own:
+                    return own.popleft()
+                victim = max(self.deques, key=len)
+                if victim:
+                    return victim.pop() # Steal from the back: the owner keeps its oldest chunks
+                if self.closed and self.unfinished <= 0:
+                    return None
+                self.cond.wait()
 
-        # Logic: Split into N chunks? Or smaller micro-chunks?
-        # Smaller chunks balances load better (if one chunk is hard).
-        # Let's say we want ~30 lines per chunk for granulrity? Or bigger?
-        # Agent overhead is small (process is persistent).
-        # Let's target K chunks where K = Workers * 4 (Load balancing)
-        
-        chunk_size = math.ceil(total_lines / (self.num_workers * 4))
-        if chunk_size < 10: chunk_size = 10 # Minimum size
-        
-        chunks = []
-        for i in range(0, total_lines, chunk_size):
-            chunks.append((i // chunk_size, lines[i:i + chunk_size]))
-            
-        print(f"📦 JIT SLICER: Split {total_lines} lines into {len(chunks)} Jobs (Size ~{chunk_size}).")
-        
-        # Setup Queue
-        task_queue = queue.Queue()
-        for c in chunks:
-            task_queue.put(c)
-            
-        # Results storage (Thread-safe dict)
-        results = {}
-        
-        # Launch Threads
-        threads = []
-        for i, agent in enumerate(self.agents):
-            t = threading.Thread(target=self._worker_task, args=(agent, task_queue, results, i+1))
-            t.start()
-            threads.append(t)
-            
-        # Wait for Queue to be empty
-        task_queue.join()
-        
-        # Signal threads to stop? (They are stuck in get maybe if not carefully managed)
-        # Actually task_queue.join() blocks until all tasks done.
-        # But threads are still looping.
-        # We need to signal them.
-        self.is_running = False # This might be loose
-        # Or sentinel
-        # But we reused the queue logic above
-        
-        # Let's join threads (they check self.is_running or empty)
-        # My _worker_task Loop has 'if queue.Empty... break' logic logic needs refinement
-        # If queue empty AND work done -> break.
-        # task_queue.join() only returns when count is 0.
-        
-        # Merging
-        print("🔗 ASSEMBLER: Merging results...")
-        final_output = []
-        # Sort by chunk index
-        sorted_indices = sorted(results.keys())
-        for idx in sorted_indices:
-            final_output.append(results[idx])
-            
-        return "".join(final_output)
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,74 @@
+"""
+[Daemon Transport] Length-prefixed binary frames for the Defender Daemon socket.
+
+Frame = 4-byte big-endian payload length + 1-byte codec tag + payload.
+The payload is msgpack when available (json otherwise); the tag lets both ends decode
+whatever the other side sent, so an orchestrator without msgpack can still share a daemon.
+"""
+import json
+import socket
+import struct
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER = struct.Struct(">IB")
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+DEFAULT_CODEC = CODEC_MSGPACK if msgpack else CODEC_JSON
+# Guard against a corrupted length prefix (a whole chapter batch is far below this)
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def encode(obj: Any, codec: int = DEFAULT_CODEC) -> bytes:
+    if codec == CODEC_MSGPACK:
+        payload = msgpack.packb(obj, use_bin_type=True)
+    else:
+        payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(payload), codec) + payload
+
+
+def decode(codec: int, payload: bytes) -> Any:
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack frame received but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload.decode("utf-8"))
+
+
+def send_frame(sock: socket.socket, obj: Any, codec: int = DEFAULT_CODEC):
+    """One sendall per frame (callers sharing a socket must serialize calls)."""
+    sock.sendall(encode(obj, codec))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            return None  # Peer closed the connection
+        received += n
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket, with_codec: bool = False):
+    """
+    Next decoded frame, or None when the peer closed the connection.
+    with_codec=True returns (obj, codec) so a server can answer in the client's codec.
+    """
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    size, codec = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ValueError(f"Frame too large ({size} bytes)")
+    payload = _recv_exact(sock, size) if size else b""
+    if payload is None:
+        return None
+    obj = decode(codec, payload)
+    return (obj, codec) if with_codec else obj
@@ -1,99 +1,470 @@
+import asyncio
+import concurrent.futures
+import itertools
 import logging
 import subprocess
 import json
 import os
+import socket
 import sys
+import tempfile
+import threading
 import time
-from typing import Dict, List, Optional
+import weakref
+from typing import Dict, List, Optional, Union
+
+from core.daemon_protocol import recv_frame, send_frame
+
+
+class DaemonError(RuntimeError):
+    """The daemon died (or was restarted) before answering a request; the request can be retried."""
+
 
 class DefenderAgent:
     """
     Agent 'Defender' (Phase 29).
     Wraps SemanticCorrector in an isolated Daemon Process.
     Ensures robustness: If LLM crashes, the Daemon is restarted automatically.
+    [Pipelining] Every request carries an id: many requests can be in flight on one daemon,
+    responses may come back out of order (a reader thread matches them by id), and
+    timeouts/retries apply per request. submit() and the *_async methods expose this to callers.
+    [Daemon Transport] The daemon is reached through a Unix domain socket (binary frames).
+    With an explicit socket_path, an already running daemon is shared (several orchestrators,
+    one loaded model); otherwise, or if nobody serves that path, the agent spawns its own.
+    [Resource Planner] `env` holds extra environment variables for a spawned daemon, typically
+    ResourcePlan.env(i, base={}) (threads and CPU set of instance i).
+    [Failover] standby=True keeps a second daemon loaded in the background: when the active one
+    dies or hangs, the standby takes over at once, the in-flight requests are replayed on it, and
+    a new standby starts loading (replays are opt-in: max_retries, 0 by default, since one poison
+    request would otherwise take every daemon down in turn). Without a standby, a dead daemon is
+    restarted by a background thread; requests submitted meanwhile are sent once it is READY.
+    With heartbeat_interval set (opt-in), a watchdog kills a
+    daemon that stops answering pings, or whose model has been busy on one group of requests for
+    more than hang_timeout seconds. The watchdog only holds a weak reference to the agent and
+    never restarts a daemon itself: recovery goes through the standby or the next submit().
     """
-    
-    def __init__(self, model_path: str = None):
+
+    def __init__(self, model_path: Union[str, List[str]] = None, request_timeout: float = 300.0,
+                 max_retries: int = 0, socket_path: str = None, env: Optional[Dict[str, str]] = None,
+                 standby: bool = False, heartbeat_interval: Optional[float] = None, hang_timeout: float = None):
         self.logger = logging.getLogger("DefenderAgent")
         self.daemon_process = None
-        self.model_path = model_path
+        self.socket_path = socket_path or self._private_socket_path()
+        self._sock = None
+        # [Cascade] A list of models (small first) is forwarded as comma-separated tiers
+        self.model_path = ",".join(model_path) if isinstance(model_path, (list, tuple)) else model_path
+        self.env = dict(env or {})
+        # [Pipelining] Per-request deadline (seconds) and number of re-sends after a timeout/crash
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, concurrent.futures.Future] = {}
+        self._starting = None # Id of the thread running the handshake
+        # Background restart in progress, and the requests waiting for it
+        self._restarting = False
+        self._queued: List[concurrent.futures.Future] = []
+        self._closed = False
+        # [Failover] Standby daemon: (process, socket_path) once READY, loaded by a background thread
+        self.standby = standby
+        self._standby = None
+        self._standby_loading = False
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = 30.0
+        self.hang_timeout = hang_timeout or 2 * request_timeout
+        self.failovers = 0
+        self._stop_watchdog = threading.Event()
         self._start_daemon()
+        self._prepare_standby()
+        if heartbeat_interval:
+            threading.Thread(target=DefenderAgent._watchdog, args=(weakref.ref(self), self._stop_watchdog, heartbeat_interval),
+                             name="defender-watchdog", daemon=True).start()
+
+    def _private_socket_path(self, role: str = "") -> str:
+        return os.path.join(tempfile.gettempdir(), f"defender_{os.getpid()}_{id(self):x}{role}.sock")
 
     def _start_daemon(self):
-        """Launches the Defender Daemon process."""
+        """Connects to the daemon serving socket_path, launching it first if nobody does."""
+        self._starting = threading.get_ident()
+        try:
+            conn = self._connect()
+            if conn is None:
+                self._spawn_daemon()
+                conn = self._connect()
+            if conn is None:
+                raise RuntimeError(f"no daemon listening on {self.socket_path}")
+
+            self._attach(conn)
+
+            response = self.send_command("ping", retries=0, timeout=30)
+            if response and response.get("status") == "ok":
+                print("✅ Defender Agent CONNECTED to Daemon.")
+            else:
+                print("⚠️ Defender Agent: Connection Failed (Handshake).")
+
+        except Exception as e:
+            print(f"❌ Failed to launch Defender Daemon: {e}")
+            self._sock = None
+        finally:
+            self._starting = None
+
+    def _attach(self, conn: socket.socket) -> Dict[int, concurrent.futures.Future]:
+        """[Pipelining] Each connection has its own table of in-flight requests and reader thread."""
+        pending = {}
+        with self._lock:
+            self._sock = conn
+            self._pending = pending
+        threading.Thread(
+            target=DefenderAgent._read_responses, args=(weakref.ref(self), conn, pending),
+            name="defender-reader", daemon=True
+        ).start()
+        return pending
+
+    def _connect(self, socket_path: str = None) -> Optional[socket.socket]:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(socket_path or self.socket_path)
+            return conn
+        except OSError:
+            conn.close()
+            return None
+
+    def _spawn_daemon(self):
+        """Launches the Defender Daemon process (owned by this agent) and waits for READY."""
+        print(f"🛡️ Launching Defender Daemon...")
+        self.daemon_process = self._launch(self.socket_path)
+        print("✅ Defender Agent: Daemon signaled READY.")
+
+    def _launch(self, socket_path: str) -> subprocess.Popen:
+        """Starts a daemon serving socket_path; returns once it is READY (model loaded)."""
         daemon_path = os.path.join(os.path.dirname(__file__), "defender_daemon.py")
-        
+
         # We use sys.executable (same env as Orchestrator)
         python_exe = sys.executable
-        
+
         env = os.environ.copy()
+        env.update(self.env)
         if self.model_path:
             env["DEFENDER_MODEL_PATH"] = self.model_path
 
+        # stdin stays open as a lifeline: the daemon exits when this process goes away
+        process = subprocess.Popen(
+            [python_exe, daemon_path, "--socket", socket_path, "--lifeline"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=sys.stderr, # Redirect stderr to main stderr for visibility
+            text=True,
+            bufsize=1, # Line buffered
+            env=env
+        )
+
+        # [Phase 36] Handshake: Wait for "ready" signal from Daemon (socket bound from then on)
+        ready_line = process.stdout.readline()
         try:
-            print(f"🛡️ Launching Defender Daemon...")
-            self.daemon_process = subprocess.Popen(
-                [python_exe, daemon_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=sys.stderr, # Redirect stderr to main stderr for visibility
-                text=True,
-                bufsize=1, # Line buffered
-                env=env
-            )
-            
-            # [Phase 36] Handshake: Wait for "ready" signal from Daemon
-            ready_line = self.daemon_process.stdout.readline()
-            if ready_line:
-                try:
-                    ready_data = json.loads(ready_line)
-                    if ready_data.get("status") == "ready":
-                         print("✅ Defender Agent: Daemon signaled READY.")
-                except:
-                    pass
-            
-            response = self.send_command("ping")
-            if response and response.get("status") == "ok":
-                print("✅ Defender Agent CONNECTED to Daemon.")
-            else:
-                print("⚠️ Defender Agent: Connection Failed (Handshake).")
-                
-        except Exception as e:
-            print(f"❌ Failed to launch Defender Daemon: {e}")
-            self.daemon_process = None
+            ready = json.loads(ready_line).get("status") == "ready" if ready_line else False
+        except json.JSONDecodeError:
+            ready = False
+        if not ready:
+            self._kill(process)
+            raise RuntimeError("Daemon exited during startup")
+        return process
 
-    def send_command(self, command: str, payload: dict = None) -> Optional[dict]:
-        """Sends a JSON command to the daemon and waits for JSON response."""
-        if not self.daemon_process:
-            print("⚠️ Daemon not running, restarting...")
-            self._start_daemon()
-            if not self.daemon_process:
-                return None
+    @staticmethod
+    def _kill(process: subprocess.Popen, grace: float = 2.0):
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            process.terminate()
+            process.wait(timeout=grace)
+        except Exception:
+            process.kill()
+
+    # --- [Failover] Warm standby ---
+
+    def _prepare_standby(self):
+        """Starts loading a standby daemon in the background (no-op if one is ready or loading)."""
+        with self._lock:
+            if not self.standby or self._closed or self._standby is not None or self._standby_loading:
+                return
+            self._standby_loading = True
+
+        def load():
+            socket_path = self._private_socket_path(f"_standby{self.failovers}")
+            try:
+                process = self._launch(socket_path)
+            except Exception as e:
+                print(f"⚠️ Defender standby could not be started: {e}")
+                process = None
+            with self._lock:
+                self._standby_loading = False
+                if process and not self._closed:
+                    self._standby = (process, socket_path)
+                    print("🛟 Defender standby daemon READY.")
+                    return
+            if process:
+                self._kill(process)
+
+        threading.Thread(target=load, name="defender-standby", daemon=True).start()
+
+    def _promote_standby(self, inflight: List[concurrent.futures.Future] = ()) -> bool:
+        """
+        Switches to the standby daemon and replays `inflight` on it (same ids, same futures).
+        Requests already replayed max_retries times fail instead (a request that kills or hangs
+        every daemon must not take the standby down too). Caller holds the lock.
+        """
+        standby, self._standby = self._standby, None
+        if standby is None:
+            return False
+        process, socket_path = standby
+        conn = self._connect(socket_path) if process.poll() is None else None
+        if conn is None:
+            self._kill(process)
+            return False
+
+        old_conn, old_process, old_path = self._sock, self.daemon_process, self.socket_path
+        self.daemon_process, self.socket_path = process, socket_path
+        pending = self._attach(conn)
+        self.failovers += 1
+        if old_conn is not None and old_conn is not conn:
+            try:
+                old_conn.close()
+            except OSError:
+                pass
+        if old_process is not None:
+            threading.Thread(target=self._kill, args=(old_process, 0.5), daemon=True).start()
+            try:
+                os.unlink(old_path) # A killed daemon cannot remove its own socket file
+            except OSError:
+                pass
+
+        replayed = 0
+        for future in inflight:
+            if future.done():
+                continue
+            future.replays = getattr(future, "replays", 0) + 1
+            if future.replays > self.max_retries:
+                future.set_exception(DaemonError("Request failed on every daemon it was replayed on"))
+                continue
+            pending[future.request_id] = future
+            try:
+                send_frame(conn, future.request)
+                replayed += 1
+            except OSError as e:
+                pending.pop(future.request_id, None)
+                future.set_exception(DaemonError(f"Error communicating with Defender Daemon: {e}"))
+        print(f"⚡ Defender failover #{self.failovers}: standby promoted, {replayed} request(s) replayed.")
+        self._prepare_standby()
+        return True
+
+    @staticmethod
+    def _watchdog(agent_ref: "weakref.ref", stop: threading.Event, interval: float):
+        """[Failover] Heartbeat loop; the agent is only borrowed for each beat (weak reference)."""
+        while not stop.wait(interval):
+            agent = agent_ref()
+            if agent is None:
+                return  # Agent collected without close()
+            agent._heartbeat()
+            del agent
 
-        req = {"command": command}
-        if payload:
-            req.update(payload)
-            
+    def _heartbeat(self):
+        """[Failover] One beat: detects a daemon that is alive but no longer makes progress."""
+        conn = self._sock
+        if self._closed or conn is None or self._starting or self._restarting:
+            return
+        future = self.submit("ping", restart=False)
         try:
-            # Write
-            json_req = json.dumps(req)
-            self.daemon_process.stdin.write(json_req + "\n")
-            self.daemon_process.stdin.flush()
-            
-            # Read
-            response_line = self.daemon_process.stdout.readline()
-            if not response_line:
-                raise BrokenPipeError("Daemon sent empty response (crash?)")
-                
-            return json.loads(response_line)
-            
-        except (BrokenPipeError, json.JSONDecodeError, Exception) as e:
-            print(f"❌ Error communicating with Defender Daemon: {e}")
-            print("🔄 Triggering Restart...")
-            self.close()
+            response = future.result(timeout=self.heartbeat_timeout)
+        except concurrent.futures.TimeoutError:
+            self._forget(future)
+            self._declare_hung(conn, f"no heartbeat for {self.heartbeat_timeout}s")
+            return
+        except DaemonError:
+            return  # Connection lost: already handled by the reader thread
+        status = response.get("data") if isinstance(response.get("data"), dict) else {}
+        if status.get("busy", 0) > self.hang_timeout:
+            self._declare_hung(conn, f"model busy for {status['busy']:.0f}s")
+
+    def _declare_hung(self, conn: socket.socket, reason: str):
+        """Kills a hung daemon we own (the reader then fails over); a shared one is only left."""
+        with self._lock:
+            if self._sock is not conn:
+                return
+            process = self.daemon_process
+        print(f"🧊 Defender Daemon hung ({reason}).")
+        if process is not None:
+            process.kill()
+        else:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _read_responses(agent_ref: "weakref.ref", conn: socket.socket, pending: Dict[int, concurrent.futures.Future]):
+        """
+        [Pipelining] Reader thread: resolves each in-flight request by the id of its response.
+        Holds the agent weakly while blocked on the socket, so an unused agent can be collected.
+        """
+        try:
+            while True:
+                response = recv_frame(conn)
+                if response is None:
+                    break
+                # No agent lock here: a restart holds it while waiting for the new daemon's handshake
+                future = pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (OSError, ValueError):
+            pass
+
+        # EOF: the daemon is gone, its in-flight requests fail (and may be retried on a new daemon)
+        agent = agent_ref()
+        if agent is not None:
+            agent._connection_lost(conn, pending)
+        while pending:
+            _, future = pending.popitem()
+            if not future.done():
+                future.set_exception(DaemonError("Daemon connection closed (crash?)"))
+
+    def _connection_lost(self, conn: socket.socket, pending: Dict[int, concurrent.futures.Future]):
+        """[Failover] Reader EOF on `conn`: in-flight requests move to the standby when there is one."""
+        if self._sock is conn:
+            self._sock = None
+            # Its in-flight requests fail, unless a standby can take them over (never during a
+            # handshake, which holds the lock while waiting for this very connection)
+            if not self._starting and not self._closed:
+                with self._lock:
+                    if self._sock is None and self._standby is not None:
+                        inflight = [pending.pop(i) for i in sorted(pending)]
+                        if self._promote_standby(inflight):
+                            return
+                        for future in inflight:
+                            if not future.done():
+                                future.set_exception(DaemonError("Daemon connection closed (crash?)"))
+
+    def _is_alive(self) -> bool:
+        if self._sock is None:
+            return False
+        return self.daemon_process is None or self.daemon_process.poll() is None
+
+    def submit(self, command: str, payload: dict = None, restart: bool = True) -> concurrent.futures.Future:
+        """
+        [Pipelining] Sends a request without waiting: returns a Future resolved with the
+        daemon's response dict, or failed with DaemonError if the daemon dies first.
+        A dead daemon is replaced by the standby, or restarted in the background: the request
+        then waits (within the caller's timeout) for the new daemon instead of blocking here.
+        restart=False fails at once instead of promoting or restarting a dead daemon.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            request_id = next(self._ids)
+            req = {"id": request_id, "command": command}
+            if payload:
+                req.update(payload)
+            future.request_id = request_id
+            future.request = req # [Failover] Kept for a replay on the standby, or a send after a restart
+
+            if not self._is_alive():
+                if self._closed:
+                    future.set_exception(DaemonError("Agent closed"))
+                    return future
+                if not restart:
+                    future.set_exception(DaemonError("Daemon not running"))
+                    return future
+                if self._starting == threading.get_ident():
+                    # Daemon died during its own handshake: no restart loop
+                    future.set_exception(DaemonError("Daemon exited during startup"))
+                    return future
+                if self._restarting or not self._promote_standby():
+                    self._queued.append(future)
+                    self._restart_async()
+                    return future
+
+            self._send(future)
+        return future
+
+    def _send(self, future: concurrent.futures.Future):
+        """Registers and writes one request on the active connection. Caller holds the lock."""
+        self._pending[future.request_id] = future
+        try:
+            send_frame(self._sock, future.request)
+        except OSError as e:
+            self._pending.pop(future.request_id, None)
+            future.set_exception(DaemonError(f"Error communicating with Defender Daemon: {e}"))
+
+    def _restart_async(self):
+        """Restarts the daemon on a background thread (no-op if already restarting). Caller holds the lock."""
+        if self._restarting:
+            return
+        self._restarting = True
+        threading.Thread(target=self._restart, name="defender-restart", daemon=True).start()
+
+    def _restart(self):
+        """Spawns a new daemon, then sends the requests queued meanwhile (or fails them)."""
+        print("⚠️ Daemon not running, restarting...")
+        self._disconnect()
+        if not self._closed:
             self._start_daemon()
-            # Retry once?
-            return None
+        with self._lock:
+            self._restarting = False
+            queued, self._queued = self._queued, []
+            closed = self._closed
+            for future in queued:
+                if future.done():
+                    continue
+                if self._is_alive() and not closed:
+                    self._send(future)
+                else:
+                    future.set_exception(DaemonError("Agent closed" if closed else "Daemon could not be started"))
+        if closed:
+            self._disconnect()
+
+    def _forget(self, future: concurrent.futures.Future):
+        """A timed-out request is dropped: a late response will simply be ignored."""
+        with self._lock:
+            self._pending.pop(getattr(future, "request_id", None), None)
+            if future in self._queued:
+                self._queued.remove(future)
+
+    def send_command(self, command: str, payload: dict = None, timeout: float = None,
+                     retries: int = None) -> Optional[dict]:
+        """
+        Sends a JSON command to the daemon and waits for its response.
+        [Pipelining] The request is re-sent (up to `retries` times) after a timeout or a daemon crash;
+        a crashed daemon is restarted by the next submit(). Returns None when every attempt failed.
+        """
+        timeout = self.request_timeout if timeout is None else timeout
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            future = self.submit(command, payload)
+            try:
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                self._forget(future)
+                print(f"⏱️ Defender Daemon: '{command}' timed out after {timeout}s (attempt {attempt + 1}/{retries + 1}).")
+            except DaemonError as e:
+                print(f"❌ {e} (attempt {attempt + 1}/{retries + 1}).")
+        return None
+
+    async def send_command_async(self, command: str, payload: dict = None, timeout: float = None,
+                                 retries: int = None) -> Optional[dict]:
+        """[Pipelining] asyncio version of send_command: many calls can be awaited concurrently."""
+        timeout = self.request_timeout if timeout is None else timeout
+        retries = self.max_retries if retries is None else retries
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries + 1):
+            # submit() may restart a dead daemon (blocking): kept off the event loop
+            future = await loop.run_in_executor(None, self.submit, command, payload)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                self._forget(future)
+                print(f"⏱️ Defender Daemon: '{command}' timed out after {timeout}s (attempt {attempt + 1}/{retries + 1}).")
+            except DaemonError as e:
+                print(f"❌ {e} (attempt {attempt + 1}/{retries + 1}).")
+        return None
 
     def correct_segment(self, text: str, **kwargs) -> str:
         """Public API matching SemanticCorrector."""
@@ -105,19 +476,67 @@ class DefenderAgent:
         else:
             return text # Fallback to original if failure
 
-    def save_stats(self):
-        """Triggers the daemon to save usage stats."""
-        self.send_command("save_stats")
+    async def correct_segment_async(self, text: str, **kwargs) -> str:
+        """[Pipelining] asyncio version of correct_segment (concurrent calls are coalesced by the daemon)."""
+        payload = {"text": text}
+        payload.update(kwargs)
+        resp = await self.send_command_async("correct_segment", payload)
+        if resp and resp.get("status") == "ok":
+            return resp.get("data")
+        return text
+
+    def correct_batch(self, texts: List[str], **kwargs) -> List[str]:
+        """[Pipelining] Corrects several segments in one request (SemanticCorrector.correct_segments)."""
+        payload = {"texts": list(texts)}
+        payload.update(kwargs)
+        resp = self.send_command("correct_batch", payload)
+        if resp and resp.get("status") == "ok" and len(resp.get("data") or []) == len(texts):
+            return resp["data"]
+        return list(texts)
 
-    def close(self):
-        """Clean shutdown."""
-        if self.daemon_process:
+    async def correct_batch_async(self, texts: List[str], **kwargs) -> List[str]:
+        payload = {"texts": list(texts)}
+        payload.update(kwargs)
+        resp = await self.send_command_async("correct_batch", payload)
+        if resp and resp.get("status") == "ok" and len(resp.get("data") or []) == len(texts):
+            return resp["data"]
+        return list(texts)
+
+    def save_stats(self) -> Optional[dict]:
+        """Triggers the daemon to save usage stats. Returns the per-tier cascade stats."""
+        resp = self.send_command("save_stats")
+        return resp.get("data") if resp else None
+
+    def _disconnect(self):
+        """Drops the active daemon (a shared daemon not spawned by this agent is left running)."""
+        with self._lock:
+            conn, self._sock = self._sock, None
+            process, self.daemon_process = self.daemon_process, None
+        if conn:
             try:
-                self.daemon_process.terminate()
-                self.daemon_process.wait(timeout=2)
-            except:
-                self.daemon_process.kill()
-            self.daemon_process = None
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+        if process:
+            self._kill(process)
+
+    def close(self):
+        """Clean shutdown: active daemon, standby and watchdog."""
+        with self._lock:
+            self._closed = True
+            standby, self._standby = self._standby, None
+            queued, self._queued = self._queued, []
+        for future in queued:
+            if not future.done():
+                future.set_exception(DaemonError("Agent closed"))
+        self._stop_watchdog.set()
+        self._disconnect()
+        if standby:
+            self._kill(standby[0])
 
     def __del__(self):
-        self.close()
+        try:
+            self.close()
+        except Exception:
+            pass
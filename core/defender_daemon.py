@@ -1,119 +1,237 @@
 #!/usr/bin/env python3
 import sys
 import os
+import argparse
 import json
+import queue
+import signal
+import socket
+import threading
+import time
 import traceback
+from collections import deque
+from typing import Deque, Dict, List
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from correctors.semantic_corrector import SemanticCorrector
+from core.daemon_protocol import DEFAULT_CODEC, recv_frame, send_frame
+from core.resource_planner import pin_from_env
+
+# [Pipelining] Max number of queued correct_segment requests served by one correct_segments() call
+MAX_COALESCE = int(os.environ.get("DEFENDER_MAX_COALESCE", "16"))
+logging_prefix = "[DefenderDaemon]"
+
+
+def next_group(pending: Deque[dict], limit: int = MAX_COALESCE) -> List[dict]:
+    """
+    [Pipelining] Pops the next unit of work from the pending requests.
+    correct_segment requests sharing the first one's fever_mode are coalesced (up to `limit`)
+    until the next request of another kind, which acts as a barrier (e.g. save_stats).
+    """
+    first = pending.popleft()
+    if first.get("command") != "correct_segment":
+        return [first]
+    fever = first.get("fever_mode", False)
+    group, skipped = [first], []
+    while pending and len(group) < limit and pending[0].get("command") == "correct_segment":
+        req = pending.popleft()
+        (group if req.get("fever_mode", False) == fever else skipped).append(req)
+    pending.extendleft(reversed(skipped))
+    return group
+
+
+def make_response(req: dict, status: str = "ok", data=None, error: str = None) -> dict:
+    # (the private "_client" field of a request never goes back on the wire)
+    response = {"id": req.get("id"), "status": status, "data": data}
+    if error:
+        response["error"] = error
+    return response
+
+
+def process_group(corrector, group: List[dict]) -> List[dict]:
+    """Runs one unit of work and returns one response per request (matched by id)."""
+    command = group[0].get("command")
+    try:
+        if command == "correct_segment":
+            fever = group[0].get("fever_mode", False)
+            if len(group) == 1:
+                corrected = [corrector.correct_segment(group[0].get("text", ""), fever_mode=fever)]
+            else:
+                corrected = corrector.correct_segments([req.get("text", "") for req in group], fever_mode=fever)
+            return [make_response(req, data=text) for req, text in zip(group, corrected)]
+
+        req = group[0]
+        if command == "correct_batch":
+            texts = req.get("texts", [])
+            return [make_response(req, data=corrector.correct_segments(texts, fever_mode=req.get("fever_mode", False)))]
+        if command == "save_stats":
+            if hasattr(corrector, "rule_applicator") and corrector.rule_applicator:
+                corrector.rule_applicator.save_stats()
+            # [Cascade] Per-tier acceptance/latency (printed to stderr, returned to caller)
+            return [make_response(req, data=corrector.report_cascade_stats())]
+        if command == "reload_model":
+            # Optional: Hot reload
+            return [make_response(req)]
+        return [make_response(req, "error", error=f"unknown command: {command}")]
+    except Exception as e:
+        sys.stderr.write(f"{logging_prefix} ERROR processing {command}: {e}\n")
+        traceback.print_exc(file=sys.stderr)
+        return [make_response(req, "error", error=str(e)) for req in group]
+
+
+class Client:
+    """[Daemon Transport] One connected orchestrator: its socket, send lock and codec."""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.codec = DEFAULT_CODEC
+        self.lock = threading.Lock()
+
+    def send(self, response: Dict):
+        try:
+            with self.lock:
+                send_frame(self.conn, response, self.codec)
+        except OSError:
+            pass  # Client gone: its requests are simply dropped
+
+
+def serve_client(client: Client, work: queue.Queue, status=None):
+    """
+    Reader thread of one connection: pings answered at once, other requests queued.
+    [Failover] A ping is also a heartbeat: its data reports how long the model has been busy
+    on the current group ("busy", seconds) so that the agent can tell a hung daemon from a slow one.
+    """
+    try:
+        while True:
+            frame = recv_frame(client.conn, with_codec=True)
+            if frame is None:
+                break
+            req, client.codec = frame
+            if req.get("command") == "ping":
+                client.send(make_response(req, data=status() if status else "pong"))
+            else:
+                req["_client"] = client
+                work.put(req)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"{logging_prefix} Client dropped: {e}\n")
+    finally:
+        client.conn.close()
+
 
 def main():
     """
     Defender Daemon (Phase 29).
     Hosts the SemanticCorrector (LLM) in a separate process.
-    Communication via Stdin/Stdout (JSON-RPC style).
+    [Daemon Transport] Requests arrive over a Unix domain socket as length-prefixed frames
+    (msgpack, or json), from any number of orchestrators sharing the loaded model.
+    [Pipelining] Pings are answered by the connection thread; other requests are queued,
+    coalesced and may be answered out of order (matched by id).
+    Usage: defender_daemon.py --socket PATH [--lifeline]
+    (--lifeline: exit when stdin closes, i.e. when the spawning DefenderAgent goes away).
     """
-    # 1. Initialize Model
-    # IMPORTANT: Llama.cpp outputs C-level logs to stdout. We MUST capture/redirect them to stderr
-    # to protect the JSON communication channel on stdout.
-    
-    # Save original stdout
-    original_stdout_fd = sys.stdout.fileno()
-    saved_stdout_fd = os.dup(original_stdout_fd)
-    
+    parser = argparse.ArgumentParser(description="Defender Daemon (shared SemanticCorrector).")
+    parser.add_argument("--socket", default=os.environ.get("DEFENDER_SOCKET", "/tmp/defender_daemon.sock"))
+    parser.add_argument("--lifeline", action="store_true")
+    args = parser.parse_args()
+
+    # 1. Protect the handshake channel
+    # IMPORTANT: Llama.cpp outputs C-level logs to stdout. fd 1 is pointed at stderr once,
+    # for the daemon's whole life; the handshake goes through a private duplicate of it.
+    sys.stdout.flush()
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1, encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    # [Resource Planner] CPU set chosen by the orchestrator, applied before llama.cpp starts its threads
+    if pin_from_env():
+        sys.stderr.write(f"{logging_prefix} Pinned to CPUs {os.environ.get('SCRINIUM_CPUS')}.\n")
+
+    # 2. Initialize Model
     try:
-        logging_prefix = "[DefenderDaemon]"
         sys.stderr.write(f"{logging_prefix} Initializing SemanticCorrector (Redirecting noise to stderr)...\n")
-        
-        # Redirect stdout to stderr
-        sys.stdout.flush()
-        os.dup2(sys.stderr.fileno(), original_stdout_fd)
-        
+        from correctors.semantic_corrector import SemanticCorrector
+
         # We assume standard model path or allow env var override
+        # [Cascade] Several comma-separated paths = ordered tiers (small model first)
         model_path = os.environ.get("DEFENDER_MODEL_PATH", "models/mistral-7b-instruct-v0.3.Q4_K_M.gguf")
-        corrector = SemanticCorrector(model_path=model_path)
-        
-        # Restore stdout
-        sys.stdout.flush()
-        os.dup2(saved_stdout_fd, original_stdout_fd)
-        
-        # [Handshake] Signal Ready on Stdout
-        print(json.dumps({"status": "ready"}), flush=True)
-        sys.stderr.write(f"{logging_prefix} Ready. Waiting for requests.\n")
-    except Exception as e:
-        # Restore stdout just in case
-        os.dup2(saved_stdout_fd, original_stdout_fd)
+        model_paths = [p for p in model_path.split(",") if p]
+        corrector = SemanticCorrector(model_path=model_paths if len(model_paths) > 1 else model_paths[0])
+
+        # 3. Listen (a stale socket file from a dead daemon is replaced, a live one is not)
+        if os.path.exists(args.socket):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(args.socket)
+                raise RuntimeError(f"{args.socket} is already served by another daemon")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(args.socket)
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(args.socket)
+        server.listen(16)
+    except BaseException as e:
         sys.stderr.write(f"{logging_prefix} CRITICAL INIT ERROR: {e}\n")
         traceback.print_exc(file=sys.stderr)
         sys.exit(1)
-    finally:
-        os.close(saved_stdout_fd)
-
 
-    # 2. Event Loop
-    while True:
+    def shutdown(*_):
         try:
-            line = sys.stdin.readline()
-            if not line:
-                break # EOF
-                
-            req = json.loads(line)
-            command = req.get("command")
-            
-            response = {"status": "error", "data": None}
-            
-            # [Phase 37] Capture logic output to stderr
-            # We must NOT let any print() or LLM noise hit stdout during processing
-            original_stdout_fd = sys.stdout.fileno()
-            saved_stdout_fd = os.dup(original_stdout_fd)
-            
-            try:
-                # Redirect stdout to stderr
-                sys.stdout.flush()
-                os.dup2(sys.stderr.fileno(), original_stdout_fd)
-                
-                if command == "ping":
-                    response = {"status": "ok", "data": "pong"}
-                    
-                elif command == "correct_segment":
-                    text = req.get("text", "")
-                    fever = req.get("fever_mode", False)
-                    # Forward to LLM
-                    corrected = corrector.correct_segment(text, fever_mode=fever)
-                    response = {"status": "ok", "data": corrected}
-                    
-                elif command == "reload_model":
-                     # Optional: Hot reload
-                     pass
-                elif command == "save_stats":
-                     if hasattr(corrector, "rule_applicator") and corrector.rule_applicator:
-                         corrector.rule_applicator.save_stats()
-                     response = {"status": "ok"}
-                     
-            finally:
-                # Restore stdout for the JSON response
-                sys.stdout.flush()
-                os.dup2(saved_stdout_fd, original_stdout_fd)
-                os.close(saved_stdout_fd)
-
-            # Send Response (Now stdout is restored)
-            print(json.dumps(response), flush=True)
-            
-        except BrokenPipeError:
-             sys.exit(0)
-        except json.JSONDecodeError:
-            sys.stderr.write(f"{logging_prefix} Invalid JSON received.\n")
-        except Exception as e:
-            sys.stderr.write(f"{logging_prefix} ERROR processing request: {e}\n")
-            try:
-                print(json.dumps({"status": "error", "error": str(e)}), flush=True)
-            except:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # 4. Worker thread: runs the model, one group of requests at a time (all clients together)
+    work = queue.Queue()
+    pending = deque()
+    busy_since = [None] # Start of the group being processed (None: idle)
+
+    def status():
+        since = busy_since[0]
+        return {"pong": True, "busy": time.time() - since if since else 0.0, "queued": work.qsize() + len(pending)}
+
+    def worker():
+        while True:
+            if not pending:
+                pending.append(work.get())
+            # Everything already queued is a coalescing candidate
+            while True:
+                try:
+                    pending.append(work.get_nowait())
+                except queue.Empty:
+                    break
+            group = next_group(pending)
+            busy_since[0] = time.time()
+            responses = process_group(corrector, group)
+            busy_since[0] = None
+            for req, response in zip(group, responses):
+                req["_client"].send(response)
+
+    threading.Thread(target=worker, name="defender-worker", daemon=True).start()
+
+    if args.lifeline:
+        def watch_parent():
+            for _ in sys.stdin:
                 pass
-                
+            sys.stderr.write(f"{logging_prefix} Parent gone, shutting down.\n")
+            shutdown()
+        threading.Thread(target=watch_parent, name="defender-lifeline", daemon=True).start()
+
+    # [Handshake] Signal Ready (the socket accepts connections from now on)
+    channel.write(json.dumps({"status": "ready", "socket": args.socket, "pid": os.getpid()}) + "\n")
+    channel.flush()
+    sys.stderr.write(f"{logging_prefix} Ready on {args.socket}. Waiting for requests.\n")
+
+    # 5. Accept loop
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve_client, args=(Client(conn), work, status), name="defender-client",
+                         daemon=True).start()
+
+
 if __name__ == "__main__":
-    # Ignore SIGPIPE to prevent crash on print if parent closes
-    import signal
-    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
     main()
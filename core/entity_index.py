@@ -0,0 +1,120 @@
+"""
+[Entity Index] Entités nommées d'un chapitre, calculées en une passe (NERAgent.index_text) et
+interrogées ensuite par offset : « ce span est-il une entité ? » devient une recherche
+dichotomique (bisect) au lieu d'un aller-retour avec le daemon NER.
+
+Les offsets sont ceux du texte indexé. Les étapes de nettoyage en aval modifient certaines
+lignes : une ligne est donc retrouvée par son texte (line_offset) ; une ligne modifiée
+depuis l'indexation est inconnue (None) et l'appelant revient à son chemin habituel.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seuil de confiance des entités (même seuil que NERAgent.analyze)
+MIN_SCORE = 0.85
+
+# Fin de phrase : ponctuation forte suivie d'espace, ou saut de ligne
+SENTENCE_END = re.compile(r'(?<=[.!?…»])\s+|\n+')
+
+
+def pack_sentences(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """
+    Découpe `text` en segments contigus (start, end) de phrases entières, chacun d'au plus
+    max_chars caractères (une phrase trop longue est coupée sur un espace).
+    """
+    sentences = []
+    start = 0
+    for m in SENTENCE_END.finditer(text):
+        if m.start() > start:
+            sentences.append((start, m.start()))
+        start = m.end()
+    if start < len(text):
+        sentences.append((start, len(text)))
+
+    segments = []
+    seg_start = seg_end = None
+    for s_start, s_end in sentences:
+        while s_end - s_start > max_chars:
+            cut = text.rfind(" ", s_start, s_start + max_chars)
+            cut = cut if cut > s_start else s_start + max_chars
+            if seg_start is not None:
+                segments.append((seg_start, seg_end))
+                seg_start = None
+            segments.append((s_start, cut))
+            s_start = cut + 1 if text[cut:cut + 1] == " " else cut
+        if s_start >= s_end:
+            continue
+        if seg_start is not None and s_end - seg_start <= max_chars:
+            seg_end = s_end
+            continue
+        if seg_start is not None:
+            segments.append((seg_start, seg_end))
+        seg_start, seg_end = s_start, s_end
+    if seg_start is not None:
+        segments.append((seg_start, seg_end))
+    return segments
+
+
+class EntityIndex:
+    """Spans d'entités (start, end, type, score) triés par offset de début, sans chevauchement."""
+
+    def __init__(self, text: str = "", spans: Iterable[Tuple[int, int, str, float]] = ()):
+        spans = sorted(spans)
+        self.starts = [s[0] for s in spans]
+        self.ends = [s[1] for s in spans]
+        self.labels = [s[2] for s in spans]
+        self.scores = [s[3] for s in spans]
+        self.text = text
+        self._lines: Optional[Dict[str, int]] = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getstate__(self):
+        # Envoyé aux workers : la table des lignes se reconstruit à la demande
+        state = dict(self.__dict__)
+        state["_lines"] = None
+        return state
+
+    def entity_at(self, start: int, end: int, min_score: float = MIN_SCORE) -> Optional[str]:
+        """Type de la première entité recouvrant [start, end), ou None."""
+        # Dernier span commençant avant `end` ; les spans sont disjoints, il suffit de remonter
+        # tant qu'ils se terminent après `start`
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.ends[i] > start:
+            if self.scores[i] >= min_score:
+                return self.labels[i]
+            i -= 1
+        return None
+
+    def is_entity(self, start: int, end: int, min_score: float = MIN_SCORE) -> bool:
+        return self.entity_at(start, end, min_score) is not None
+
+    def line_offset(self, line: str) -> Optional[int]:
+        """Offset (dans le texte indexé) de la première ligne identique à `line` (espaces de bord ignorés)."""
+        if self._lines is None:
+            self._lines = {}
+            offset = 0
+            for raw in self.text.split("\n"):
+                stripped = raw.strip()
+                if stripped and stripped not in self._lines:
+                    self._lines[stripped] = offset + (len(raw) - len(raw.lstrip()))
+                offset += len(raw) + 1
+        return self._lines.get(line.strip())
+
+    def lookup(self, line: str, start: int, end: int, min_score: float = MIN_SCORE) -> Optional[bool]:
+        """
+        Le span [start, end) de `line` (offsets relatifs à `line`) est-il une entité ?
+        None si la ligne n'a pas été indexée telle quelle.
+        """
+        base = self.line_offset(line)
+        if base is None:
+            return None
+        base -= len(line) - len(line.lstrip())
+        return self.is_entity(base + start, base + end, min_score)
+
+    def entities_in(self, start: int, end: int) -> List[Tuple[int, int, str, float]]:
+        """Spans commençant dans [start, end)."""
+        lo, hi = bisect_left(self.starts, start), bisect_right(self.starts, end - 1)
+        return [(self.starts[i], self.ends[i], self.labels[i], self.scores[i]) for i in range(lo, hi)]
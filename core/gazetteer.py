@@ -0,0 +1,185 @@
+"""
+[Gazetteer] Répertoire persistant des entités nommées confirmées, par série (Malko, Somalie,
+Mogadiscio... reviennent dans chaque volume de SAS).
+
+- Alimenté par les résultats du NER (pré-passe des chapitres, vérifications mot par mot) :
+  chaque observation incrémente le compteur (série, forme, type).
+- Consulté en premier (NerGuardian, routage de worker_clean_chapter, AntibodyLearner) :
+  un nom déjà confirmé coûte une recherche dans un dict, les appels au NER et à Mistral
+  sont réservés aux noms réellement nouveaux.
+- Portée : les entrées de la série du livre et les entrées globales ('*', livres sans série).
+- Stockage SQLite (WAL) : les workers parallèles y écrivent leurs observations par lots.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+GLOBAL_SCOPE = "*"
+# Élisions retirées avant la recherche : d'Abdi -> Abdi
+ELISION = re.compile(r"^(?:[ldjmnstc]|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+PUNCTUATION = ".,;:?!'\"()[]-«»…’"
+
+
+def entity_key(word: str) -> str:
+    """Forme de recherche : sans ponctuation de bord ni élision, en minuscules."""
+    return ELISION.sub("", word.strip(PUNCTUATION)).strip(PUNCTUATION).lower()
+
+
+class Gazetteer:
+    """[Gazetteer] Entités par série : compteurs en base, vue en mémoire (série + global)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entities (
+        series TEXT NOT NULL,
+        surface_lc TEXT NOT NULL,
+        type TEXT NOT NULL,
+        surface TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        books INTEGER NOT NULL DEFAULT 1,
+        last_book TEXT,
+        PRIMARY KEY (series, surface_lc, type)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path: str = "data/knowledge/gazetteer.sqlite", series: Optional[str] = None,
+                 book: Optional[str] = None, min_count: int = 3):
+        self.db_path = db_path
+        self.series = series or GLOBAL_SCOPE
+        self.book = book
+        # Observations nécessaires avant qu'une forme soit considérée comme confirmée
+        self.min_count = min_count
+        self.entries: Optional[Dict[str, dict]] = None
+        self._pending: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connexion du processus courant (rouverte après un fork)."""
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def __getstate__(self):
+        # Transmis aux workers : connexion et observations en attente restent dans ce processus
+        state = dict(self.__dict__)
+        state.update(_connection=None, _pid=None, _pending={}, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # --- Lecture ---
+
+    def load(self) -> int:
+        """Charge la vue mémoire (série du livre + global) ; renvoie le nombre de formes."""
+        entries = {}
+        rows = self._conn().execute(
+            "SELECT surface_lc, type, surface, count, books FROM entities WHERE series IN (?, ?)"
+            " ORDER BY count DESC",
+            (self.series, GLOBAL_SCOPE),
+        )
+        for surface_lc, etype, surface, count, books in rows:
+            self._merge(entries, surface_lc, etype, surface, count, books)
+        self.entries = entries
+        return len(entries)
+
+    @staticmethod
+    def _merge(entries: Dict[str, dict], surface_lc: str, etype: str, surface: str, count: int, books: int = 1):
+        entry = entries.get(surface_lc)
+        if entry is None:
+            entries[surface_lc] = {"surface": surface, "types": {etype: count}, "count": count, "books": books}
+            return
+        entry["types"][etype] = entry["types"].get(etype, 0) + count
+        entry["count"] += count
+        entry["books"] = max(entry["books"], books)
+
+    def lookup(self, word: str) -> Optional[dict]:
+        """Entrée confirmée pour ce mot (casse ignorée) : {'surface', 'type', 'count', ...} ou None."""
+        if self.entries is None:
+            self.load()
+        entry = self.entries.get(entity_key(word))
+        if entry is None or entry["count"] < self.min_count:
+            return None
+        return dict(entry, type=max(entry["types"], key=entry["types"].get))
+
+    def lookup_any_series(self, word: str) -> Optional[dict]:
+        """
+        Entrée confirmée dans n'importe quelle série (celle où le mot est le plus observé), ou None.
+        Pour les appelants sans livre courant (Arena, AntibodyLearner).
+        """
+        key = entity_key(word)
+        per_series: Dict[str, Dict[str, dict]] = {}
+        rows = self._conn().execute(
+            "SELECT series, type, surface, count, books FROM entities WHERE surface_lc = ? ORDER BY count DESC",
+            (key,),
+        )
+        for series, etype, surface, count, books in rows:
+            self._merge(per_series.setdefault(series, {}), key, etype, surface, count, books)
+        entries = [entries[key] for entries in per_series.values() if entries[key]["count"] >= self.min_count]
+        if not entries:
+            return None
+        entry = max(entries, key=lambda e: e["count"])
+        return dict(entry, type=max(entry["types"], key=entry["types"].get))
+
+    def is_entity(self, word: str) -> bool:
+        """
+        Nom propre confirmé, écrit comme un nom propre : capitalisé, ou exactement sous sa forme
+        connue (un nom commun homographe en minuscules, « pierre », reste corrigeable).
+        """
+        entry = self.lookup(word)
+        if entry is None:
+            return False
+        clean = ELISION.sub("", word.strip(PUNCTUATION)).strip(PUNCTUATION)
+        return clean[:1].isupper() or clean == entry["surface"]
+
+    # --- Écriture ---
+
+    def record(self, word: str, etype: str = "MISC", count: int = 1):
+        """Observation d'une entité (résultat NER) ; visible tout de suite, écrite par flush()."""
+        surface = ELISION.sub("", word.strip(PUNCTUATION)).strip(PUNCTUATION)
+        key = surface.lower()
+        if len(key) < 2 or not surface[:1].isupper():
+            return
+        if self.entries is None:
+            self.load()
+        with self._lock:
+            pending_key = (key, etype, surface)
+            self._pending[pending_key] = self._pending.get(pending_key, 0) + count
+            self._merge(self.entries, key, etype, surface, count)
+
+    def record_many(self, entities: Iterable[Tuple[str, str]]):
+        for word, etype in entities:
+            self.record(word, etype)
+
+    def flush(self) -> int:
+        """Écrit les observations en attente ; renvoie le nombre de formes mises à jour."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                """INSERT INTO entities (series, surface_lc, type, surface, count, books, last_book)
+                   VALUES (?, ?, ?, ?, ?, 1, ?)
+                   ON CONFLICT (series, surface_lc, type) DO UPDATE SET
+                       count = count + excluded.count,
+                       books = books + (COALESCE(last_book, '') != COALESCE(excluded.last_book, '')),
+                       last_book = excluded.last_book""",
+                [(self.series, key, etype, surface, n, self.book) for (key, etype, surface), n in pending.items()],
+            )
+        return len(pending)
+
+    def stats(self) -> dict:
+        if self.entries is None:
+            self.load()
+        confirmed = sum(1 for entry in self.entries.values() if entry["count"] >= self.min_count)
+        return {"series": self.series, "forms": len(self.entries), "confirmed": confirmed}
@@ -0,0 +1,107 @@
+"""
+[Compact KB] Représentation compacte des entrées de la base de connaissances.
+
+Une entrée JSON répète son `contexte_brut` (souvent plusieurs centaines de caractères,
+partagé par toutes les corrections d'une même phrase), un horodatage ISO et des mots
+identiques d'une entrée à l'autre. Ici :
+- `KBRecord` utilise __slots__ (pas de dict par instance) ;
+- les mots et les clés sont internés (une seule copie par valeur) ;
+- les contextes sont stockés une seule fois dans une `StringTable` et référencés par indice ;
+- horodatage (microsecondes depuis 1970) et confiance sont numériques.
+"""
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Champs portés par des attributs ; les autres éventuels sont conservés dans `extra`
+KNOWN_FIELDS = ("key", "mot_source", "mot_cible", "contexte_brut", "timestamp", "confidence", "count")
+
+
+def iso_to_us(timestamp: Optional[str]) -> Optional[int]:
+    """'2026-01-19T07:56:18.153527' -> microsecondes depuis 1970 (aller-retour exact)."""
+    if not timestamp:
+        return None
+    try:
+        return (datetime.fromisoformat(timestamp).replace(tzinfo=None) - EPOCH) // _MICROSECOND
+    except (TypeError, ValueError):
+        return None
+
+
+def us_to_iso(timestamp_us: Optional[int]) -> Optional[str]:
+    if timestamp_us is None:
+        return None
+    return (EPOCH + timestamp_us * _MICROSECOND).isoformat()
+
+
+class StringTable:
+    """Table de chaînes dédupliquées : chaque texte distinct n'est stocké qu'une fois."""
+
+    __slots__ = ("_ids", "strings")
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, text: Optional[str]) -> int:
+        """Indice du texte (ajouté s'il est nouveau) ; -1 pour un texte absent."""
+        if text is None:
+            return -1
+        idx = self._ids.get(text)
+        if idx is None:
+            idx = self._ids[text] = len(self.strings)
+            self.strings.append(text)
+        return idx
+
+    def get(self, idx: int) -> Optional[str]:
+        return self.strings[idx] if idx >= 0 else None
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class KBRecord:
+    """Entrée de KB compacte (voir le docstring du module)."""
+
+    __slots__ = ("key", "mot_source", "mot_cible", "context_id", "timestamp_us", "confidence", "count", "extra")
+
+    def __init__(self, key: str, mot_source: str, mot_cible: Optional[str], context_id: int = -1,
+                 timestamp_us: Optional[int] = None, confidence: float = 1.0, count: int = 1,
+                 extra: Optional[dict] = None):
+        self.key = sys.intern(key)
+        self.mot_source = sys.intern(mot_source)
+        self.mot_cible = sys.intern(mot_cible) if mot_cible is not None else None
+        self.context_id = context_id
+        self.timestamp_us = timestamp_us
+        self.confidence = confidence
+        self.count = count
+        self.extra = extra
+
+    @classmethod
+    def from_entry(cls, entry: dict, contexts: StringTable) -> "KBRecord":
+        extra = {k: v for k, v in entry.items() if k not in KNOWN_FIELDS} or None
+        return cls(
+            entry['key'],
+            str(entry.get('mot_source', '')),
+            entry.get('mot_cible'),
+            contexts.add(entry.get('contexte_brut')),
+            iso_to_us(entry.get('timestamp')),
+            float(entry.get('confidence', 1.0)),
+            int(entry.get('count', 1)),
+            extra,
+        )
+
+    def to_entry(self, contexts: StringTable) -> dict:
+        """Reconstruit l'entrée JSON (même format que les logs de session et la Master KB)."""
+        entry = {"key": self.key, "mot_source": self.mot_source, "mot_cible": self.mot_cible}
+        context = contexts.get(self.context_id)
+        if context is not None:
+            entry["contexte_brut"] = context
+        if self.timestamp_us is not None:
+            entry["timestamp"] = us_to_iso(self.timestamp_us)
+        entry["confidence"] = self.confidence
+        entry["count"] = self.count
+        if self.extra:
+            entry.update(self.extra)
+        return entry
@@ -1,38 +1,47 @@
 import json
 import os
-from typing import Dict, Optional, List
-from .utils import get_composite_key
+from typing import Dict, Iterator, Optional, List, Tuple
+from .utils import get_composite_key, LineKeys, match_case
+from .knowledge_store import KnowledgeStore, backoff_key
+
+# [Backoff] Niveaux de recherche, du plus précis au plus général
+BACKOFF_LEVELS = ("exact", "window1", "word")
+# [Rule Promotion] Règles compilées depuis les entrées stables, à côté du journal JSONL
+PROMOTED_RULES_NAME = "promoted_rules.jsonl"
 
 class KnowledgeManager:
     """
     Gère la base de connaissances (master_kb.jsonl) et fournit des capacités
     de cache intelligent et de recherche RAG.
+    [KB Store] Les recherches passent par un index SQLite (master_kb.sqlite) à côté du JSONL :
+    plus de chargement complet au démarrage, et un mode lecture seule pour les workers.
+    [Backoff] lookup/lookup_line se replient sur la fenêtre ±1 puis sur le mot seul
+    quand la fenêtre exacte est inconnue (taux par niveau : report_lookup_stats).
+    [Rule Promotion] promote_rules() compile les entrées stables en SmartRules contextuelles
+    appliquées en masse avant le LLM (plus de sonde KB mot par mot dans la boucle de routage).
     """
-    
-    def __init__(self, kb_path: str = "data/knowledge/master_kb.jsonl"):
+
+    def __init__(self, kb_path: str = "data/knowledge/master_kb.jsonl", read_only: bool = False):
         self.kb_path = kb_path
-        self.memory: Dict[str, dict] = {} # Key: composite_key, Value: entry
+        self.db_path = os.path.splitext(kb_path)[0] + ".sqlite"
+        self.promoted_rules_path = os.path.join(os.path.dirname(kb_path), PROMOTED_RULES_NAME)
+        self.read_only = read_only and os.path.exists(self.db_path)
+        self.store = KnowledgeStore(self.db_path, read_only=self.read_only)
+        # [Backoff] (vues minimales, part minimale de la cible dominante) par niveau de repli
+        self.backoff_thresholds = {1: (2, 0.8), 2: (3, 0.9)}
+        self.lookup_stats = {level: 0 for level in BACKOFF_LEVELS + ("miss",)}
         self.load_memory()
 
     def load_memory(self):
-        """Charge la mémoire depuis le fichier JSONL."""
-        if not os.path.exists(self.kb_path):
+        """
+        Synchronise l'index avec le fichier JSONL (réimport seulement s'il a changé).
+        En lecture seule, l'index est utilisé tel quel (démarrage O(1)).
+        """
+        if self.read_only:
             return
-            
         try:
-            with open(self.kb_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        entry = json.loads(line)
-                        key = entry.get('key')
-                        if key:
-                            # On initialise count à 1 si absent (compatibilité V6)
-                            if 'count' not in entry:
-                                entry['count'] = 1
-                            # On initialise confidence si absent
-                            if 'confidence' not in entry:
-                                entry['confidence'] = 1.0
-                            self.memory[key] = entry
+            if self.store.sync_from_jsonl(self.kb_path):
+                print(f"🗂️ Index KB reconstruit depuis {self.kb_path} ({len(self.store)} entrées).")
         except Exception as e:
             print(f"⚠️ Erreur lors du chargement de la mémoire: {e}")
 
@@ -41,38 +50,203 @@ class KnowledgeManager:
         Cherche une correction connue pour un mot dans son contexte.
         Retourne l'entrée si trouvée, avec un flag 'can_fast_track'.
         """
-        key = get_composite_key(word, context)
-        entry = self.memory.get(key)
-        if entry:
-            # Seuil de confiance pour le Fast-Track (bypass LLM)
-            # Un mot vu 2+ fois ou avec une confiance explicite de 1.0 est fast-trackable.
-            entry['can_fast_track'] = entry.get('confidence', 0) >= 0.9 or entry.get('count', 1) >= 2
+        return self._resolve([get_composite_key(word, context)], [word])[0]
+
+    def lookup_line(self, line: str, targets: List[Tuple[str, int]]) -> List[Optional[dict]]:
+        """
+        [Line Keys] Cherche d'un coup plusieurs mots d'une même ligne.
+        `targets` : couples (mot, offset dans la ligne) ; une entrée (ou None) par cible.
+        La ligne n'est tokenisée qu'une fois et chaque occurrence garde sa propre fenêtre.
+        """
+        return self._resolve(LineKeys(line).keys(targets), [word for word, _ in targets])
+
+    def _resolve(self, keys: List[str], words: List[str]) -> List[Optional[dict]]:
+        """
+        [Backoff] Fenêtre exacte de 5 mots, puis fenêtre ±1, puis mot seul.
+        Un niveau de repli n'est retenu que si sa cible domine (vues et part minimales) ;
+        une entrée exacte pas encore fast-trackable laisse sa chance aux niveaux suivants.
+        """
+        found = self.store.get_many(keys)
+        results = []
+        pending = []
+        for i, key in enumerate(keys):
+            entry = found.get(key)
+            if entry:
+                entry = self._mark_fast_track(dict(entry))
+                entry['match_level'] = 0
+            results.append(entry)
+            if entry and entry['can_fast_track']:
+                self.lookup_stats[BACKOFF_LEVELS[0]] += 1
+            else:
+                pending.append(i)
+
+        for level in (1, 2):
+            if not pending:
+                break
+            bkeys = {i: backoff_key(keys[i], level) for i in pending}
+            table = self.store.get_backoff_many(level, [b for b in bkeys.values() if b is not None])
+            still_pending = []
+            for i in pending:
+                entry = self._backoff_entry(keys[i], words[i], level, table.get(bkeys[i]))
+                if entry:
+                    results[i] = entry
+                    self.lookup_stats[BACKOFF_LEVELS[level]] += 1
+                else:
+                    still_pending.append(i)
+            pending = still_pending
+        self.lookup_stats["miss"] += len(pending)
+        return results
+
+    def _backoff_entry(self, key: str, word: str, level: int, candidates) -> Optional[dict]:
+        if not candidates:
+            return None
+        min_count, min_share = self.backoff_thresholds[level]
+        mot_cible, count = candidates[0]
+        total = sum(c for _, c in candidates)
+        share = count / total
+        if count < min_count or share < min_share:
+            return None
+        return {
+            "key": key,
+            "mot_source": word,
+            "mot_cible": match_case(word, mot_cible),
+            "count": count,
+            "confidence": round(share, 3),
+            "match_level": level,
+            "can_fast_track": True,
+        }
+
+    def report_lookup_stats(self) -> Dict:
+        """[Backoff] Taux de résolution par niveau (exact, fenêtre ±1, mot seul) et échecs."""
+        total = sum(self.lookup_stats.values())
+        return {
+            level: {"hits": hits, "rate": round(hits / total, 3) if total else 0.0}
+            for level, hits in self.lookup_stats.items()
+        }
+
+    @staticmethod
+    def _mark_fast_track(entry: dict) -> dict:
+        # Seuil de confiance pour le Fast-Track (bypass LLM)
+        # Un mot vu 2+ fois ou avec une confiance explicite de 1.0 est fast-trackable.
+        entry['can_fast_track'] = entry.get('confidence', 0) >= 0.9 or entry.get('count', 1) >= 2
         return entry
 
+    def iter_promotable_rules(self) -> Iterator[dict]:
+        """
+        [Rule Promotion] SmartRules contextuelles issues des entrées stables, par niveau :
+        - 0 : entrée fast-trackable (vue 2+ fois ou confiance >= 0.9), conditionnée à sa fenêtre de 5 mots ;
+        - 1, 2 : clé réduite (fenêtre ±1, mot seul) dont la cible domine (mêmes seuils que le repli).
+        Les entrées qui confirment le mot tel quel (cible = source) deviennent des règles de
+        validation : le mot est connu et ne part plus au LLM.
+        """
+        for entry in self.store.iter_entries():
+            if entry.get('mot_cible') is None or not self._mark_fast_track(entry)['can_fast_track']:
+                continue
+            yield self._promoted_rule(0, entry['key'], entry['mot_source'], entry['mot_cible'],
+                                      entry.get('count', 1), entry.get('confidence', 1.0))
+
+        for level in (1, 2):
+            min_count, min_share = self.backoff_thresholds[level]
+            for bkey, candidates in self.store.iter_backoff_groups(level):
+                mot_cible, count = candidates[0]
+                share = count / sum(c for _, c in candidates)
+                if count >= min_count and share >= min_share:
+                    yield self._promoted_rule(level, bkey, bkey.rpartition("|")[0] or bkey, mot_cible,
+                                              count, round(share, 3))
+
+    @staticmethod
+    def _promoted_rule(level: int, context_key: str, trigger: str, correction: str,
+                       count: int, confidence: float) -> dict:
+        return {
+            "type": "SmartRule",
+            "trigger_word": trigger,
+            "correction": correction,
+            "conditions": ["dictionary_check_required", "kb_context"],
+            "context_level": level,
+            "context_key": context_key,
+            "kb_count": count,
+            "confidence": confidence,
+            "usage_count": 0,
+        }
+
+    def promote_rules(self, rules_path: Optional[str] = None) -> int:
+        """
+        [Rule Promotion] Réécrit (atomiquement) le fichier de règles promues ; retourne leur nombre.
+        La signature du journal est mémorisée : rules_are_stale() indique quand relancer.
+        """
+        rules_path = rules_path or self.promoted_rules_path
+        os.makedirs(os.path.dirname(rules_path) or ".", exist_ok=True)
+        tmp_path = rules_path + ".tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for rule in self.iter_promotable_rules():
+                f.write(json.dumps(rule, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, rules_path)
+        if not self.read_only:
+            self.store.set_meta("promoted_signature", self.store.get_meta("jsonl_signature") or "")
+        return count
+
+    def rules_are_stale(self, rules_path: Optional[str] = None) -> bool:
+        """Les règles promues sont-elles absentes ou antérieures au dernier état du journal ?"""
+        if not os.path.exists(rules_path or self.promoted_rules_path):
+            return True
+        return self.store.get_meta("promoted_signature") != (self.store.get_meta("jsonl_signature") or "")
+
     def get_precedents(self, text: str, k: int = 3) -> List[dict]:
         """
-        Recherche RAG (simple) pour trouver des exemples proches lexicalement.
+        Recherche RAG : les k exemples les plus proches lexicalement
+        (index inversé mots + trigrammes, classement par recouvrement).
         """
-        # Pour l'instant, simple match sur les mots sources présents dans le texte
-        matches = []
-        text_lower = text.lower()
-        for entry in self.memory.values():
-            if entry['mot_source'].lower() in text_lower:
-                matches.append(entry)
-                if len(matches) >= k:
-                    break
-        return matches
+        return self.store.find_precedents(text, k)
 
     def add_correction(self, entry: dict):
         """Ajoute une nouvelle correction validée à la mémoire."""
-        key = entry.get('key')
-        if not key:
+        if not entry.get('key'):
             return
-            
-        # Mise à jour mémoire vive
-        self.memory[key] = entry
-        
+        self.upsert_entries([entry])
+
+    def upsert_entries(self, entries: List[dict]) -> int:
+        """
+        [KB Consolidation] Mise à jour incrémentale : index SQLite + ajout au journal JSONL.
+        Les lignes plus récentes du journal remplacent les anciennes pour une même clé.
+        """
+        entries = [e for e in entries if e.get('key')]
+        if not entries or self.read_only:
+            return 0
+
+        # Mise à jour de l'index
+        self.store.upsert_many(entries)
+
         # Sauvegarde persistante (append)
         os.makedirs(os.path.dirname(self.kb_path), exist_ok=True)
         with open(self.kb_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        journal_lines = int(self.store.get_meta("jsonl_lines") or 0) + len(entries)
+        self.store.set_meta("jsonl_lines", str(journal_lines))
+        # Le JSONL modifié par nous-mêmes ne doit pas déclencher de réimport
+        self.store.set_meta("jsonl_signature", KnowledgeStore.file_signature(self.kb_path))
+        return len(entries)
+
+    def needs_compaction(self, ratio: float = 2.0) -> bool:
+        """Le journal contient-il beaucoup plus de lignes que d'entrées distinctes ?"""
+        journal_lines = int(self.store.get_meta("jsonl_lines") or 0)
+        return journal_lines > ratio * max(1, len(self.store))
+
+    def compact(self) -> int:
+        """
+        [KB Consolidation] Réécrit le journal JSONL avec une ligne par clé (état de l'index),
+        de façon atomique. Retourne le nombre d'entrées écrites.
+        """
+        if self.read_only:
+            return 0
+        tmp_path = self.kb_path + ".tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.store.iter_entries():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, self.kb_path)
+        self.store.set_meta("jsonl_lines", str(count))
+        self.store.set_meta("jsonl_signature", KnowledgeStore.file_signature(self.kb_path))
+        return count
@@ -0,0 +1,560 @@
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .kb_record import KNOWN_FIELDS, iso_to_us, us_to_iso
+
+# [Precedent Index] Poids des familles de termes de l'index inversé :
+# mot source exact > mot du contexte > trigramme de caractères du mot source (variantes OCR).
+TERM_WEIGHTS = {"w": 3.0, "c": 1.0, "t": 0.5}
+# [Compact KB] Version du schéma : une base d'une autre version est recréée puis réimportée du JSONL
+SCHEMA_VERSION = "4"
+# Nombre maximal de paramètres par requête IN (...)
+_CHUNK = 900
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in re.findall(r"\w+", (text or "").lower()) if len(w) >= 2]
+
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _chunks(items: List, size: int = _CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def index_terms(entry: dict) -> Set[str]:
+    """Termes indexés par entrée : mots et trigrammes de mot_source."""
+    source_words = _words(entry.get('mot_source', ''))
+    terms = {f"w:{w}" for w in source_words}
+    for w in source_words:
+        terms.update(f"t:{tri}" for tri in _trigrams(w))
+    return terms
+
+
+def context_terms(context: str) -> Set[str]:
+    """Termes indexés une seule fois par contexte (partagé par toutes ses entrées) : ses mots."""
+    return {f"c:{w}" for w in _words(context)}
+
+
+def backoff_key(key: str, level: int) -> Optional[str]:
+    """
+    [Backoff] Clé réduite d'une clé composite 'mot|w-2+w-1+___+w+1+w+2' :
+    niveau 1 -> 'mot|w-1+___+w+1' (fenêtre ±1), niveau 2 -> 'mot' (mot seul).
+    """
+    mot, _, pattern = key.rpartition("|")
+    if level == 2:
+        return mot
+    window = pattern.split("+")
+    if "___" not in window:
+        return None  # UNKNOWN_CONTEXT : pas de fenêtre réduite
+    idx = window.index("___")
+    return f"{mot}|{'+'.join(window[max(0, idx - 1):idx + 2])}"
+
+
+def query_terms(text: str) -> Set[str]:
+    """Termes de requête pour un texte à corriger (chaque mot peut être une source ou un contexte)."""
+    terms = set()
+    for w in _words(text):
+        terms.add(f"w:{w}")
+        terms.add(f"c:{w}")
+        terms.update(f"t:{tri}" for tri in _trigrams(w))
+    return terms
+
+
+class KnowledgeStore:
+    """
+    [KB Store] Stockage indexé (SQLite) de la base de connaissances.
+    - Index sur `key` (clé primaire) et `mot_source` : recherches paresseuses, sans
+      charger la base en mémoire (démarrage O(1), mémoire indépendante de la taille de la KB).
+    - Mode lecture seule (read_only=True) pour les workers, partagé entre processus.
+    - Le fichier JSONL (master_kb.jsonl) reste le journal d'échange : il est réimporté
+      automatiquement s'il a été modifié hors du store (signature taille/date).
+    - [Precedent Index] Index inversé (mots + trigrammes du mot source, mots du contexte)
+      tenu à jour à chaque upsert : find_precedents() classe les exemples par recouvrement
+      pondéré (IDF) en ne lisant que les listes des termes discriminants.
+    - [Backoff] Index des vues par clé réduite (fenêtre ±1, mot seul) pour les recherches
+      de repli quand la fenêtre exacte de 5 mots est inconnue.
+    - [Compact KB] Chaque contexte n'est stocké (et indexé) qu'une fois dans `contexts` ;
+      horodatage et confiance sont numériques, sans copie JSON de l'entrée.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contexts (id INTEGER PRIMARY KEY, text TEXT NOT NULL UNIQUE);
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        mot_source TEXT NOT NULL,
+        source_lc TEXT NOT NULL,
+        mot_cible TEXT,
+        context_id INTEGER,
+        timestamp_us INTEGER,
+        confidence REAL NOT NULL DEFAULT 1.0,
+        count INTEGER NOT NULL DEFAULT 1,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_source_lc ON entries(source_lc);
+    CREATE INDEX IF NOT EXISTS idx_entries_context ON entries(context_id);
+    CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        entry_id INTEGER NOT NULL,
+        PRIMARY KEY (term, entry_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_postings_entry ON postings(entry_id);
+    CREATE TABLE IF NOT EXISTS context_postings (
+        term TEXT NOT NULL,
+        context_id INTEGER NOT NULL,
+        PRIMARY KEY (term, context_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS backoff (
+        level INTEGER NOT NULL,
+        bkey TEXT NOT NULL,
+        mot_cible TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (level, bkey, mot_cible)
+    ) WITHOUT ROWID;
+    """
+    TABLES = ("contexts", "entries", "meta", "postings", "context_postings", "terms", "backoff")
+    ENTRY_COLUMNS = "e.key, e.mot_source, e.mot_cible, c.text, e.timestamp_us, e.confidence, e.count, e.extra"
+
+    def __init__(self, db_path: str, read_only: bool = False, max_df_ratio: float = 0.05,
+                 max_postings: int = 1000, source_candidates: int = 200, context_candidates: int = 50):
+        self.db_path = db_path
+        self.read_only = read_only
+        # Termes présents dans plus de max_df_ratio des entrées : ignorés à la requête (trop peu discriminants)
+        self.max_df_ratio = max_df_ratio
+        # Plafond absolu de longueur de liste lue par terme : le coût d'une requête reste borné
+        self.max_postings = max_postings
+        # Entrées (par mot source) et contextes les mieux classés retenus comme candidats
+        self.source_candidates = source_candidates
+        self.context_candidates = context_candidates
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._counts = None
+        if not read_only:
+            with self._lock:
+                conn = self._conn()
+                if self._schema_version(conn) != SCHEMA_VERSION:
+                    # Base d'un format antérieur : recréée, puis réimportée depuis le journal JSONL
+                    for table in self.TABLES:
+                        conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.executescript(self.SCHEMA)
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('schema_version', ?)",
+                             (SCHEMA_VERSION,))
+                conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connexion du processus courant (rouverte après un fork, jamais partagée entre processus)."""
+        if self._connection is None or self._pid != os.getpid():
+            if self.read_only:
+                uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+                self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            else:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                # WAL + NORMAL : pas de fsync à chaque commit (seul le dernier lot peut être perdu,
+                # il est de toute façon dans le journal JSONL) ; cache plus large pour les imports
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+                self._connection.execute("PRAGMA cache_size=-65536")
+            self._pid = os.getpid()
+        return self._connection
+
+    @staticmethod
+    def _schema_version(conn: sqlite3.Connection) -> Optional[str]:
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'schema_version'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    # --- Lecture ---
+
+    @staticmethod
+    def _row_to_entry(row) -> dict:
+        key, mot_source, mot_cible, context, timestamp_us, confidence, count, extra = row
+        entry = {"key": key, "mot_source": mot_source, "mot_cible": mot_cible}
+        if context is not None:
+            entry["contexte_brut"] = context
+        if timestamp_us is not None:
+            entry["timestamp"] = us_to_iso(timestamp_us)
+        entry["confidence"] = confidence
+        entry["count"] = count
+        if extra:
+            entry.update(json.loads(extra))
+        return entry
+
+    def _select_entries(self, conn: sqlite3.Connection, where: str, params=()) -> list:
+        return conn.execute(
+            f"SELECT {self.ENTRY_COLUMNS} FROM entries e LEFT JOIN contexts c ON c.id = e.context_id WHERE {where}",
+            params
+        ).fetchall()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            rows = self._select_entries(self._conn(), "e.key = ?", (key,))
+        return self._row_to_entry(rows[0]) if rows else None
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        """Entrées des clés demandées ({clé: entrée}, clés absentes omises)."""
+        keys = list(set(keys))
+        found = {}
+        with self._lock:
+            conn = self._conn()
+            for chunk in _chunks(keys):
+                placeholders = ",".join("?" * len(chunk))
+                for row in self._select_entries(conn, f"e.key IN ({placeholders})", tuple(chunk)):
+                    found[row[0]] = self._row_to_entry(row)
+        return found
+
+    def get_backoff_many(self, level: int, bkeys: Iterable[str]) -> dict:
+        """
+        [Backoff] Cibles observées pour des clés réduites d'un niveau :
+        {clé réduite: [(mot_cible, nombre de vues), ...] par vues décroissantes}.
+        """
+        bkeys = list(set(bkeys))
+        table = {}
+        try:
+            with self._lock:
+                conn = self._conn()
+                rows = []
+                for chunk in _chunks(bkeys):
+                    placeholders = ",".join("?" * len(chunk))
+                    rows.extend(conn.execute(
+                        f"SELECT bkey, mot_cible, count FROM backoff WHERE level = ? AND bkey IN ({placeholders})",
+                        (level, *chunk)
+                    ).fetchall())
+        except sqlite3.OperationalError:
+            return {}  # Base lue en lecture seule avant sa première construction
+        for bkey, mot_cible, count in sorted(rows, key=lambda r: -r[2]):
+            table.setdefault(bkey, []).append((mot_cible, count))
+        return table
+
+    def iter_backoff_groups(self, level: int) -> Iterator[Tuple[str, List[Tuple[str, int]]]]:
+        """[Backoff] Parcourt toutes les clés réduites d'un niveau : (clé, [(mot_cible, vues), ...])."""
+        try:
+            with self._lock:
+                rows = self._conn().execute(
+                    "SELECT bkey, mot_cible, count FROM backoff WHERE level = ? ORDER BY bkey, count DESC",
+                    (level,)
+                ).fetchall()
+        except sqlite3.OperationalError:
+            return
+        for bkey, group in groupby(rows, key=lambda r: r[0]):
+            yield bkey, [(mot_cible, count) for _, mot_cible, count in group]
+
+    def find_by_sources(self, words: Iterable[str], limit: int = 3) -> List[dict]:
+        """Entrées dont le mot_source (minuscules) figure dans `words` (index mot_source)."""
+        words = list(set(words))[:_CHUNK]
+        if not words:
+            return []
+        placeholders = ",".join("?" * len(words))
+        with self._lock:
+            rows = self._select_entries(self._conn(), f"e.source_lc IN ({placeholders}) LIMIT ?", (*words, limit))
+        return [self._row_to_entry(r) for r in rows]
+
+    def find_precedents(self, text: str, k: int = 3) -> List[dict]:
+        """
+        [Precedent Index] Top-k des entrées par score de recouvrement avec `text`
+        (somme des poids × IDF des termes partagés). Seules les listes des termes
+        discriminants sont lues : le coût dépend de leur taille, pas de celle de la KB.
+        Le score d'une entrée = termes de son mot source + termes de son contexte.
+        """
+        terms = list(query_terms(text))
+        if not terms or k <= 0:
+            return []
+        try:
+            with self._lock:
+                conn = self._conn()
+                total_entries, total_contexts = self._count_rows(conn)
+                if not total_entries:
+                    return []
+                weights = {}
+                for chunk in _chunks(terms):
+                    placeholders = ",".join("?" * len(chunk))
+                    for term, df in conn.execute(
+                        f"SELECT term, df FROM terms WHERE term IN ({placeholders})", tuple(chunk)
+                    ):
+                        total = total_contexts if term[0] == "c" else total_entries
+                        if 0 < df <= min(self.max_postings, max(50, int(total * self.max_df_ratio))):
+                            weights[term] = TERM_WEIGHTS[term[0]] * math.log(1.0 + total / df)
+                if not weights:
+                    return []
+
+                # Agrégation des scores dans SQLite (table temporaire des poids de la requête)
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_weights (term TEXT PRIMARY KEY, w REAL)")
+                conn.execute("DELETE FROM query_weights")
+                conn.executemany("INSERT INTO query_weights (term, w) VALUES (?, ?)", weights.items())
+                source_scores = dict(conn.execute(
+                    "SELECT p.entry_id, SUM(q.w) AS score FROM query_weights q CROSS JOIN postings p ON p.term = q.term "
+                    "GROUP BY p.entry_id ORDER BY score DESC LIMIT ?", (self.source_candidates,)
+                ))
+                context_scores = dict(conn.execute(
+                    "SELECT p.context_id, SUM(q.w) AS score FROM query_weights q "
+                    "CROSS JOIN context_postings p ON p.term = q.term "
+                    "GROUP BY p.context_id ORDER BY score DESC LIMIT ?", (self.context_candidates,)
+                ))
+
+                # Candidats : meilleures entrées par mot source + entrées des meilleurs contextes
+                candidates = {}
+                for column, ids in (("context_id", list(context_scores)), ("id", list(source_scores))):
+                    for chunk in _chunks(ids):
+                        placeholders = ",".join("?" * len(chunk))
+                        for entry_id, key, context_id in conn.execute(
+                            f"SELECT id, key, context_id FROM entries WHERE {column} IN ({placeholders})", tuple(chunk)
+                        ):
+                            candidates[key] = (entry_id, context_id)
+        except sqlite3.OperationalError:
+            # Index lu en lecture seule avant sa première construction
+            return self.find_by_sources(_words(text), limit=k)
+
+        scores = {
+            key: source_scores.get(entry_id, 0.0) + context_scores.get(context_id, 0.0)
+            for key, (entry_id, context_id) in candidates.items()
+        }
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+        found = self.get_many([key for key, _ in best])
+        results = []
+        for key, score in best:
+            entry = found.get(key)
+            if entry:
+                entry['precedent_score'] = round(score, 3)
+                results.append(entry)
+        return results
+
+    def _count_rows(self, conn: sqlite3.Connection):
+        """(nombre d'entrées, nombre de contextes), mis en cache jusqu'à la prochaine écriture."""
+        if self._counts is None:
+            self._counts = (
+                conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0],
+            )
+        return self._counts
+
+    def iter_entries(self, batch_size: int = 5000) -> Iterator[dict]:
+        """Parcourt toutes les entrées par lots (sans tout charger en mémoire)."""
+        last_key = ""
+        while True:
+            with self._lock:
+                rows = self._select_entries(
+                    self._conn(), "e.key > ? ORDER BY e.key LIMIT ?", (last_key, batch_size)
+                )
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_entry(row)
+            last_key = rows[-1][0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    # --- Écriture ---
+
+    def upsert_many(self, entries: Iterable[dict]):
+        # Une clé répétée dans le lot : la dernière l'emporte
+        latest = {entry['key']: entry for entry in entries if entry.get('key')}
+        if not latest:
+            return
+        with self._lock:
+            conn = self._conn()
+            context_ids = self._context_ids(conn, {e.get('contexte_brut') for e in latest.values()})
+            rows = []
+            for key, entry in latest.items():
+                extra = {k: v for k, v in entry.items() if k not in KNOWN_FIELDS}
+                mot_source = str(entry.get('mot_source', ''))
+                rows.append((
+                    key,
+                    mot_source,
+                    mot_source.lower(),
+                    entry.get('mot_cible'),
+                    context_ids.get(entry.get('contexte_brut')),
+                    iso_to_us(entry.get('timestamp')),
+                    float(entry.get('confidence', 1.0)),
+                    int(entry.get('count', 1)),
+                    json.dumps(extra, ensure_ascii=False) if extra else None,
+                ))
+            self._unindex_keys(conn, list(latest))
+            # UPSERT (et non REPLACE) : l'identifiant d'une entrée existante est conservé
+            conn.executemany(
+                "INSERT INTO entries "
+                "(key, mot_source, source_lc, mot_cible, context_id, timestamp_us, confidence, count, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "mot_source = excluded.mot_source, source_lc = excluded.source_lc, mot_cible = excluded.mot_cible, "
+                "context_id = excluded.context_id, timestamp_us = excluded.timestamp_us, "
+                "confidence = excluded.confidence, count = excluded.count, extra = excluded.extra", rows
+            )
+            entry_ids = {}
+            for chunk in _chunks(list(latest)):
+                placeholders = ",".join("?" * len(chunk))
+                entry_ids.update(conn.execute(f"SELECT key, id FROM entries WHERE key IN ({placeholders})", tuple(chunk)))
+            self._index_entries(conn, [(entry_ids[key], key, entry) for key, entry in latest.items()])
+            conn.commit()
+            self._counts = None
+
+    @staticmethod
+    def _context_ids(conn: sqlite3.Connection, texts: Set[Optional[str]]) -> Dict[str, int]:
+        """Identifiants des contextes (insérés et indexés une seule fois s'ils sont nouveaux)."""
+        texts = [t for t in texts if t is not None]
+        ids = {}
+        for chunk in _chunks(texts):
+            placeholders = ",".join("?" * len(chunk))
+            ids.update(conn.execute(f"SELECT text, id FROM contexts WHERE text IN ({placeholders})", tuple(chunk)))
+        new_texts = [t for t in texts if t not in ids]
+        if not new_texts:
+            return ids
+
+        postings = []
+        df = Counter()
+        for text in new_texts:
+            context_id = conn.execute("INSERT INTO contexts (text) VALUES (?)", (text,)).lastrowid
+            ids[text] = context_id
+            terms = context_terms(text)
+            postings.extend((term, context_id) for term in terms)
+            df.update(terms)
+        conn.executemany("INSERT OR IGNORE INTO context_postings (term, context_id) VALUES (?, ?)", postings)
+        conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+            df.items()
+        )
+        return ids
+
+    @staticmethod
+    def _unindex_keys(conn: sqlite3.Connection, keys: List[str]):
+        """Retire les postings et vues de backoff existants de ces clés (mise à jour incrémentale)."""
+        existing = []
+        for chunk in _chunks(keys):
+            placeholders = ",".join("?" * len(chunk))
+            existing.extend(conn.execute(
+                f"SELECT id, key, mot_cible, count FROM entries WHERE key IN ({placeholders})", tuple(chunk)
+            ))
+        for entry_id, key, mot_cible, count in existing:
+            if mot_cible is not None:
+                for level in (1, 2):
+                    bkey = backoff_key(key, level)
+                    if bkey is not None:
+                        params = (level, bkey, mot_cible)
+                        conn.execute(
+                            "UPDATE backoff SET count = count - ? WHERE level = ? AND bkey = ? AND mot_cible = ?",
+                            (count, *params)
+                        )
+                        conn.execute(
+                            "DELETE FROM backoff WHERE level = ? AND bkey = ? AND mot_cible = ? AND count <= 0", params
+                        )
+            old_terms = [r[0] for r in conn.execute("SELECT term FROM postings WHERE entry_id = ?", (entry_id,))]
+            if not old_terms:
+                continue
+            conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(t,) for t in old_terms])
+            conn.execute("DELETE FROM postings WHERE entry_id = ?", (entry_id,))
+
+    @staticmethod
+    def _index_entries(conn: sqlite3.Connection, keyed_entries):
+        """Indexe des triplets (id, clé, entrée) : postings du mot source et vues de backoff."""
+        postings = []
+        df = Counter()
+        for entry_id, _, entry in keyed_entries:
+            terms = index_terms(entry)
+            postings.extend((term, entry_id) for term in terms)
+            df.update(terms)
+        conn.executemany("INSERT OR IGNORE INTO postings (term, entry_id) VALUES (?, ?)", postings)
+        conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+            df.items()
+        )
+
+        # [Backoff] Vues agrégées par clé réduite (fenêtre ±1, mot seul) et par cible
+        views = Counter()
+        for _, key, entry in keyed_entries:
+            if entry.get('mot_cible') is None:
+                continue
+            for level in (1, 2):
+                bkey = backoff_key(key, level)
+                if bkey is not None:
+                    views[(level, bkey, entry['mot_cible'])] += int(entry.get('count', 1))
+        conn.executemany(
+            "INSERT INTO backoff (level, bkey, mot_cible, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(level, bkey, mot_cible) DO UPDATE SET count = count + excluded.count",
+            [(*k, v) for k, v in views.items()]
+        )
+
+    def upsert(self, entry: dict):
+        self.upsert_many([entry])
+
+    def clear(self):
+        with self._lock:
+            conn = self._conn()
+            for table in self.TABLES:
+                if table != "meta":
+                    conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+            self._counts = None
+
+    # --- Synchronisation avec le journal JSONL ---
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        with self._lock:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+            conn.commit()
+
+    @staticmethod
+    def file_signature(path: str) -> str:
+        """Signature (taille, date) d'un fichier ; vide s'il n'existe pas."""
+        if not os.path.exists(path):
+            return ""
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def sync_from_jsonl(self, jsonl_path: str) -> bool:
+        """
+        Réimporte entièrement le JSONL s'il a changé depuis le dernier import.
+        Retourne True si un import a eu lieu.
+        """
+        signature = self.file_signature(jsonl_path)
+        if signature == (self.get_meta("jsonl_signature") or ""):
+            return False
+
+        self.clear()
+        lines = 0
+        if signature:
+            batch = []
+            with open(jsonl_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+                    lines += 1
+                    if len(batch) >= 5000:
+                        self.upsert_many(batch)
+                        batch = []
+            self.upsert_many(batch)
+        self.set_meta("jsonl_lines", str(lines))
+        self.set_meta("jsonl_signature", signature)
+        return True
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
@@ -0,0 +1,199 @@
+"""
+[Model Server] Un seul processus llama.cpp (llama-server) possède le modèle GGUF et sert
+plusieurs séquences en parallèle (--parallel N, continuous batching) : les workers ne
+chargent plus chacun leur copie du modèle, le passage à l'échelle vient de la taille du lot.
+
+- LlamaServerProcess : lance (et arrête) llama-server pour un modèle.
+- LlamaServerModel : client HTTP utilisable à la place d'un objet `Llama` (même appel
+  model(prompt, max_tokens=..., stop=..., temperature=...) et même forme de réponse).
+"""
+import http.client
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import urlparse
+
+
+# Connexion keep-alive fermée ou serveur en redémarrage (RemoteDisconnected hérite de
+# ConnectionResetError) : la requête n'a pas été traitée, une reprise est sans risque
+RETRYABLE_ERRORS = (ConnectionRefusedError, ConnectionResetError, BrokenPipeError)
+
+
+class LlamaServerModel:
+    """Modèle distant (llama-server) compatible avec l'interface d'appel de llama_cpp.Llama."""
+
+    remote = True
+
+    def __init__(self, base_url: str, timeout: float = 600.0):
+        parsed = urlparse(base_url)
+        self.base_url = base_url.rstrip("/")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        self.timeout = timeout
+        # Une connexion keep-alive par thread : les requêtes concurrentes occupent des slots distincts
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        """Ferme la connexion du thread (réponse en attente ou état inconnu) : la suivante sera neuve."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _request(self, method: str, path: str, body: dict = None) -> dict:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(2):
+            conn = self._connection(fresh=attempt > 0)
+            try:
+                conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = response.read()
+            except RETRYABLE_ERRORS:
+                if attempt:
+                    self._drop_connection()
+                    raise
+                continue  # Une seule reprise, sur une connexion neuve
+            except (http.client.HTTPException, OSError):
+                # Timeout ou réponse illisible : la génération a pu avoir lieu, pas de reprise
+                self._drop_connection()
+                raise
+            if response.status >= 400:
+                raise RuntimeError(f"llama-server {path}: HTTP {response.status} {data[:200]!r}")
+            return json.loads(data) if data else {}
+
+    def __call__(self, prompt: str, max_tokens: int = 16, stop: Optional[List[str]] = None,
+                 temperature: float = 0.8, logprobs: Optional[int] = None, echo: bool = False,
+                 grammar=None, **kwargs) -> dict:
+        body = {
+            "prompt": prompt,
+            "n_predict": max_tokens,
+            "temperature": temperature,
+            "stop": stop or [],
+            "cache_prompt": True, # Préfixe du prompt système réutilisé par slot
+        }
+        if logprobs:
+            body["n_probs"] = logprobs
+        if isinstance(grammar, str):
+            body["grammar"] = grammar # GBNF en texte (les objets LlamaGrammar sont locaux)
+        out = self._request("POST", "/completion", body)
+        token_logprobs = self._token_logprobs(out) if logprobs else None
+        return {
+            "choices": [{
+                "text": out.get("content", ""),
+                "logprobs": {"token_logprobs": token_logprobs} if token_logprobs is not None else None,
+                "finish_reason": "stop" if out.get("stopped_eos") or out.get("stopped_word") else "length",
+            }],
+            "usage": {
+                "prompt_tokens": out.get("tokens_evaluated", 0),
+                "completion_tokens": out.get("tokens_predicted", 0),
+            },
+        }
+
+    @staticmethod
+    def _token_logprobs(out: dict) -> List[float]:
+        """Log-probabilités des tokens générés (format récent 'logprob' ou ancien 'probs')."""
+        values = []
+        for item in out.get("completion_probabilities") or []:
+            if "logprob" in item:
+                values.append(item["logprob"])
+                continue
+            chosen = next((p for p in item.get("probs") or [] if p.get("tok_str") == item.get("content")), None)
+            if chosen and chosen.get("prob"):
+                values.append(math.log(chosen["prob"]))
+        return values
+
+    def tokenize(self, text: bytes, add_bos: bool = True) -> List[int]:
+        content = text.decode("utf-8") if isinstance(text, bytes) else text
+        return self._request("POST", "/tokenize", {"content": content, "add_special": add_bos}).get("tokens", [])
+
+    def health(self) -> bool:
+        try:
+            return self._request("GET", "/health").get("status") == "ok"
+        except Exception:
+            return False
+
+
+class LlamaServerProcess:
+    """
+    Lance llama-server pour un modèle : `parallel` séquences simultanées (slots) de n_ctx tokens
+    chacune, continuous batching activé. Binaire : `binary`, $LLAMA_SERVER_BIN ou llama-server du PATH.
+    """
+
+    def __init__(self, model_path: str, parallel: int = 4, n_ctx: int = 2048, n_threads: Optional[int] = None,
+                 port: Optional[int] = None, host: str = "127.0.0.1", binary: Optional[str] = None,
+                 n_gpu_layers: int = 999):
+        self.model_path = model_path
+        self.parallel = parallel
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.host = host
+        self.port = port or self._free_port(host)
+        self.binary = binary or os.environ.get("LLAMA_SERVER_BIN") or shutil.which("llama-server")
+        self.n_gpu_layers = n_gpu_layers
+        self.process = None
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((host, 0))
+            return s.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def command(self) -> List[str]:
+        cmd = [
+            self.binary, "-m", self.model_path,
+            "--host", self.host, "--port", str(self.port),
+            "--parallel", str(self.parallel), "--cont-batching",
+            # Le contexte total est partagé entre les slots
+            "-c", str(self.n_ctx * self.parallel),
+            "-ngl", str(self.n_gpu_layers),
+        ]
+        if self.n_threads:
+            cmd += ["-t", str(self.n_threads)]
+        return cmd
+
+    def start(self, timeout: float = 600.0) -> "LlamaServerProcess":
+        if not self.binary:
+            raise RuntimeError("llama-server introuvable (PATH ou $LLAMA_SERVER_BIN)")
+        print(f"🧠 Model Server : {os.path.basename(self.model_path)} ({self.parallel} slots) sur {self.url}...")
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.DEVNULL, stderr=sys.stderr)
+        client = LlamaServerModel(self.url, timeout=5)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"llama-server s'est arrêté au démarrage (code {self.process.returncode})")
+            if client.health():
+                print("✅ Model Server prêt.")
+                return self
+            time.sleep(0.5) # 503 tant que le modèle charge
+        self.stop()
+        raise RuntimeError("llama-server : délai de chargement dépassé")
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
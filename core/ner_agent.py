@@ -1,14 +1,17 @@
+import hashlib
 import logging
 import subprocess
 import json
 import os
 import sys
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
 
 # Plus d'import de transformers ici !
 # Plus de config d'environnement non plus, c'est géré par le daemon.
 
 from correctors.semantic_corrector import SemanticCorrector
+from core.entity_index import EntityIndex, pack_sentences
 
 class NERAgent:
     """
@@ -17,12 +20,23 @@ class NERAgent:
     - Lance 'core/ner_daemon.py' en sous-processus isolé.
     - Communique via stdin/stdout (JSON).
     - Permet la cohabitation PyTorch (Daemon) et Llama.cpp (Principal).
+    [NER Cache] Les entités d'une ligne sont calculées une seule fois (mémoïsées par hash de la
+    ligne, LRU), quel que soit le nombre de mots inconnus qu'elle contient ; prefetch() envoie
+    les lignes d'un chapitre au daemon par lots (une requête = une passe batchée du pipeline).
     """
-    
+
+    CACHE_SIZE = 50000
+    BATCH_LINES = 64 # Lignes par requête au daemon
+    # [Entity Index] Segments de phrases entières sous la longueur max de CamemBERT (512 tokens,
+    # ~3,5 caractères par token en français : marge pour les mots rares découpés finement)
+    MAX_SEGMENT_CHARS = 1200
+
     def __init__(self, use_flaubert: bool = True):
         self.logger = logging.getLogger("NERAgent")
         self.use_flaubert = use_flaubert
         self.daemon_process = None
+        self._entity_cache = OrderedDict()
+        self.cache_stats = {"hits": 0, "misses": 0, "requests": 0}
         
         # 1. Lancer le Daemon si requis
         if self.use_flaubert:
@@ -59,45 +73,120 @@ class NERAgent:
             print(f"❌ Echec lancement Daemon : {e}")
             self.daemon_process = None
 
-    def analyze(self, word: str, context: str) -> Dict:
+    @staticmethod
+    def _line_key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _query_daemon(self, texts: List[str]) -> Optional[List[List[Dict]]]:
+        """Une requête batchée au daemon ; None si le daemon est mort (désactivé pour la session)."""
+        try:
+            self.daemon_process.stdin.write(json.dumps({"texts": texts}) + "\n")
+            self.daemon_process.stdin.flush()
+            response_line = self.daemon_process.stdout.readline()
+            if not response_line:
+                raise BrokenPipeError("Daemon sent empty response (crash)")
+            data = json.loads(response_line)
+            self.cache_stats["requests"] += 1
+            if data.get("status") != "ok":
+                self.logger.warning(f"⚠️ Daemon NER : {data.get('message')}")
+                return [[] for _ in texts]
+            return data.get("entities", [])
+        except (BrokenPipeError, json.JSONDecodeError, Exception) as e:
+            self.logger.warning(f"⚠️ Daemon CamemBERT crashed ({e}). Switching to Mistral-Only mode.")
+            print(f"⚠️ Daemon died. Fallback -> Mistral.")
+            self.daemon_process = None # Disable completely for this session
+            return None
+
+    def entities_batch(self, texts: Iterable[str]) -> List[Optional[List[Dict]]]:
+        """
+        [NER Cache] Entités de chaque texte : cache d'abord, puis les textes manquants (dédupliqués)
+        en requêtes de BATCH_LINES. None pour un texte si le daemon n'est pas disponible.
+        """
+        texts = list(texts)
+        keys = [self._line_key(t) for t in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in self._entity_cache:
+                self._entity_cache.move_to_end(key)
+                self.cache_stats["hits"] += 1
+            elif key not in missing:
+                missing[key] = text
+                self.cache_stats["misses"] += 1
+
+        pending = list(missing.items())
+        fresh = {}
+        for start in range(0, len(pending), self.BATCH_LINES):
+            if not self.daemon_process:
+                break
+            batch = pending[start:start + self.BATCH_LINES]
+            results = self._query_daemon([text for _, text in batch])
+            if results is None:
+                break
+            for (key, _), entities in zip(batch, results):
+                self._entity_cache[key] = fresh[key] = entities
+        while len(self._entity_cache) > self.CACHE_SIZE:
+            self._entity_cache.popitem(last=False)
+        # (une réponse déjà évincée par un très gros lot reste renvoyée à l'appelant)
+        return [self._entity_cache.get(key, fresh.get(key)) for key in keys]
+
+    def entities(self, text: str) -> Optional[List[Dict]]:
+        return self.entities_batch([text])[0]
+
+    def prefetch(self, texts: Iterable[str]) -> int:
+        """[NER Cache] Précalcule les entités de lignes (ex : un chapitre) ; renvoie le nombre de lignes."""
+        texts = list(texts)
+        if self.daemon_process and texts:
+            self.entities_batch(texts)
+        return len(texts)
+
+    def index_text(self, text: str) -> Optional[EntityIndex]:
+        """
+        [Entity Index] NER d'un chapitre entier : phrases regroupées en segments contigus
+        (MAX_SEGMENT_CHARS), envoyés par lots, spans ramenés aux offsets du chapitre.
+        None si le daemon n'est pas disponible (aucun verdict, plutôt qu'un index vide).
+        """
+        if not self.daemon_process:
+            return None
+        segments = pack_sentences(text, self.MAX_SEGMENT_CHARS)
+        results = self.entities_batch(text[start:end] for start, end in segments)
+        if any(entities is None for entities in results):
+            return None
+        spans = [
+            (start + ent["start"], start + ent["end"], ent["entity_group"], ent["score"])
+            for (start, _), entities in zip(segments, results) for ent in entities
+        ]
+        return EntityIndex(text, spans)
+
+    def analyze(self, word: str, context: str, index: Optional[EntityIndex] = None,
+                start: Optional[int] = None) -> Dict:
         """
         Orchestration du Pipeline V8 (NER).
-        1. Fast Check (Daemon FlauBERT).
+        1. Fast Check (Daemon FlauBERT) : index du chapitre (offset `start` du mot dans `context`),
+           sinon entités de la ligne en cache.
         2. Deep Check (Mistral) si ambigu.
         """
         
-        # Stage 1: FlauBERT via Daemon
-        if self.daemon_process:
-            try:
-                # Envoyer requête
-                payload = json.dumps({"text": context}) + "\n"
-                self.daemon_process.stdin.write(payload)
-                self.daemon_process.stdin.flush()
-                
-                # Lire réponse
-                response_line = self.daemon_process.stdout.readline()
-                if response_line:
-                    data = json.loads(response_line)
-                    if data.get("status") == "ok":
-                        entities = data.get("entities", [])
-                        
-                        # Check match
-                        for ent in entities:
-                            if word in ent['word'] or ent['word'] in word:
-                                if ent['score'] > 0.85:
-                                    return {
-                                        "is_proper_noun": True,
-                                        "type": ent['entity_group'],
-                                        "confidence": ent['score'],
-                                        "source": "FlauBERT (Daemon)"
-                                    }
-                else:
-                    raise BrokenPipeError("Daemon sent empty response (crash)")
-
-            except (BrokenPipeError, json.JSONDecodeError, Exception) as e:
-                self.logger.warning(f"⚠️ Daemon CamemBERT crashed ({e}). Switching to Mistral-Only mode.")
-                print(f"⚠️ Daemon died. Fallback -> Mistral.")
-                self.daemon_process = None # Disable completely for this session
+        # Stage 1: FlauBERT, précalculé pour le chapitre
+        base = index.line_offset(context) if index is not None and start is not None else None
+        if base is not None:
+            base -= len(context) - len(context.lstrip())
+            label = index.entity_at(base + start, base + start + len(word))
+            if label:
+                return {"is_proper_noun": True, "type": label, "confidence": 1.0, "source": "FlauBERT (Index)"}
+            return self._ask_mistral(word, context)
+
+        # Stage 1 bis: FlauBERT via Daemon
+        entities = self.entities(context) if self.daemon_process else None
+        for ent in entities or []:
+            # Check match
+            if word in ent['word'] or ent['word'] in word:
+                if ent['score'] > 0.85:
+                    return {
+                        "is_proper_noun": True,
+                        "type": ent['entity_group'],
+                        "confidence": ent['score'],
+                        "source": "FlauBERT (Daemon)"
+                    }
 
         # Stage 2: Mistral (Le Consul) / Fallback
         return self._ask_mistral(word, context)
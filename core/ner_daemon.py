@@ -4,7 +4,14 @@ import os
 
 # Configuration pour isolation totale
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-os.environ["OMP_NUM_THREADS"] = "1"
+# [Resource Planner] Threads du plan hérités du worker (l'affinité CPU l'est aussi), 1 sinon
+try:
+    NUM_THREADS = max(1, int(os.environ.get("SCRINIUM_N_THREADS", "1")))
+except ValueError:
+    NUM_THREADS = 1
+os.environ["OMP_NUM_THREADS"] = str(NUM_THREADS)
+# [NER Cache] Lignes par passe avant du pipeline pour les requêtes batchées
+BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", "16"))
 
 # Debugging: Log daemon activity to file
 import logging
@@ -17,7 +24,7 @@ import torch
 def run_daemon():
     # Configuration conservatrice
     # IMPORTANT: Dans le venv .ner_env, on utilise PyTorch pur.
-    torch.set_num_threads(1)
+    torch.set_num_threads(NUM_THREADS)
     
     # Chargement du modèle
     try:
@@ -50,21 +57,22 @@ def run_daemon():
                 break
             
             data = json.loads(line)
-            text = data.get("text", "")
+            # [NER Cache] {"texts": [...]} = un lot (une passe batchée du pipeline), {"text": ...} = une ligne
+            batched = "texts" in data
+            texts = data["texts"] if batched else [data.get("text", "")]
             
             # Inférence
-            entities = nlp(text)
+            results = nlp(texts, batch_size=BATCH_SIZE) if texts else []
             
             # Conversion en format sérialisable
-            serializable_entities = []
-            for ent in entities:
-                serializable_entities.append({
-                    "word": ent["word"],
-                    "entity_group": ent["entity_group"],
-                    "score": float(ent["score"]),
-                    "start": ent["start"],
-                    "end": ent["end"]
-                })
+            serialized = [[{
+                "word": ent["word"],
+                "entity_group": ent["entity_group"],
+                "score": float(ent["score"]),
+                "start": ent["start"],
+                "end": ent["end"]
+            } for ent in entities] for entities in results]
+            serializable_entities = serialized if batched else (serialized[0] if serialized else [])
             
             # Réponse
             print(json.dumps({"status": "ok", "entities": serializable_entities}))
@@ -1,24 +1,64 @@
 import re
-from typing import List
+from typing import List, Optional
+
+from core.capitalization_profile import follows_sentence_end
 
 class NerGuardian:
     """
     Guardian Contextuel (Phase 3 Brainstorming).
     Protects Named Entities (Proper Nouns, Titles) from modifications.
     Used by the Analyst to filter unsafe rules, and by the Corrector to block safe-guards.
+    [Entity Index] When the chapter being corrected has been through the NER pre-pass, callers
+    that know where the word sits (line + offset) get the NER verdict by bisect: entities are
+    protected whatever their case, and a capitalized non-entity opening a sentence may be touched.
+    [Gazetteer] Names confirmed across the series are protected first, by a dict lookup.
+    [Capitalization Profile] Book-wide case statistics settle the remaining capitalized words:
+    always capitalized mid-sentence -> protected, lowercase mid-sentence -> a sentence-initial
+    occurrence may be touched. Only ambiguous profiles keep the conservative default.
     """
 
+    # Index of the chapter being processed (one chapter at a time per process, shared by all guardians)
+    entity_index = None
+    gazetteer = None
+    capitalization_profile = None
+
     def __init__(self):
         self.titles = {"M.", "Mme", "Mlle", "Dr", "Pr", "Me", "St", "Ste"}
 
-    def is_safe_to_touch(self, word: str, context_before: str = "") -> bool:
+    @classmethod
+    def use_entity_index(cls, index):
+        """Installs (or clears, with None) the entity index of the current chapter."""
+        cls.entity_index = index
+
+    @classmethod
+    def use_gazetteer(cls, gazetteer):
+        """Installs (or clears, with None) the series gazetteer of the current book."""
+        cls.gazetteer = gazetteer
+
+    @classmethod
+    def use_capitalization_profile(cls, profile):
+        """Installs (or clears, with None) the capitalization profile of the current book."""
+        cls.capitalization_profile = profile
+
+    def entity_verdict(self, word: str, line: Optional[str], start: Optional[int]) -> Optional[bool]:
+        """True/False from the chapter index, None when unknown (no index, line changed since)."""
+        if self.entity_index is None or line is None or start is None:
+            return None
+        return self.entity_index.lookup(line, start, start + len(word))
+
+    def is_safe_to_touch(self, word: str, context_before: str = "", line: Optional[str] = None,
+                         start: Optional[int] = None) -> bool:
         """
         Determines if a word is 'safe' to correct.
         Returns False if it looks like a Named Entity (Protected).
+        `line` / `start`: where the word sits, for the entity index lookup (optional).
         """
+        verdict = self.entity_verdict(word, line, start)
         word = word.strip()
         if not word:
             return True
+        if verdict or (self.gazetteer is not None and self.gazetteer.is_entity(word)):
+            return False
 
         # 1. Title Protection (Context)
         # If preceded by a Title, it's a Proper Noun (e.g., M. Dient)
@@ -31,6 +71,15 @@ class NerGuardian:
         # For safety in the 'Analyst' context (creating regexes), we are conservative:
         # We NEVER create a regex that modifies a Capitalized word implicitly.
         if word[0].isupper():
+            # The line, when known, tells an opening quote from a closing one; the previous word alone cannot
+            sentence_start = follows_sentence_end(line[:start] if line is not None and start is not None else context_before)
+            if verdict is None and self.capitalization_profile is not None:
+                verdict = self.capitalization_profile.decide(word, sentence_start)
+                if verdict:
+                    return False
+            # Neither NER nor the book statistics see an entity, the capital comes from the sentence start
+            if verdict is False and sentence_start:
+                return True
             return False
 
         # 3. All Caps (Acronyms)
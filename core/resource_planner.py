@@ -0,0 +1,213 @@
+"""
+[Resource Planner] Répartit la machine entre les instances de modèle qui tournent en même temps
+(workers de process_epub, daemons de ClusterFactory) : sans réglage, chaque llama.cpp prend
+autant de threads que de cœurs et N instances se disputent le CPU.
+
+- plan_resources() : nombre d'instances et threads par instance d'après les cœurs PHYSIQUES
+  (l'hyperthreading n'aide pas le calcul matriciel) et la RAM disponible (une copie du modèle
+  par instance).
+- ResourcePlan.env(i) / apply(i) : réglages de l'instance i, transmis aux sous-processus par
+  l'environnement (SCRINIUM_N_THREADS, SCRINIUM_CPUS) et appliqués au processus courant
+  (affinité CPU sous Linux).
+- configured_threads() : ce que lisent les sites de construction des modèles.
+"""
+import glob
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional, Sequence, Union
+
+ENV_THREADS = "SCRINIUM_N_THREADS"
+ENV_CPUS = "SCRINIUM_CPUS"
+
+# Cache KV de llama.cpp (Mistral-7B, f16) : ~128 Ko par token de contexte
+KV_BYTES_PER_TOKEN = 128 * 1024
+# Poids mappés + tampons de calcul : ~10 % au-delà de la taille du fichier GGUF
+MODEL_OVERHEAD = 1.1
+# Laissé au système, au dictionnaire et au daemon NER
+RESERVED_MEMORY = 2 * 1024 ** 3
+
+
+def _parse_cpu_list(text: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11] (format du noyau Linux)."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def usable_cpus() -> List[int]:
+    """CPU logiques autorisés pour ce processus (affinité héritée, cgroups compris)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_groups() -> List[List[int]]:
+    """
+    CPU logiques regroupés par cœur physique (frères hyperthreading ensemble), limités aux
+    CPU utilisables. Sans topologie lisible (hors Linux), chaque CPU logique compte pour un cœur.
+    """
+    allowed = set(usable_cpus())
+    groups, seen = [], set()
+    for path in sorted(glob.glob("/sys/devices/system/cpu/cpu[0-9]*/topology/thread_siblings_list"),
+                       key=lambda p: int(re.search(r"cpu(\d+)/", p).group(1))):
+        try:
+            with open(path) as f:
+                siblings = [cpu for cpu in _parse_cpu_list(f.read()) if cpu in allowed]
+        except (OSError, ValueError):
+            continue
+        key = tuple(siblings)
+        if siblings and key not in seen:
+            seen.add(key)
+            groups.append(siblings)
+    if not groups:
+        groups = [[cpu] for cpu in sorted(allowed)]
+        # macOS : pas d'affinité, mais le nombre de cœurs physiques est connu
+        physical = _sysctl_int("hw.physicalcpu")
+        if physical and physical < len(groups):
+            groups = groups[:physical]
+    return groups
+
+
+def _sysctl_int(name: str) -> Optional[int]:
+    try:
+        out = subprocess.run(["sysctl", "-n", name], capture_output=True, text=True, timeout=2)
+        return int(out.stdout.strip()) if out.returncode == 0 else None
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def physical_cores() -> int:
+    return len(core_groups())
+
+
+def available_memory() -> Optional[int]:
+    """RAM disponible (octets) : MemAvailable sous Linux, pages libres ailleurs ; None si inconnue."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def model_memory(model_path: Union[str, Sequence[str], None], n_ctx: int = 2048) -> int:
+    """Empreinte estimée d'une instance (tous les paliers de la cascade chargés) ; 0 si inconnue."""
+    paths = [model_path] if isinstance(model_path, str) else list(model_path or [])
+    total = 0
+    for path in paths:
+        if path and os.path.exists(path):
+            total += int(os.path.getsize(path) * MODEL_OVERHEAD) + n_ctx * KV_BYTES_PER_TOKEN
+    return total
+
+
+def configured_threads() -> Optional[int]:
+    """Threads attribués à ce processus par un plan (None : aucun plan, défaut de la bibliothèque)."""
+    try:
+        value = int(os.environ.get(ENV_THREADS, ""))
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def pin_to(cpus: Sequence[int]) -> bool:
+    """Épingle le processus courant (et ses futurs enfants) sur `cpus` ; False hors Linux."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, set(cpus))
+        return True
+    except OSError:
+        return False
+
+
+def pin_from_env() -> bool:
+    """Applique l'affinité transmise par l'environnement (daemons lancés par un orchestrateur)."""
+    cpus = os.environ.get(ENV_CPUS)
+    if not cpus:
+        return False
+    try:
+        return pin_to(_parse_cpu_list(cpus))
+    except ValueError:
+        return False
+
+
+class ResourcePlan:
+    """
+    Résultat du planificateur : `instances` modèles, `threads` chacun, et pour chaque instance
+    les CPU logiques de ses cœurs physiques (cpu_sets[i]) ; `reason` explique la limite retenue.
+    """
+
+    def __init__(self, instances: int, threads: int, cpu_sets: List[List[int]], reason: str = ""):
+        self.instances = instances
+        self.threads = threads
+        self.cpu_sets = cpu_sets
+        self.reason = reason
+
+    def env(self, index: int, base: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Environnement d'un sous-processus de l'instance `index` (copie de os.environ par défaut)."""
+        env = dict(os.environ if base is None else base)
+        env[ENV_THREADS] = str(self.threads)
+        env["OMP_NUM_THREADS"] = str(self.threads)
+        cpus = self.cpu_sets[index % len(self.cpu_sets)] if self.cpu_sets else []
+        if cpus:
+            env[ENV_CPUS] = ",".join(map(str, cpus))
+        else:
+            env.pop(ENV_CPUS, None)
+        return env
+
+    def apply(self, index: int) -> bool:
+        """Règle le processus courant comme instance `index` (workers d'un pool de processus)."""
+        os.environ.update(self.env(index, base={}))
+        return pin_from_env()
+
+    def describe(self) -> str:
+        return f"{self.instances} instance(s) x {self.threads} thread(s) ({self.reason})"
+
+    def __repr__(self):
+        return f"ResourcePlan({self.describe()}, cpu_sets={self.cpu_sets})"
+
+
+def plan_resources(model_path: Union[str, Sequence[str], None] = None, requested: Optional[int] = None,
+                   n_ctx: int = 2048, min_threads: int = 2, shared: bool = False,
+                   memory: Optional[int] = None, groups: Optional[List[List[int]]] = None) -> ResourcePlan:
+    """
+    [Resource Planner] Décide instances x threads.
+    - Au plus `requested` instances (défaut : autant que possible), chacune avec au moins
+      `min_threads` cœurs physiques, et autant de copies du modèle que la RAM en accepte.
+    - Les cœurs sont partagés équitablement ; les cœurs restants ne sont pas sur-souscrits.
+    - shared=True : un seul processus possède le modèle (llama-server) et prend tous les cœurs.
+    memory / groups : valeurs mesurées par défaut, injectables (tests, autre machine).
+    """
+    groups = core_groups() if groups is None else groups
+    cores = max(1, len(groups))
+    if shared:
+        return ResourcePlan(1, cores, [sorted(cpu for group in groups for cpu in group)], "modèle partagé")
+
+    limits = {"cœurs": max(1, cores // max(1, min_threads))}
+    if requested:
+        limits["demandé"] = max(1, requested)
+    per_instance = model_memory(model_path, n_ctx)
+    memory = available_memory() if memory is None else memory
+    if per_instance and memory:
+        limits["RAM"] = max(1, (memory - RESERVED_MEMORY) // per_instance)
+    reason, instances = min(limits.items(), key=lambda item: item[1])
+    instances = int(instances)
+
+    threads = max(1, cores // instances)
+    cpu_sets = []
+    for i in range(instances):
+        cpu_sets.append(sorted(cpu for group in groups[i * threads:(i + 1) * threads] for cpu in group))
+    return ResourcePlan(instances, threads, cpu_sets, f"limité par : {reason}")
@@ -0,0 +1,115 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+
+class SessionLogWriter:
+    """
+    [Buffered Log] Écrivain asynchrone du log de session (JSONL).
+    - Un thread de fond regroupe les entrées et les écrit par lots (taille ou délai atteint) :
+      un seul open/write par lot au lieu d'un open/append/close par mot corrigé.
+    - En mode per_worker, chaque processus écrit son propre fichier partiel
+      '<log>.part-<pid>' (aucun entrelacement entre workers) ; merge_parts() les fusionne.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(self, log_path: str, batch_size: int = 64, flush_interval: float = 2.0, per_worker: bool = False):
+        self.log_path = log_path
+        self.per_worker = per_worker
+        self.target_path = f"{log_path}.part-{os.getpid()}" if per_worker else log_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="SessionLogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, entry: dict):
+        """Ajoute une entrée (non bloquant)."""
+        self._queue.put(entry)
+
+    def flush(self, timeout: Optional[float] = 10.0):
+        """Force l'écriture de tout ce qui est en attente et attend sa fin."""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Vide le tampon puis arrête le thread d'écriture (le hook atexit est retiré)."""
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(self._SENTINEL)
+            self._thread.join(timeout=10.0)
+
+    def _run(self):
+        buffer = []
+        last_flush = time.time()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is self._SENTINEL:
+                self._write_batch(buffer)
+                return
+            if isinstance(item, threading.Event):
+                self._write_batch(buffer)
+                buffer = []
+                last_flush = time.time()
+                item.set()
+                continue
+            if item is not None:
+                buffer.append(item)
+
+            if len(buffer) >= self.batch_size or (buffer and time.time() - last_flush >= self.flush_interval):
+                self._write_batch(buffer)
+                buffer = []
+                last_flush = time.time()
+
+    def _write_batch(self, entries):
+        if not entries:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.target_path) or ".", exist_ok=True)
+            with open(self.target_path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        except Exception as e:
+            print(f"⚠️ Erreur d'écriture du log de session ({self.target_path}): {e}")
+
+    @staticmethod
+    def merge_parts(log_path: str) -> int:
+        """
+        Fusionne les fichiers partiels des workers dans le log de session
+        (ordre chronologique), puis les supprime. Retourne le nombre d'entrées fusionnées.
+        """
+        parts = sorted(glob.glob(f"{glob.escape(log_path)}.part-*"))
+        if not parts:
+            return 0
+
+        entries = []
+        for part in parts:
+            with open(part, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            entries.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+        entries.sort(key=lambda e: e.get("timestamp", ""))
+
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        for part in parts:
+            os.remove(part)
+        return len(entries)
@@ -0,0 +1,72 @@
+"""
+[Inertia Kernel] Test de similarité rapide pour le Principe d'Inertie.
+
+`ratio_exceeds(a, b, seuil)` rend exactement la même décision que
+`SequenceMatcher(None, a, b).ratio() > seuil`, mais écarte la grande majorité
+des paires (mots sans rapport) sans construire de SequenceMatcher :
+
+1. Borne de longueur : ratio <= 2*min(la, lb) / (la + lb).
+2. Borne LCS : les blocs de Ratcliff/Obershelp forment une sous-séquence commune,
+   donc ratio <= 2*LCS / (la + lb). La LCS est calculée dans une bande diagonale
+   (largeur = nombre d'insertions/suppressions tolérées) avec sortie anticipée.
+3. Seules les paires qui passent les deux bornes paient le SequenceMatcher exact.
+"""
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+
+def banded_lcs_at_least(a: str, b: str, needed: int, band: int) -> bool:
+    """
+    True si une sous-séquence commune de longueur >= needed peut exister,
+    en ne parcourant que les cellules |i - j| <= band (sortie anticipée sinon).
+    """
+    la, lb = len(a), len(b)
+    if needed <= 0:
+        return True
+    if min(la, lb) < needed or abs(la - lb) > band:
+        return False
+
+    prev = [0] * (lb + 1)
+    for i in range(1, la + 1):
+        cur = [0] * (lb + 1)
+        lo = max(1, i - band)
+        hi = min(lb, i + band)
+        ai = a[i - 1]
+        best = 0
+        for j in range(lo, hi + 1):
+            if ai == b[j - 1]:
+                value = prev[j - 1] + 1
+            else:
+                value = prev[j] if prev[j] > cur[j - 1] else cur[j - 1]
+            cur[j] = value
+            if value > best:
+                best = value
+        # Même en appariant tous les caractères restants de a, on n'atteindra pas `needed`
+        if best + (la - i) < needed:
+            return False
+        prev = cur
+    return max(prev) >= needed
+
+
+@lru_cache(maxsize=65536)
+def ratio_exceeds(a: str, b: str, threshold: float) -> bool:
+    """Équivalent exact (et mis en cache) de SequenceMatcher(None, a, b).ratio() > threshold."""
+    if a == b:
+        return 1.0 > threshold
+    la, lb = len(a), len(b)
+    total = la + lb
+
+    # 1. Borne de longueur
+    if 2.0 * min(la, lb) / total <= threshold:
+        return False
+
+    # 2. Borne LCS : il faut 2*L/total > threshold
+    needed = int(threshold * total / 2) + 1
+    while needed > 0 and 2.0 * (needed - 1) / total > threshold:
+        needed -= 1  # Garde-fou d'arrondi flottant
+    band = total - 2 * needed
+    if not banded_lcs_at_least(a, b, needed, band):
+        return False
+
+    # 3. Décision exacte
+    return SequenceMatcher(None, a, b).ratio() > threshold
@@ -1,7 +1,10 @@
 import re
 import json
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
+
+from core.knowledge_store import backoff_key
+from core.utils import LineKeys, iter_words_with_offsets, match_case
 
 # Import optional dependencies (Guardian/Dict)
 try:
@@ -17,17 +20,25 @@ class SmartRuleApplicator:
     """
     Applies 'SmartRules' generated by the Analyst.
     Closing the loop: Logic Forge -> Analyst -> Applicator -> Corrector.
+    [Rule Promotion] Rules carrying the 'kb_context' condition (promoted from the KB) are
+    indexed by context key instead of being scanned one regex at a time: see apply_context_rules.
     """
-    def __init__(self, rules_path: str = "data/logic_forge_rules.jsonl"):
+    CONTEXT_LEVELS = ("exact", "window1", "word")
+
+    def __init__(self, rules_path: str = "data/logic_forge_rules.jsonl", dictionary=None, guardian=None):
         self.rules_path = rules_path
+        # [Rule Promotion] {niveau: {clé de contexte: règle}}
+        self.context_rules: Dict[int, Dict[str, Dict]] = {0: {}, 1: {}, 2: {}}
+        self.context_stats = {level: 0 for level in self.CONTEXT_LEVELS + ("miss",)}
         self.rules = self._load_rules()
         
         # Dependencies for conditions
-        self.dictionary = FrenchDictionary() if FrenchDictionary else None
-        self.guardian = NerGuardian() if NerGuardian else None
+        self.dictionary = dictionary or (FrenchDictionary() if FrenchDictionary else None)
+        self.guardian = guardian or (NerGuardian() if NerGuardian else None)
         
         # [Frequency Optimization] Track rule usage
-        self.optimizer = RuleOptimizer(rules_path) if RuleOptimizer else None
+        # (inutile pour un fichier de règles promues seulement : rien à trier)
+        self.optimizer = RuleOptimizer(rules_path) if RuleOptimizer and self.rules else None
 
     def _load_rules(self) -> List[Dict]:
         """Loads rules from JSONL file."""
@@ -37,9 +48,13 @@ class SmartRuleApplicator:
                 for line in f:
                     if line.strip():
                         try:
-                            rules.append(json.loads(line))
+                            rule = json.loads(line)
                         except:
-                            pass
+                            continue
+                        if "kb_context" in rule.get("conditions", ()):
+                            self.context_rules[rule.get("context_level", 0)][rule["context_key"]] = rule
+                        else:
+                            rules.append(rule)
         return rules
 
     def apply_rules(self, text: str) -> str:
@@ -47,10 +62,12 @@ class SmartRuleApplicator:
         Applies all loaded SmartRules to the text.
         Respects conditions: 'dictionary_check_required', 'is_named_entity', etc.
         """
-        if not self.rules:
-            return text
-            
         current_text = text
+        if self.has_context_rules():
+            current_text = "\n".join(self.apply_context_rules(line)[0] for line in current_text.split("\n"))
+
+        if not self.rules:
+            return current_text
         
         for rule in self.rules:
             # Check if this is a legacy regex or a SmartRule
@@ -65,6 +82,60 @@ class SmartRuleApplicator:
                     
         return current_text
 
+    def has_context_rules(self) -> bool:
+        return any(self.context_rules.values())
+
+    def apply_context_rules(self, line: str, min_length: int = 4) -> Tuple[str, Set[str]]:
+        """
+        [Rule Promotion] Applique en une passe les règles promues de la KB sur une ligne.
+        Les mots inconnus du dictionnaire (min_length caractères ou plus) sont résolus sur leur
+        fenêtre exacte, puis ±1, puis le mot seul (même clés que KnowledgeManager.lookup_line).
+        Retourne la ligne corrigée et les mots réglés (corrigés ou confirmés par la KB),
+        que la boucle de routage n'a plus à envoyer au LLM.
+        """
+        settled: Set[str] = set()
+        if not self.has_context_rules():
+            return line, settled
+
+        targets = []
+        previous = {}
+        last_word = ""
+        for w, start in iter_words_with_offsets(line):
+            clean_w = w.strip(".,;:?!'\"()[]-")
+            if len(w) >= min_length and clean_w and not (self.dictionary and self.dictionary.validate(clean_w)):
+                offset = start + w.find(clean_w)
+                targets.append((clean_w, offset))
+                previous[offset] = last_word
+            last_word = w
+        if not targets:
+            return line, settled
+
+        replacements = []
+        for (word, offset), key in zip(targets, LineKeys(line).keys(targets)):
+            rule, level = self._find_context_rule(key)
+            # Sans contexte (mot seul), la protection des entités nommées s'applique
+            if rule is None or (level == 2 and self.guardian
+                                and not self.guardian.is_safe_to_touch(word, previous[offset], line=line, start=offset)):
+                self.context_stats["miss"] += 1
+                continue
+            self.context_stats[self.CONTEXT_LEVELS[level]] += 1
+            correction = rule["correction"] if level == 0 else match_case(word, rule["correction"])
+            settled.add(correction)
+            if correction != word:
+                replacements.append((offset, word, correction))
+
+        for offset, word, correction in reversed(replacements):
+            line = line[:offset] + correction + line[offset + len(word):]
+        return line, settled
+
+    def _find_context_rule(self, key: str) -> Tuple[Optional[Dict], int]:
+        for level in (0, 1, 2):
+            bkey = key if level == 0 else backoff_key(key, level)
+            rule = self.context_rules[level].get(bkey) if bkey is not None else None
+            if rule is not None:
+                return rule, level
+        return None, -1
+
     def save_stats(self):
         """Triggers the optimizer to sort and save rules."""
         if self.optimizer:
@@ -140,6 +140,35 @@ class TextProcessor:
 
         return words
 
+    @staticmethod
+    def find_word_windows(text: str, targets, radius: int = 3) -> List[Tuple[int, int]]:
+        """
+        Calcule les fenêtres de quelques mots autour des mots ciblés (ex: mots inconnus).
+
+        Args:
+            text: Texte (ligne) à analyser
+            targets: Mots ciblés (comparés sans la ponctuation collée)
+            radius: Nombre de mots conservés de chaque côté
+
+        Returns:
+            Liste triée de spans (début, fin) en caractères, fusionnés s'ils se chevauchent
+        """
+        targets = set(targets)
+        words = [(m.start(), m.end(), m.group()) for m in re.finditer(r'\S+', text)]
+
+        windows = []
+        for i, (_, _, word) in enumerate(words):
+            if word.strip(".,;:?!'\"()[]-") not in targets:
+                continue
+            lo, hi = max(0, i - radius), min(len(words) - 1, i + radius)
+            if windows and lo <= windows[-1][1] + 1:
+                # Chevauchement (ou contiguïté) avec la fenêtre précédente -> fusion
+                windows[-1][1] = hi
+            else:
+                windows.append([lo, hi])
+
+        return [(words[lo][0], words[hi][1]) for lo, hi in windows]
+
     @staticmethod
     def find_suspect_words(text: str) -> List[Tuple[str, int]]:
         """
@@ -1,5 +1,6 @@
 import re
 import hashlib
+from bisect import bisect_left
 
 def extraire_fenetre(contexte, mot_cible, n=2):
     """
@@ -35,3 +36,70 @@ def get_composite_key(mot_errone, contexte):
     window = extraire_fenetre(contexte, mot_errone)
     pattern = hash_pattern(window)
     return f"{mot_errone.lower()}|{pattern}"
+
+
+class LineKeys:
+    """
+    [Line Keys] Clés composites de toute une ligne, avec une seule tokenisation.
+    Chaque mot est repéré par sa position (offset) dans la ligne : deux occurrences
+    du même mot ont chacune leur propre fenêtre (au lieu de la première avec tokens.index).
+    """
+
+    def __init__(self, line, n=2):
+        self.n = n
+        matches = list(re.finditer(r"\w+", line))
+        self.tokens = [m.group(0).lower() for m in matches]
+        self.starts = [m.start() for m in matches]
+
+    def _window_at(self, idx):
+        start = max(0, idx - self.n)
+        window = self.tokens[start:idx + self.n + 1]
+        window[idx - start] = "___"
+        return window
+
+    def token_index(self, mot, offset=None):
+        """Indice du token `mot` commençant à `offset` (ou première occurrence sans offset)."""
+        mot = mot.lower()
+        if offset is None:
+            try:
+                return self.tokens.index(mot)
+            except ValueError:
+                return None
+        idx = bisect_left(self.starts, offset)
+        if idx < len(self.tokens) and self.starts[idx] == offset and self.tokens[idx] == mot:
+            return idx
+        return None
+
+    def key_for(self, mot, offset=None):
+        """Clé composite mot|pattern du mot (même format que get_composite_key)."""
+        idx = self.token_index(mot, offset)
+        window = self._window_at(idx) if idx is not None else ["UNKNOWN_CONTEXT"]
+        return f"{mot.lower()}|{hash_pattern(window)}"
+
+    def keys(self, targets=None):
+        """
+        Clés pour des cibles (mot, offset) ou, sans cibles, pour toutes les positions de la ligne.
+        """
+        if targets is None:
+            return [f"{tok}|{hash_pattern(self._window_at(i))}" for i, tok in enumerate(self.tokens)]
+        return [self.key_for(mot, offset) for mot, offset in targets]
+
+
+def iter_words_with_offsets(line):
+    """Découpe la ligne sur les espaces (comme str.split) en renvoyant des couples (mot, offset)."""
+    for m in re.finditer(r"\S+", line):
+        yield m.group(0), m.start()
+
+
+def match_case(word, target):
+    """Reporte la majuscule initiale du mot sur une cible apprise dans un autre contexte."""
+    if word[:1].isupper() and target[:1].islower():
+        return target[:1].upper() + target[1:]
+    if word[:1].islower() and target[:1].isupper() and not target.isupper():
+        return target[:1].lower() + target[1:]
+    return target
+
+
+def get_line_composite_keys(line, targets=None, n=2):
+    """Raccourci : clés composites de la ligne (toutes positions ou cibles (mot, offset))."""
+    return LineKeys(line, n).keys(targets)
@@ -6,35 +6,70 @@ Module de correction sémantique utilisant un LLM local via llama.cpp.
 import os
 import sys
 import re
-from typing import Optional, List, Dict
+import time
+from collections import deque
+from typing import Optional, List, Dict, Tuple, Union
 from difflib import SequenceMatcher
 
 try:
     from llama_cpp import Llama
 except ImportError:
+    # [Model Server] Sans llama-cpp-python, seuls les modèles servis par llama-server (URL) sont utilisables
     print("ERREUR: llama-cpp-python n'est pas installé.")
-    sys.exit(1)
+    Llama = None
+
+try:
+    from llama_cpp import LlamaGrammar # [Edit-Script] Sortie contrainte (GBNF)
+except ImportError:
+    LlamaGrammar = None
+
+try:
+    from llama_cpp import llama_set_n_threads # [Resource Planner] Threads d'un contexte déjà créé
+except ImportError:
+    llama_set_n_threads = None
 
 # [V4] Import du Dictionnaire pour le Gardien
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from core.dictionary import FrenchDictionary # [Phase 26]
+    from core.text_processor import TextProcessor # [Span-Window]
     from core.ner_guardian import NerGuardian # [Phase 30] 3-Pillar Architecture
     from core.smart_rule_applicator import SmartRuleApplicator # [Phase 36] Feedback Loop
+    from core.similarity import ratio_exceeds # [Inertia Kernel]
+    from core.capitalization_profile import is_sentence_initial # [Phase 27] Logic Guards
+    from core.llama_server import LlamaServerModel # [Model Server]
+    from core.resource_planner import configured_threads # [Resource Planner]
 except ImportError:
     print("⚠️ Module core non trouvé. Le Gardien sera restreint.")
     FrenchDictionary = None
+    TextProcessor = None
     NerGuardian = None
     SmartRuleApplicator = None
+    LlamaServerModel = None
+    configured_threads = None
+
+    def ratio_exceeds(a, b, threshold):
+        return SequenceMatcher(None, a, b).ratio() > threshold
 
 # [V6] Import des utilitaires de pattern/hash/mémoire
 try:
     from core.knowledge_manager import KnowledgeManager
-    from core.utils import get_composite_key
+    from core.utils import get_composite_key, LineKeys, iter_words_with_offsets
+    from core.session_log_writer import SessionLogWriter # [Buffered Log]
 except ImportError:
     print("⚠️ Modules core non trouvés.")
     KnowledgeManager = None
     get_composite_key = None
+    SessionLogWriter = None
+
+# [Edit-Script] Grammaire GBNF : une édition "index=remplacement" par ligne, terminée par FIN
+EDIT_SCRIPT_GRAMMAR = r'''
+root ::= edit* "FIN"
+edit ::= [0-9]+ "=" [^\n]* "\n"
+'''
+
+# [Token Budget] Séparateur de phrases (espaces après ponctuation forte) ou de lignes
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…»])\s+|\s*\n\s*')
 
 class SemanticCorrector:
     """
@@ -44,25 +79,35 @@ class SemanticCorrector:
     
     _instance = None
     _model = None
+    _edit_grammar = None
 
     def __new__(cls, model_path: str = None, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(SemanticCorrector, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, model_path: str = "models/mistral-7b-instruct-v0.3.Q4_K_M.gguf"):
+    def __init__(self, model_path: Union[str, List[str]] = "models/mistral-7b-instruct-v0.3.Q4_K_M.gguf",
+                 n_threads: Optional[int] = None):
         # [V6] Gestionnaire de connaissances & Session Log
         # Toujours initialisés même si le modèle LLM échoue
         if not hasattr(self, 'knowledge'):
             self.knowledge = None
             if KnowledgeManager:
-                self.knowledge = KnowledgeManager()
+                # [KB Store] Le correcteur ne fait que lire (précédents RAG) : lecture seule, partagée
+                # entre workers et daemons. Les écritures restent au processus parent et aux outils
+                # de consolidation (index créé en lecture-écriture seulement s'il n'existe pas encore)
+                self.knowledge = KnowledgeManager(read_only=True)
         
         if not hasattr(self, 'session_log'):
-            self.session_log = []
+            # [Buffered Log] Historique mémoire plafonné ; le fichier est écrit par un thread de fond
+            self.session_log_cap = 1000
+            self.session_log = deque(maxlen=self.session_log_cap)
             self.log_path = "data/knowledge/session_corrections.jsonl" # Default
+            self.log_per_worker = False # True dans les workers parallèles (fichier partiel par processus)
+            self.log_writer = None
 
         if not hasattr(self, 'dictionary'):
+            self._verdicts = {} # [Inertia Kernel] Cache des verdicts du dictionnaire
             self.dictionary = None
             if FrenchDictionary:
                 print("🛡️ Initialisation du Gardien (Dictionnaire)...")
@@ -125,30 +170,87 @@ Règles STRICTES :
 8. Respecte la typographie française : Ajoute toujours une espace avant les ponctuations doubles (?, !, :, ;).
 """
 
-        # Si le modèle est déjà chargé, on ne fait rien
+        # [Batching] Budget de contexte partagé par les prompts groupés
+        self.n_ctx = 2048
+        self.batch_max_segments = 16
+        # [Token Budget] max_tokens = tokens d'entrée * ratio + marge (la sortie ≈ l'entrée)
+        self.gen_margin_ratio = 1.25
+        self.gen_margin_tokens = 8
+
+        # [Edit-Script] "full" = le LLM réécrit le segment, "edits" = il ne renvoie que les mots modifiés
+        if not hasattr(self, 'output_mode'):
+            self.output_mode = "full"
+            self.use_grammar = True
+            self.edit_max_edits = 4
+
+        # [Span-Window] 0 = ligne entière envoyée au LLM, N = fenêtre de N mots autour des inconnus
+        # (réglable par SCRINIUM_SPAN_RADIUS, hérité par les workers)
+        if not hasattr(self, 'span_radius'):
+            try:
+                self.span_radius = max(0, int(os.environ.get("SCRINIUM_SPAN_RADIUS", "0")))
+            except ValueError:
+                self.span_radius = 0
+
+        # [Suspicion Gate] 0.0 = tout segment soumis est corrigé (comportement historique)
+        if not hasattr(self, 'suspicion_threshold'):
+            self.suspicion_threshold = 0.0
+
+        # [Cascade] Seuil de log-probabilité moyenne par token sous lequel un palier escalade
+        if not hasattr(self, 'cascade_min_logprob'):
+            self.cascade_min_logprob = -0.8
+            self.tier_stats = {}
+
+        # Si le modèle est déjà chargé, on ne fait rien (sauf appliquer le plan de threads du worker)
         if self._model:
+            self._apply_threads(n_threads or (configured_threads() if configured_threads else None))
             return
 
-        # Vérification du chemin du modèle
-        if not os.path.exists(model_path):
-            print(f"⚠️ ATTENTION: Modèle introuvable à {model_path}")
-            self._model = None
-            return
+        # [Cascade] model_path peut être une liste ordonnée (petit modèle rapide -> Mistral-7B)
+        model_paths = [model_path] if isinstance(model_path, str) else list(model_path)
+        self._tiers = []
+        # [Resource Planner] Threads attribués par le plan du processus parent (None : défaut llama.cpp)
+        self.n_threads = n_threads or (configured_threads() if configured_threads else None)
 
-        print(f"🧠 Chargement du modèle LLM : {model_path}...")
-        try:
-            # n_ctx=2048 suffisant pour des paragraphes
-            # n_gpu_layers=-1 pour tout mettre sur le GPU (Metal sur Mac)
-            self._model = Llama(
-                model_path=model_path,
-                n_ctx=2048,
-                n_gpu_layers=-1, 
-                verbose=False # Moins de bruit dans les logs
-            )
-            print("✅ Modèle chargé avec succès.")
-        except Exception as e:
-            print(f"❌ Erreur lors du chargement du modèle: {e}")
-            self._model = None
+        for level, path in enumerate(model_paths):
+            # [Model Server] Une URL désigne un modèle partagé servi par llama-server
+            if path.startswith(("http://", "https://")) and LlamaServerModel:
+                print(f"🧠 Modèle LLM servi par {path}")
+                self._tiers.append((path, LlamaServerModel(path)))
+                self.tier_stats[path] = {"attempts": 0, "accepted": 0, "latency": 0.0}
+                continue
+
+            # Vérification du chemin du modèle
+            if not os.path.exists(path):
+                print(f"⚠️ ATTENTION: Modèle introuvable à {path}")
+                continue
+            if Llama is None:
+                continue
+
+            is_last = level == len(model_paths) - 1
+            print(f"🧠 Chargement du modèle LLM : {path}...")
+            try:
+                # n_ctx=2048 suffisant pour des paragraphes
+                # n_gpu_layers=-1 pour tout mettre sur le GPU (Metal sur Mac)
+                model = Llama(
+                    model_path=path,
+                    n_ctx=self.n_ctx,
+                    n_gpu_layers=-1, 
+                    n_threads=self.n_threads,
+                    n_threads_batch=self.n_threads,
+                    # Log-probs nécessaires pour décider de l'escalade. Coût : logits gardés pour
+                    # chaque position du contexte, n_ctx x n_vocab x 4 octets (2048 x 32k ≈ 256 Mo,
+                    # ~1,2 Go pour un vocabulaire de 150k) en plus des poids du petit palier
+                    logits_all=not is_last,
+                    verbose=False # Moins de bruit dans les logs
+                )
+                self._tiers.append((path, model))
+                self.tier_stats[path] = {"attempts": 0, "accepted": 0, "latency": 0.0}
+                print("✅ Modèle chargé avec succès.")
+            except Exception as e:
+                print(f"❌ Erreur lors du chargement du modèle: {e}")
+
+        # Le dernier palier (le plus gros modèle) reste le modèle de référence
+        self._model = self._tiers[-1][1] if self._tiers else None
 
     def initialize_session(self, title: str):
         """Initialise un nouveau log de session avec titre, date et heure."""
@@ -157,145 +259,628 @@ Règles STRICTES :
         # Nettoyage du titre pour le nom de fichier
         safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
         filename = f"session_{safe_title}_{now}.jsonl"
+        self.flush_session_log()
         self.log_path = os.path.join("data/knowledge", filename)
-        self.session_log = []
+        self.session_log = deque(maxlen=self.session_log_cap)
         print(f"📁 Session de log initialisée : {self.log_path}")
 
+    def _get_log_writer(self):
+        """[Buffered Log] Écrivain associé au log_path courant (recréé si le chemin change)."""
+        if not SessionLogWriter:
+            return None
+        writer = self.log_writer
+        if writer is None or writer.log_path != self.log_path or writer.per_worker != self.log_per_worker:
+            if writer is not None:
+                writer.close()
+            writer = self.log_writer = SessionLogWriter(self.log_path, per_worker=self.log_per_worker)
+        return writer
+
+    def flush_session_log(self):
+        """[Buffered Log] Écrit sur disque les corrections en attente (fin de chapitre/session)."""
+        if self.log_writer:
+            self.log_writer.flush()
+
     def _lookup_knowledge(self, text: str, k: int = 3) -> List[Dict]:
         """Cherche des exemples pertinents dans la base de connaissance via KnowledgeManager"""
         if not self.knowledge:
             return []
         return self.knowledge.get_precedents(text, k)
 
-    def correct_segment(self, text_segment: str, suspicion_score: float = 1.0, fever_mode: bool = False) -> str:
+    def correct_segment(self, text_segment: str, suspicion_score: float = 1.0, fever_mode: bool = False,
+                        window: bool = False) -> str:
         """
         Corrige un segment de texte (phrase ou paragraphe).
         Args:
             text_segment: Le texte à corriger.
-            suspicion_score: (Futur) Seuil pour déclencher le LLM.
+            suspicion_score: Score du SuspicionScorer ; sous suspicion_threshold, le LLM n'est pas appelé.
             fever_mode: [V8] Si True (Fièvre), on relâche les sécurités (Inertie) pour permettre des réécritures audacieuses.
+            window: [Span-Window] Fragment d'une ligne : ni journalisation ni Logic Guards ici,
+                l'appelant (correct_spans) les applique sur la ligne entière.
         """
         # [3-Pillar Architecture] NER Check (Pre-Correction Safety)
         # If the segment IS a Named Entity, DO NOT CORRECT IT.
-        if self.guardian:
-            # Simple check: Is the whole segment mostly Entity-like?
-            # Or scan words? For single-word correction scenarios (common), this is vital.
-            words = text_segment.split()
-            safe_count = 0
-            for i, w in enumerate(words):
-                 context = words[i-1] if i > 0 else ""
-                 if not self.guardian.is_safe_to_touch(w, context):
-                     safe_count += 1
-            
-            if len(words) > 0 and safe_count >= len(words) / 2:
-                 # Majority of words are Protected Entities -> Skip correction
-                 # print(f"🛡️ NerGuardian protected: '{text_segment}'")
-                 return text_segment
+        if self._is_protected_segment(text_segment):
+            return text_segment
 
         # [Phase 36] Fast Path: Apply SmartRules
         # We apply rules BEFORE the LLM to fix known patterns.
         # This helps the LLM focus on harder semantic issues, or might solve the segment entirely.
-        current_text = text_segment
-        if self.rule_applicator:
-             current_text = self.rule_applicator.apply_rules(current_text)
-             # If rules changed the text, we log it?
-             if current_text != text_segment:
-                 # print(f"⚡ FastPath applied: '{text_segment}' -> '{current_text}'")
-                 pass
+        current_text = self._apply_fast_rules(text_segment)
 
         if not self._model:
             return current_text
-        
+
+        # [Suspicion Gate] Ligne jugée saine : seules les SmartRules s'appliquent
+        if suspicion_score < self.suspicion_threshold:
+            return current_text
+
+        if self.output_mode == "edits":
+            return self._correct_with_edits(text_segment, current_text, fever_mode=fever_mode, window=window)
+        return self._correct_full_text(text_segment, current_text, fever_mode=fever_mode, window=window)
+
+    def _correct_full_text(self, text_segment: str, current_text: str, fever_mode: bool = False,
+                           window: bool = False) -> str:
+        """Mode "full" : le LLM réécrit le segment pré-corrigé (cascade de paliers)."""
         # 1. Construction du Prompt
         # Use the potentially pre-corrected text
         prompt = self._build_prompt(current_text, fever_mode=fever_mode)
+
+        # [Token Budget] Prompt + sortie doivent tenir dans n_ctx, sinon découpage par phrases
+        max_tokens = self._generation_budget(self._count_tokens(current_text))
+        if self._count_tokens(prompt) + max_tokens > self.n_ctx:
+            return self._correct_oversize(text_segment, fever_mode=fever_mode, window=window)
         
         # 2. Inférence
         try:
             # Température plus élevée en mode Fièvre pour la créativité
             temp = 0.2 if fever_mode else 0.1
             
-            output = self._model(
-                prompt, 
-                max_tokens=len(current_text) + 100, 
-                stop=["\n", "User:", "###", "[/INST]"], 
-                temperature=temp,
-                echo=False
-            )
-            
-            corrected_text = output['choices'][0]['text'].strip()
-            if "[/INST]" in corrected_text:
-                corrected_text = corrected_text.split("[/INST]")[-1].strip()
-
-            # [Antibody V1] Aggressive Hallucination Filter
-            # Removes meta-commentary like "(Inertie...)", "(Note...)", "(Correction...)"
-            hallucination_markers = ["Inertie", "Note", "Correction", "Explanation", "Texte", "Text", "Valid", "Avvertissement", "Attention", "Le mot", "La phrase", "Word", "Meaning", "Sens"]
-            for marker in hallucination_markers:
-                corrected_text = re.sub(r'\(\s*' + marker + r'.*?\)', '', corrected_text, flags=re.IGNORECASE).strip()
-            
-            # Clean up double spaces resulting from removal
-            corrected_text = re.sub(r'\s+', ' ', corrected_text).strip()
+            # [Cascade] Petit modèle d'abord, escalade vers le palier suivant si besoin
+            tiers = self._get_tiers()
+            for level, (path, model) in enumerate(tiers):
+                output = self._run_tier(
+                    path, model, prompt,
+                    is_last=level == len(tiers) - 1,
+                    max_tokens=max_tokens, 
+                    stop=["\n", "User:", "###", "[/INST]"], 
+                    temperature=temp,
+                )
+                corrected_text = self._clean_llm_output(output['choices'][0]['text'])
 
-            # 3. Validation avancée (Sanity Check + Jaccard)
-            if not self._is_safe_correction(text_segment, corrected_text, fever_mode=fever_mode):
-                 print(f"⚠️ Correction rejetée (Safety Check - Fever={fever_mode}): '{text_segment}' -> '{corrected_text}'")
-                 return text_segment
-            
-            # [V8] Si Fièvre et correction validée -> On log
-            if fever_mode and corrected_text != text_segment:
-                print(f"🌡️ FEVER REWRITE: '{text_segment}' -> '{corrected_text}'")
-            
-            # [Phase 27] Logic Guards (Strict Rules)
-            # Enforce Logical Consistency even if LLM missed it
-            corrected_text = self._apply_logic_guards(text_segment, corrected_text)
-            
-            return corrected_text
+                if level < len(tiers) - 1 and not self._tier_accepts(text_segment, corrected_text, output, fever_mode):
+                    continue
+                return self._finalize_correction(text_segment, corrected_text, fever_mode=fever_mode, tier=path,
+                                                 window=window)
 
         except Exception as e:
             print(f"❌ Erreur d'inférence: {e}")
             return text_segment
 
-    def _apply_logic_guards(self, original: str, corrected: str) -> str:
+    def correct_segments(self, segments: List[str], fever_mode: bool = False, window: bool = False,
+                         suspicion_scores: Optional[List[float]] = None) -> List[str]:
+        """
+        [Batching] Corrige plusieurs segments avec un seul appel LLM.
+        Les segments sont regroupés dans un prompt numéroté (dans la limite de n_ctx),
+        puis la sortie est démultiplexée par numéro. Chaque segment repasse par
+        _is_safe_correction ; seuls ceux dont le parsing échoue sont retraités un par un.
+        Retourne une liste alignée sur `segments`.
+        window=True : fenêtres de correct_spans (voir correct_segment).
+        suspicion_scores : un score par segment ; sous suspicion_threshold, SmartRules seulement.
+        """
+        results = list(segments)
+        pending = []  # (index, texte original, texte pré-corrigé)
+
+        for i, segment in enumerate(segments):
+            if not segment or not segment.strip():
+                continue
+            if self._is_protected_segment(segment):
+                continue
+            current_text = self._apply_fast_rules(segment)
+            # [Suspicion Gate] Même règle que correct_segment : segment jugé sain, pas de LLM
+            if not self._model or (suspicion_scores is not None and suspicion_scores[i] < self.suspicion_threshold):
+                results[i] = current_text
+                continue
+            pending.append((i, segment, current_text))
+
+        for batch in self._pack_batches(pending, fever_mode=fever_mode):
+            if len(batch) == 1 or self.output_mode == "edits":
+                # Les scripts d'édition sont déjà courts : pas de regroupement
+                for idx, segment, _ in batch:
+                    results[idx] = self.correct_segment(segment, fever_mode=fever_mode, window=window)
+                continue
+
+            # [Cascade] Les segments refusés par un palier sont regroupés pour le palier suivant
+            tiers = self._get_tiers()
+            for level, (path, model) in enumerate(tiers):
+                is_last = level == len(tiers) - 1
+                texts = [current for _, _, current in batch]
+                prompt = self._build_batch_prompt(texts, fever_mode=fever_mode)
+                parsed, output = {}, None
+                try:
+                    temp = 0.2 if fever_mode else 0.1
+                    output = self._run_tier(
+                        path, model, prompt,
+                        is_last=is_last,
+                        # Numérotation "N. " + saut de ligne ≈ 4 tokens par segment
+                        max_tokens=self._generation_budget(sum(self._count_tokens(t) + 4 for t in texts)),
+                        stop=["User:", "###", "[/INST]"],
+                        temperature=temp,
+                    )
+                    parsed = self._parse_numbered_output(output['choices'][0]['text'], len(texts))
+                except Exception as e:
+                    print(f"❌ Erreur d'inférence (lot de {len(texts)}): {e}")
+
+                escalated = []
+                for n, (idx, segment, current) in enumerate(batch, start=1):
+                    corrected_text = parsed.get(n)
+                    if corrected_text:
+                        corrected_text = self._clean_llm_output(corrected_text)
+                    if not is_last and (not corrected_text or not self._tier_accepts(segment, corrected_text, output, fever_mode)):
+                        escalated.append((idx, segment, current))
+                        continue
+                    if not corrected_text:
+                        if len(tiers) > 1:
+                            # [Cascade] Dernier palier sans réponse exploitable : les paliers précédents
+                            # ont déjà refusé ce segment, il n'est pas renvoyé dans toute la cascade
+                            results[idx] = current
+                        else:
+                            # Démultiplexage raté pour ce segment -> appel unitaire
+                            results[idx] = self.correct_segment(segment, fever_mode=fever_mode, window=window)
+                        continue
+                    results[idx] = self._finalize_correction(segment, corrected_text, fever_mode=fever_mode, tier=path,
+                                                             window=window)
+
+                batch = escalated
+                if not batch:
+                    break
+
+        return results
+
+    # --- [Cascade] Paliers de modèles ---
+
+    def _get_tiers(self) -> List[tuple]:
+        """Paliers (chemin, modèle) du plus petit au plus gros ; à défaut, le modèle unique."""
+        return getattr(self, '_tiers', None) or [("default", self._model)]
+
+    def _run_tier(self, path: str, model, prompt: str, is_last: bool, **kwargs) -> dict:
+        """Inférence sur un palier, avec mesure de latence (et log-probs si escalade possible)."""
+        stats = self.tier_stats.setdefault(path, {"attempts": 0, "accepted": 0, "latency": 0.0})
+        if not is_last:
+            kwargs["logprobs"] = 1
+        start = time.time()
+        try:
+            return model(prompt, echo=False, **kwargs)
+        finally:
+            stats["attempts"] += 1
+            stats["latency"] += time.time() - start
+
+    def _tier_accepts(self, original: str, corrected: str, output: Optional[dict], fever_mode: bool = False) -> bool:
+        """
+        [Cascade] Un palier intermédiaire est accepté si sa sortie passe le Safety Check,
+        ne laisse aucun mot inconnu, et a une log-probabilité moyenne suffisante.
+        """
+        if not corrected:
+            return False
+        if not self._is_safe_correction(original, corrected, fever_mode=fever_mode, record=False):
+            return False
+
+        if self.dictionary:
+            for word in corrected.split():
+                clean_w = word.strip(".,;:?!'\"()[]-")
+                if len(clean_w) > 3 and not clean_w[0].isupper() and not self._validate_word(clean_w):
+                    return False
+
+        try:
+            token_logprobs = [lp for lp in output['choices'][0]['logprobs']['token_logprobs'] if lp is not None]
+        except (KeyError, TypeError):
+            token_logprobs = []
+        if token_logprobs and sum(token_logprobs) / len(token_logprobs) < self.cascade_min_logprob:
+            return False
+        return True
+
+    def report_cascade_stats(self) -> Dict[str, dict]:
+        """Affiche et retourne, par palier, le taux d'acceptation et la latence moyenne."""
+        report = {}
+        print("\n📊 CASCADE (paliers de modèles)")
+        for path, stats in self.tier_stats.items():
+            attempts = stats["attempts"]
+            report[path] = {
+                "attempts": attempts,
+                "accepted": stats["accepted"],
+                "acceptance_rate": stats["accepted"] / attempts if attempts else 0.0,
+                "avg_latency": stats["latency"] / attempts if attempts else 0.0,
+            }
+            print(f"   {os.path.basename(path)}: {stats['accepted']}/{attempts} acceptés "
+                  f"({report[path]['acceptance_rate'] * 100:.1f}%), {report[path]['avg_latency']:.2f}s/appel")
+        return report
+
+    def correct_spans(self, segments: List[str], targets: List[List[str]], fever_mode: bool = False,
+                      suspicion_scores: Optional[List[float]] = None) -> List[str]:
+        """
+        [Span-Window] Ne soumet au LLM que de petites fenêtres autour des mots inconnus.
+        targets[i] liste les mots inconnus de segments[i]. Les fenêtres qui se chevauchent
+        sont fusionnées, corrigées en un seul lot (correct_segments), puis réinsérées par offset.
+        Sans span_radius, ou quand aucun mot ciblé n'est retrouvé dans le segment (ponctuation,
+        règles appliquées entre-temps), le segment est envoyé en entier.
+        Logic Guards et journalisation portent sur la ligne entière (clés, contexte_brut, débuts
+        de phrase), limités aux fenêtres corrigées.
+        suspicion_scores : un score par segment, appliqué à chacune de ses fenêtres.
+        """
+        if not self.span_radius or not TextProcessor:
+            return self.correct_segments(segments, fever_mode=fever_mode, suspicion_scores=suspicion_scores)
+
+        windows = []  # (index segment, début, fin)
+        for i, (segment, words) in enumerate(zip(segments, targets)):
+            found = TextProcessor.find_word_windows(segment, words, self.span_radius)
+            windows.extend((i, start, end) for start, end in found or [(0, len(segment))])
+
+        corrected = self.correct_segments(
+            [segments[i][s:e] for i, s, e in windows], fever_mode=fever_mode, window=True,
+            suspicion_scores=[suspicion_scores[i] for i, _, _ in windows] if suspicion_scores is not None else None)
+
+        results = list(segments)
+        spans = {}  # index segment -> fenêtres modifiées (début, fin) dans la ligne corrigée
+        # Réinsertion de droite à gauche pour que les offsets restent valides
+        for (i, start, end), fixed in reversed(list(zip(windows, corrected))):
+            if fixed == segments[i][start:end]:
+                continue
+            shift = len(fixed) - (end - start)
+            spans[i] = [(start, start + len(fixed))] + [(s + shift, e + shift) for s, e in spans.get(i, [])]
+            results[i] = results[i][:start] + fixed + results[i][end:]
+
+        for i, fixed_spans in spans.items():
+            self._log_validated_correction(segments[i], results[i])
+            results[i] = self._apply_logic_guards(segments[i], results[i], spans=fixed_spans)
+        return results
+
+    def _correct_with_edits(self, text_segment: str, current_text: str, fever_mode: bool = False,
+                            window: bool = False) -> str:
+        """
+        [Edit-Script] Le LLM ne renvoie que des éditions 'index=remplacement' (mots numérotés),
+        appliquées localement. Les gardiens (_is_safe_correction, Logic Guards) tournent
+        sur le texte reconstruit.
+        [Cascade] Même escalade que le mode "full" : un script hors format ou refusé par
+        _tier_accepts passe au palier suivant ; hors format au dernier palier, réécriture complète.
+        """
+        prompt = self._build_edit_prompt(current_text, fever_mode=fever_mode)
+        try:
+            temp = 0.2 if fever_mode else 0.1
+            tiers = self._get_tiers()
+            for level, (path, model) in enumerate(tiers):
+                is_last = level == len(tiers) - 1
+                kwargs = {}
+                grammar = self._get_edit_grammar(model)
+                if grammar is not None:
+                    kwargs["grammar"] = grammar
+
+                output = self._run_tier(
+                    path, model, prompt,
+                    is_last=is_last,
+                    max_tokens=self.edit_max_edits * 10 + 4,
+                    stop=["FIN", "User:", "###", "[/INST]"],
+                    temperature=temp,
+                    **kwargs
+                )
+                edits = self._parse_edit_script(output['choices'][0]['text'])
+                if edits is None:
+                    if not is_last:
+                        continue
+                    # Sortie hors format (modèle sans grammaire) : réécriture complète du segment
+                    return self._correct_full_text(text_segment, current_text, fever_mode=fever_mode, window=window)
+
+                corrected_text = self._apply_edit_script(current_text, edits) if edits else current_text
+                if not is_last and not self._tier_accepts(text_segment, corrected_text, output, fever_mode):
+                    continue
+                if not edits:
+                    # Aucune édition : seul le pré-traitement (SmartRules) s'applique
+                    return current_text
+                return self._finalize_correction(text_segment, corrected_text, fever_mode=fever_mode, tier=path,
+                                                 window=window)
+
+        except Exception as e:
+            print(f"❌ Erreur d'inférence (edit-script): {e}")
+            return text_segment
+
+    def _apply_threads(self, n_threads: Optional[int]):
+        """
+        [Resource Planner] Modèle hérité par fork d'un processus parent : les threads du plan de
+        ce worker sont appliqués aux contextes llama.cpp existants (sans rechargement).
+        """
+        if not n_threads or n_threads == getattr(self, 'n_threads', None):
+            return
+        self.n_threads = n_threads
+        for _, model in getattr(self, '_tiers', []):
+            ctx = getattr(getattr(model, '_ctx', None), 'ctx', None)
+            if ctx is None or llama_set_n_threads is None:
+                continue
+            llama_set_n_threads(ctx, n_threads, n_threads)
+            model.n_threads = model.n_threads_batch = n_threads
+
+    def _get_edit_grammar(self, model=None):
+        """Compile (une seule fois) la grammaire GBNF du mode edit-script, si disponible (pour `model`, défaut : _model)."""
+        if not self.use_grammar:
+            return None
+        if getattr(model if model is not None else self._model, "remote", False):
+            return EDIT_SCRIPT_GRAMMAR # llama-server compile la grammaire lui-même
+        if LlamaGrammar is None:
+            return None
+        if SemanticCorrector._edit_grammar is None:
+            try:
+                SemanticCorrector._edit_grammar = LlamaGrammar.from_string(EDIT_SCRIPT_GRAMMAR, verbose=False)
+            except Exception as e:
+                print(f"⚠️ Grammaire edit-script indisponible: {e}")
+                self.use_grammar = False
+                return None
+        return SemanticCorrector._edit_grammar
+
+    @staticmethod
+    def _parse_edit_script(raw_text: str) -> Optional[Dict[int, str]]:
+        """
+        Parse les lignes 'index=remplacement' jusqu'au marqueur FIN.
+        None si une ligne non vide n'est ni une édition ni FIN (sortie hors format).
+        """
+        edits = {}
+        if "[/INST]" in raw_text:
+            raw_text = raw_text.split("[/INST]")[-1]
+        for line in raw_text.splitlines():
+            if line.strip().upper().startswith("FIN"):
+                break
+            if not line.strip():
+                continue
+            match = re.match(r'^\s*(\d+)\s*[=:]\s*(.*?)\s*$', line)
+            if not match:
+                return None
+            if int(match.group(1)) not in edits:
+                edits[int(match.group(1))] = match.group(2)
+        return edits
+
+    @staticmethod
+    def _apply_edit_script(text: str, edits: Dict[int, str]) -> str:
+        """
+        Applique les éditions par index de mot (mots séparés par des espaces, comme str.split)
+        en conservant les espacements d'origine. Un remplacement vide supprime le mot et
+        l'espacement qui le précède ; un remplacement de plusieurs mots insère les mots suivants.
+        Les index hors bornes sont ignorés.
+        """
+        leading = text[:len(text) - len(text.lstrip())]
+        parts = []
+        end = 0
+        for index, (word, start) in enumerate(iter_words_with_offsets(text)):
+            gap = text[end:start]
+            end = start + len(word)
+            replacement = edits.get(index, word)
+            if replacement:
+                parts.append((gap if parts else leading) + replacement)
+        return "".join(parts) + text[end:] if parts else ""
+
+    def _is_protected_segment(self, text_segment: str) -> bool:
+        """[3-Pillar] True si le segment est majoritairement composé d'Entités Nommées."""
+        if not self.guardian:
+            return False
+        # Simple check: Is the whole segment mostly Entity-like?
+        # Or scan words? For single-word correction scenarios (common), this is vital.
+        # [Entity Index] Offsets transmis : verdict du NER du chapitre si la ligne y figure
+        words = list(iter_words_with_offsets(text_segment))
+        safe_count = 0
+        for i, (w, start) in enumerate(words):
+             context = words[i-1][0] if i > 0 else ""
+             if not self.guardian.is_safe_to_touch(w, context, line=text_segment, start=start):
+                 safe_count += 1
+
+        # Majority of words are Protected Entities -> Skip correction
+        return len(words) > 0 and safe_count >= len(words) / 2
+
+    def _apply_fast_rules(self, text_segment: str) -> str:
+        """[Phase 36] Applique les SmartRules connues avant le LLM."""
+        if not self.rule_applicator:
+            return text_segment
+        return self.rule_applicator.apply_rules(text_segment)
+
+    def _clean_llm_output(self, raw_text: str) -> str:
+        """Nettoie la sortie brute du LLM (balises, méta-commentaires, espaces)."""
+        corrected_text = raw_text.strip()
+        if "[/INST]" in corrected_text:
+            corrected_text = corrected_text.split("[/INST]")[-1].strip()
+
+        # [Antibody V1] Aggressive Hallucination Filter
+        # Removes meta-commentary like "(Inertie...)", "(Note...)", "(Correction...)"
+        hallucination_markers = ["Inertie", "Note", "Correction", "Explanation", "Texte", "Text", "Valid", "Avvertissement", "Attention", "Le mot", "La phrase", "Word", "Meaning", "Sens"]
+        for marker in hallucination_markers:
+            corrected_text = re.sub(r'\(\s*' + marker + r'.*?\)', '', corrected_text, flags=re.IGNORECASE).strip()
+        
+        # Clean up double spaces resulting from removal
+        return re.sub(r'\s+', ' ', corrected_text).strip()
+
+    def _finalize_correction(self, text_segment: str, corrected_text: str, fever_mode: bool = False, tier: str = None,
+                             window: bool = False) -> str:
+        """
+        Validation (Safety Check) puis Logic Guards. Retourne l'original si rejet.
+        `tier` : palier de la cascade ayant produit la correction (statistiques d'acceptation).
+        `window` : fragment de ligne, journalisé et gardé par correct_spans sur la ligne entière.
+        """
+        # 3. Validation avancée (Sanity Check + Jaccard)
+        if not self._is_safe_correction(text_segment, corrected_text, fever_mode=fever_mode, record=not window):
+             print(f"⚠️ Correction rejetée (Safety Check - Fever={fever_mode}): '{text_segment}' -> '{corrected_text}'")
+             return text_segment
+
+        if tier in self.tier_stats:
+            self.tier_stats[tier]["accepted"] += 1
+        
+        # [V8] Si Fièvre et correction validée -> On log
+        if fever_mode and corrected_text != text_segment:
+            print(f"🌡️ FEVER REWRITE: '{text_segment}' -> '{corrected_text}'")
+        
+        if window:
+            return corrected_text
+
+        # [Phase 27] Logic Guards (Strict Rules)
+        # Enforce Logical Consistency even if LLM missed it
+        return self._apply_logic_guards(text_segment, corrected_text)
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Estimation grossière du nombre de tokens (~3 caractères/token en français)."""
+        return len(text) // 3 + 1
+
+    def _count_tokens(self, text: str) -> int:
+        """
+        [Token Budget] Nombre de tokens via le tokenizer du modèle local (estimation à défaut).
+        Modèle distant (llama-server) : estimation, un aller-retour HTTP par comptage coûterait
+        plus que ce que le budget fait gagner.
+        """
+        if (self._model is not None and hasattr(self._model, "tokenize")
+                and not getattr(self._model, "remote", False)):
+            try:
+                return len(self._model.tokenize(text.encode("utf-8"), add_bos=False))
+            except Exception:
+                pass
+        return self._estimate_tokens(text)
+
+    def _generation_budget(self, input_tokens: int) -> int:
+        """[Token Budget] max_tokens serré : la correction fait à peu près la taille de l'entrée."""
+        return int(input_tokens * self.gen_margin_ratio) + self.gen_margin_tokens
+
+    def _split_to_fit(self, text: str, fever_mode: bool = False) -> List[Tuple[int, int]]:
+        """
+        [Token Budget] Découpe un segment trop long en spans (début, fin) de `text` : phrases
+        regroupées tant que le prompt tient, jamais à cheval sur un saut de ligne. Une phrase
+        seule trop longue est coupée en deux sur les espaces. Les séparateurs (espaces, sauts
+        de ligne) restent hors des spans, pour être recollés tels quels.
+        """
+        base_cost = self._count_tokens(self._build_prompt("", fever_mode=fever_mode)) + 200  # Marge RAG
+        limit = max(16, int((self.n_ctx - base_cost - self.gen_margin_tokens) / (1 + self.gen_margin_ratio)))
+
+        sentences, start = [], 0
+        for m in SENTENCE_BOUNDARY.finditer(text):
+            if m.start() > start:
+                sentences.append((start, m.start()))
+            start = m.end()
+        if start < len(text):
+            sentences.append((start, len(text)))
+
+        pieces = []  # (début, fin, tokens)
+        for sentence in sentences:
+            stack = [sentence]
+            while stack:
+                p_start, p_end = stack.pop()
+                tokens = self._count_tokens(text[p_start:p_end])
+                words = list(iter_words_with_offsets(text[p_start:p_end]))
+                if tokens > limit and len(words) > 1:
+                    half = len(words) // 2
+                    left_end = p_start + words[half - 1][1] + len(words[half - 1][0])
+                    stack.append((p_start + words[half][1], p_end))
+                    stack.append((p_start, left_end))
+                else:
+                    pieces.append((p_start, p_end, tokens))
+
+        chunks, current, cost = [], None, 0
+        for p_start, p_end, tokens in pieces:
+            # Séparateur compté pour un token ; un saut de ligne ferme toujours le morceau
+            if current and cost + 1 + tokens <= limit and "\n" not in text[current[1]:p_start]:
+                current, cost = (current[0], p_end), cost + 1 + tokens
+                continue
+            if current:
+                chunks.append(current)
+            current, cost = (p_start, p_end), tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _correct_oversize(self, text_segment: str, fever_mode: bool = False, window: bool = False) -> str:
+        """[Token Budget] Corrige un segment trop long morceau par morceau (en un lot), séparateurs d'origine conservés."""
+        spans = self._split_to_fit(text_segment, fever_mode=fever_mode)
+        if len(spans) <= 1:
+            print(f"⚠️ Segment trop long pour n_ctx={self.n_ctx}, ignoré ({len(text_segment)} car.)")
+            return text_segment
+        corrected = self.correct_segments([text_segment[s:e] for s, e in spans], fever_mode=fever_mode, window=window)
+        parts, end = [], 0
+        for (start, stop), fixed in zip(spans, corrected):
+            parts.append(text_segment[end:start])
+            parts.append(fixed)
+            end = stop
+        parts.append(text_segment[end:])
+        return "".join(parts)
+
+    def _pack_batches(self, pending: List[tuple], fever_mode: bool = False) -> List[List[tuple]]:
+        """
+        Regroupe les segments en lots dont le prompt + la sortie attendue tiennent dans n_ctx.
+        Les segments multi-lignes restent seuls (le format numéroté est ligne à ligne).
+        """
+        base_cost = self._count_tokens(self._build_batch_prompt([], fever_mode=fever_mode))
+        # Marge pour les précédents RAG injectés dans le prompt réel
+        budget = self.n_ctx - base_cost - 200
+
+        batches = []
+        current, cost = [], 0
+        for item in pending:
+            text = item[2]
+            if "\n" in text:
+                batches.append([item])
+                continue
+            # Entrée + budget de sortie + numérotation
+            tokens = self._count_tokens(text) + 4
+            item_cost = tokens + self._generation_budget(tokens)
+            if current and (cost + item_cost > budget or len(current) >= self.batch_max_segments):
+                batches.append(current)
+                current, cost = [], 0
+            current.append(item)
+            cost += item_cost
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _parse_numbered_output(raw_text: str, expected: int) -> Dict[int, str]:
+        """
+        Démultiplexe une sortie numérotée ('1. texte', '2) texte', '[3] texte').
+        Seule la première occurrence de chaque numéro attendu est retenue.
+        """
+        parsed = {}
+        if "[/INST]" in raw_text:
+            raw_text = raw_text.split("[/INST]")[-1]
+        for line in raw_text.splitlines():
+            match = re.match(r'^\s*\[?(\d+)\s*[\].):-]\s*(.*)$', line)
+            if not match:
+                continue
+            n = int(match.group(1))
+            if 1 <= n <= expected and n not in parsed:
+                parsed[n] = match.group(2).strip()
+        return parsed
+
+    def _apply_logic_guards(self, original: str, corrected: str, spans: List[Tuple[int, int]] = None) -> str:
         """
         [Phase 27] Hard-coded rules to fix logical inconsistencies the LLM might miss.
         1. Common Words Capitalization: 'la Lune' -> 'la lune'
         2. Dialogue Structure: Restore lost dashes? (Dangerous, maybe just protect existing)
+        Words are replaced in place: spacing, tabs and line breaks of `corrected` are kept.
+        [Span-Window] `spans` (offsets in `corrected`): only the words of those windows are checked.
         """
-        final = corrected
-        
+        if not self.dictionary:
+            return corrected
+
         # Rule 1: Fix Mid-Sentence Capitalization of Common Words (if not proper noun)
         # This is risky without a POS tagger, but we can do a dictionary check.
         # If 'Lune' is unknown but 'lune' is known, use 'lune'.
-        
-        words = final.split()
-        if len(words) > 1:
-            new_words = []
-            for i, w in enumerate(words):
-                # Skip first word (sentence start)
-                if i == 0:
-                    new_words.append(w)
-                    continue
-                    
-                # If word is capitalized
-                if w[0].isupper() and len(w) > 1:
-                     # Check if it's a known proper noun?
-                     # If 'lune' exists in dictionary but 'Lune' does not?
-                     lower_w = w.lower()
-                     if self.dictionary.validate(lower_w) and not self.dictionary.validate(w):
-                         # High probability it's a mistake (e.g. 'la Lune')
-                         new_words.append(lower_w)
-                     else:
-                         new_words.append(w)
-                else:
-                    new_words.append(w)
-            final = " ".join(new_words)
-            
-        return final
+        parts, end = [], 0
+        for w, offset in iter_words_with_offsets(corrected):
+            # Skip sentence starts (line start, after strong punctuation)
+            if spans is not None and not any(start <= offset < end for start, end in spans):
+                continue
+            if w[0].isupper() and len(w) > 1 and not is_sentence_initial(corrected, offset):
+                lower_w = w.lower()
+                if self.dictionary.validate(lower_w) and not self.dictionary.validate(w):
+                    # High probability it's a mistake (e.g. 'la Lune')
+                    parts.append(corrected[end:offset])
+                    parts.append(lower_w)
+                    end = offset + len(w)
+        parts.append(corrected[end:])
+        return "".join(parts)
 
-    def _is_safe_correction(self, original: str, corrected: str, fever_mode: bool = False) -> bool:
+    def _is_safe_correction(self, original: str, corrected: str, fever_mode: bool = False, record: bool = True) -> bool:
         """
         Vérifie si la correction est sûre.
         Si fever_mode=True, on abaisse les seuils de Jaccard et d'Inertie.
+        Si record=False (palier intermédiaire de la cascade), la correction n'est pas journalisée.
         """
         if not corrected:
              return False
@@ -321,7 +906,7 @@ Règles STRICTES :
         if self.dictionary:
             new_words = corr_tokens - orig_tokens
             for word in new_words:
-                if len(word) > 2 and not self.dictionary.validate(word):
+                if len(word) > 2 and not self._validate_word(word):
                      # [V8] En mode Fièvre, on est plus tolérant sur les "nouveaux" mots si le contexte l'exige?
                      # Non, le Gardien reste strict sur les Mots INCONNUS. On ne veut pas d'hallucination lexicale.
                      print(f"🛡️ VETO GARDIEN : Mot inventé/inconnu détecté '{word}' -> Correction rejetée.")
@@ -349,9 +934,13 @@ Règles STRICTES :
         
         # [V5.1] PRINCIPE D'INERTIE (The Anchor)
         if self.dictionary:
+            # Ratio Normal: 0.8 | Fièvre: 0.6 (Autorise "traduit" -> "conduit" ?)
+            # "traduit"/"conduit" = 0.57. Donc même 0.6 est limite.
+            # Mais 0.6 permet plus de souplesse.
+            sim_threshold = 0.6 if fever_mode else 0.8
             for word in orig_tokens:
                 # 1. Le mot original est-il valide ?
-                if len(word) > 3 and self.dictionary.validate(word):
+                if len(word) > 3 and self._validate_word(word):
                     # 2. Est-il présent dans la correction ?
                     if word in corr_tokens:
                         continue 
@@ -359,12 +948,9 @@ Règles STRICTES :
                     # 3. S'il a disparu, est-ce pour une "bonne cause" (correction mineure) ?
                     match_found = False
                     for c_word in corr_tokens:
-                        # Ratio Normal: 0.8 | Fièvre: 0.6 (Autorise "traduit" -> "conduit" ?)
-                        # "traduit"/"conduit" = 0.57. Donc même 0.6 est limite.
-                        # Mais 0.6 permet plus de souplesse.
-                        sim_threshold = 0.6 if fever_mode else 0.8
-                        sim = SequenceMatcher(None, word, c_word).ratio()
-                        if sim > sim_threshold:
+                        # [Inertia Kernel] Même décision que SequenceMatcher(...).ratio() > seuil,
+                        # sans construire de matcher pour les paires trop éloignées
+                        if ratio_exceeds(word, c_word, sim_threshold):
                             match_found = True
                             break
                     
@@ -382,9 +968,19 @@ Règles STRICTES :
                          print(f"⚓ OR VETO INERTIE : Tentative de modif mot valide '{word}' (non retrouvé ou trop modifié). Rejet.")
                          return False
 
-        self._log_validated_correction(original, corrected)
+        if record:
+            self._log_validated_correction(original, corrected)
         return True
 
+    def _validate_word(self, word: str) -> bool:
+        """[Inertia Kernel] dictionary.validate avec cache des verdicts par token."""
+        verdict = self._verdicts.get(word)
+        if verdict is None:
+            if len(self._verdicts) >= 200000:
+                self._verdicts.clear()
+            verdict = self._verdicts[word] = self.dictionary.validate(word)
+        return verdict
+
     def _log_validated_correction(self, original: str, corrected: str):
         """
         Enregistre la correction validée en utilisant un alignement par DIFF
@@ -393,12 +989,13 @@ Règles STRICTES :
         if not get_composite_key:
             return
 
-        import json
         from datetime import datetime
-        from difflib import SequenceMatcher
         
-        orig_tokens = original.split()
+        orig_words = list(iter_words_with_offsets(original))
+        orig_tokens = [w for w, _ in orig_words]
         corr_tokens = corrected.split()
+        # [Line Keys] Une tokenisation pour toute la ligne ; chaque occurrence garde sa fenêtre
+        line_keys = LineKeys(original)
         
         # Utilisation de SequenceMatcher pour aligner les mots
         matcher = SequenceMatcher(None, orig_tokens, corr_tokens)
@@ -418,7 +1015,7 @@ Règles STRICTES :
                     c_word = corr_tokens[idx_corr]
                     
                     if o_word != c_word:
-                        key = get_composite_key(o_word, original)
+                        key = line_keys.key_for(o_word, orig_words[idx_orig][1])
                         entry = {
                             "key": key,
                             "mot_source": o_word,
@@ -430,10 +1027,10 @@ Règles STRICTES :
                         
                         self.session_log.append(entry)
                         
-                        # Sauvegarde incrémentale
-                        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
-                        with open(self.log_path, 'a', encoding='utf-8') as f:
-                            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                        # Sauvegarde incrémentale (par lots, thread de fond)
+                        writer = self._get_log_writer()
+                        if writer:
+                            writer.write(entry)
                     
                     idx_orig += 1
                     idx_corr += 1
@@ -478,4 +1075,75 @@ Sortie: -racheter ma mort.
 {static_examples}
 
 Entrée: {text}
+Sortie: [/INST]"""
+
+    def _build_edit_prompt(self, text: str, fever_mode: bool = False) -> str:
+        """[Edit-Script] Prompt à mots numérotés : le modèle ne renvoie que les mots à changer."""
+        dynamic_examples = self._lookup_knowledge(text)
+        example_str = ""
+        if dynamic_examples:
+            example_str += "\n--- Exemples (Précédents) appris pertinents ---\n"
+            for i, ex in enumerate(dynamic_examples):
+                src = ex.get('original') or ex.get('mot_source')
+                tgt = ex.get('corrected') or ex.get('mot_cible')
+                example_str += f"Précédent {i+1}: {src} -> {tgt}\n"
+
+        static_examples = """
+--- Exemple (Éditions) ---
+Entrée: 0:Le 1:cbat 2:boit 3:du 4:lait.
+Sortie:
+1=chat
+FIN
+"""
+        base_prompt = f"{self.prompt_template}"
+        base_prompt += "9. Les mots sont numérotés. Ne recopie PAS le texte : renvoie uniquement les mots à corriger, un par ligne, au format 'numéro=mot corrigé', puis 'FIN'. Si rien n'est à corriger, renvoie seulement 'FIN'.\n"
+
+        if fever_mode:
+            base_prompt += "\n>>> MODE FIÈVRE (DAREDEVIL) ACTIVÉ <<<\n"
+            base_prompt += "INSTRUCTION PRIORITAIRE : Tu DOIS corriger toutes les erreurs visuelles (ex: 1'homme -> l'homme, c0mment -> comment) même si tu as un doute. SOIS AUDACIEUX. N'aie pas peur de modifier.\n"
+
+        numbered = " ".join(f"{i}:{w}" for i, w in enumerate(text.split()))
+        return f"""{base_prompt}
+
+{example_str}
+{static_examples}
+
+Entrée: {numbered}
+Sortie: [/INST]"""
+
+    def _build_batch_prompt(self, texts: List[str], fever_mode: bool = False) -> str:
+        """[Batching] Prompt numéroté : une ligne par segment, même numérotation en sortie."""
+        dynamic_examples = self._lookup_knowledge(" ".join(texts)) if texts else []
+        example_str = ""
+        if dynamic_examples:
+            example_str += "\n--- Exemples (Précédents) appris pertinents ---\n"
+            for i, ex in enumerate(dynamic_examples):
+                src = ex.get('original') or ex.get('mot_source')
+                tgt = ex.get('corrected') or ex.get('mot_cible')
+                example_str += f"Précédent {i+1}:\nEntrée: {src}\nSortie: {tgt}\n"
+
+        static_examples = """
+--- Exemple (Lignes numérotées) ---
+Entrée:
+1. Le cbat boit du lait.
+2. Il fait beau.
+Sortie:
+1. Le chat boit du lait.
+2. Il fait beau.
+"""
+        base_prompt = f"{self.prompt_template}"
+        base_prompt += "9. Le texte est découpé en lignes numérotées. Renvoie EXACTEMENT le même nombre de lignes, chacune précédée de son numéro (ex: '2. ...'). Ne fusionne et ne saute jamais une ligne.\n"
+
+        if fever_mode:
+            base_prompt += "\n>>> MODE FIÈVRE (DAREDEVIL) ACTIVÉ <<<\n"
+            base_prompt += "INSTRUCTION PRIORITAIRE : Tu DOIS corriger toutes les erreurs visuelles (ex: 1'homme -> l'homme, c0mment -> comment) même si tu as un doute. SOIS AUDACIEUX. N'aie pas peur de modifier.\n"
+
+        numbered = "\n".join(f"{i}. {t}" for i, t in enumerate(texts, start=1))
+        return f"""{base_prompt}
+
+{example_str}
+{static_examples}
+
+Entrée:
+{numbered}
 Sortie: [/INST]"""
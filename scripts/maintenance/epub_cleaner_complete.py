@@ -14,7 +14,16 @@ from core.text_processor import TextProcessor
 from correctors.deterministic_corrector import DeterministicCorrector
 from correctors.semantic_corrector import SemanticCorrector
 from core.knowledge_manager import KnowledgeManager
+from core.smart_rule_applicator import SmartRuleApplicator
+from core.suspicion_scorer import SuspicionScorer
+from core.session_log_writer import SessionLogWriter
+from core.resource_planner import plan_resources
+from core.ner_guardian import NerGuardian
+from core.gazetteer import Gazetteer
+from core.entity_index import MIN_SCORE
+from core.capitalization_profile import CapitalizationProfile, is_sentence_initial
 import concurrent.futures
+import multiprocessing
 import copy
 
 
@@ -35,11 +44,27 @@ class CompleteEPUBCleaner:
         self.book = None
         self.dictionary = FrenchDictionary(dictionary_path)
         self.corrector = DeterministicCorrector()
+        # [V6] Mémoire de correction (RAG & Cache)
+        # Processus parent : seul lecteur-écrivain (synchronisation de l'index, promotion des règles),
+        # construit avant le correcteur et les workers qui l'ouvrent en lecture seule
+        self.knowledge = KnowledgeManager()
         self.semantic = SemanticCorrector() # Singleton, chargera le modèle si présent
         self.repeated_texts = []
         
-        # [V6] Mémoire de correction (RAG & Cache)
-        self.knowledge = KnowledgeManager()
+        # [Rule Promotion] Entrées stables de la KB compilées en règles (chargées par process_epub)
+        self.promoted_rules = SmartRuleApplicator(self.knowledge.promoted_rules_path, dictionary=self.dictionary)
+
+        # [Suspicion Gate] Seules les lignes réellement endommagées partent au LLM
+        self.suspicion = SuspicionScorer()
+
+        # [Entity Index] Pré-passe NER par chapitre (process_epub) ; False : désactivée
+        self.entity_prepass = True
+
+        # [Gazetteer] Entités confirmées de la série (portée fixée au chargement de l'EPUB)
+        self.gazetteer = Gazetteer()
+
+        # [Capitalization Profile] Statistiques de casse du livre (process_epub)
+        self.capitalization_profile = None
 
     def load_epub(self):
         """Charge le fichier EPUB"""
@@ -56,12 +81,28 @@ class CompleteEPUBCleaner:
             
             # Initialisation de la session de log avec le titre
             self.semantic.initialize_session(title)
+
+            # [Gazetteer] Noms déjà confirmés dans les autres volumes de la série
+            series = self.detect_series()
+            self.gazetteer = Gazetteer(self.gazetteer.db_path, series=series, book=title)
+            self.gazetteer.load()
+            stats = self.gazetteer.stats()
+            print(f"📇 Gazetteer : série '{stats['series']}', {stats['confirmed']} entité(s) confirmée(s)")
             
             return True
         except Exception as e:
             print(f"✗ Erreur lors du chargement de l'EPUB: {e}")
             return False
 
+    def detect_series(self):
+        """[Gazetteer] Série du livre (métadonnées calibre:series ou belongs-to-collection), None sinon."""
+        for value, attrs in self.book.get_metadata('OPF', None):
+            if attrs.get('name') == 'calibre:series' and attrs.get('content'):
+                return attrs['content'].strip()
+            if attrs.get('property') == 'belongs-to-collection' and value:
+                return value.strip()
+        return None
+
     def detect_repeated_texts(self):
         """
         Détecte les textes qui apparaissent de manière répétitive
@@ -91,26 +132,87 @@ class CompleteEPUBCleaner:
             print(f"✓ {len(self.repeated_texts)} texte(s) répétitif(s) détecté(s)")
         return self.repeated_texts
 
-    def clean_html_content(self, html_content):
-        """Nettoie le contenu HTML d'un chapitre."""
-        # Extraire le texte
+    def chapter_text(self, html_content):
+        """Texte d'un chapitre, titres répétitifs retirés (point de départ du nettoyage)."""
         text = TextProcessor.extract_from_html(html_content)
-        
-        # Supprimer les titres répétitifs
         for repeated in self.repeated_texts:
             text = text.replace(repeated, "")
+        return text
+
+    def build_capitalization_profile(self):
+        """
+        [Capitalization Profile] Passe sur tous les chapitres du livre : casse de chaque mot en
+        milieu de phrase. Les noms propres évidents et les mots communs en début de phrase sont
+        tranchés sans NER.
+        """
+        documents = [item for item in self.book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT]
+        self.capitalization_profile = CapitalizationProfile.from_texts(
+            self.chapter_text(item.get_content().decode('utf-8')) for item in documents
+        )
+        stats = self.capitalization_profile.stats()
+        print(f"🔠 Profil de casse : {stats['entities']} nom(s) propre(s), {stats['common']} mot(s) commun(s), "
+              f"{stats['ambiguous']} ambigu(s) sur {stats['words']} mot(s)")
+        return self.capitalization_profile
+
+    def build_entity_indexes(self, items):
+        """
+        [Entity Index] Pré-passe : CamemBERT-NER sur chaque chapitre entier (phrases groupées en
+        lots), une seule fois, avant le nettoyage. Les vérifications « nom propre ? » du nettoyage
+        deviennent des recherches dichotomiques dans l'index au lieu d'appels au daemon.
+        Renvoie {nom du chapitre: EntityIndex} (vide si le daemon NER n'est pas disponible).
+        """
+        if not self.entity_prepass or not self.semantic._model:
+            return {}
+        from core.ner_agent import NERAgent
+        import time
+        start = time.time()
+        agent = NERAgent(use_flaubert=True)
+        indexes = {}
+        try:
+            for item in items:
+                index = agent.index_text(self.chapter_text(item.get_content().decode('utf-8')))
+                if index is None:
+                    break # Daemon indisponible : le nettoyage reviendra aux appels NER ligne par ligne
+                indexes[item.get_name()] = index
+                # [Gazetteer] Chaque entité sûre du chapitre est une observation pour la série
+                self.gazetteer.record_many(
+                    (index.text[start:end], label)
+                    for start, end, label, score in index.entities_in(0, len(index.text)) if score >= MIN_SCORE
+                )
+        finally:
+            agent.close()
+            self.gazetteer.flush()
+        if indexes:
+            spans = sum(len(index) for index in indexes.values())
+            print(f"🏷️ Pré-passe NER : {spans} entité(s) dans {len(indexes)} chapitre(s) "
+                  f"({agent.cache_stats['requests']} requête(s), {time.time() - start:.1f}s)")
+        return indexes
+
+    def clean_html_content(self, html_content):
+        """Nettoie le contenu HTML d'un chapitre."""
+        # Extraire le texte (titres répétitifs retirés)
+        text = self.chapter_text(html_content)
 
         # Appliquer les corrections déterministes
         cleaned_text = self.corrector.correct(text)
 
+        # [Rule Promotion] Passe en masse des règles promues de la KB, avant le routage LLM
+        lines = cleaned_text.split('\n')
+        settled_words = []
+        for i, line in enumerate(lines):
+            lines[i], settled = self.promoted_rules.apply_context_rules(line)
+            settled_words.append(settled)
+        cleaned_text = '\n'.join(lines)
+
         # Appliquer la correction sémantique (LLM) par paragraphe
         # On ne traite que si le modèle est chargé
         if self.semantic._model:
             print(f"    🤖 Optimisation Sémantique en cours ({len(html_content)} octets)...")
-            lines = cleaned_text.split('\n')
             final_lines = []
+            llm_indices = []
+            llm_targets = []
             
-            for line in lines:
+            for line, settled in zip(lines, settled_words):
                 stripped = line.strip()
                 if not stripped:
                     final_lines.append(line)
@@ -129,31 +231,33 @@ class CompleteEPUBCleaner:
                     continue
                 
                 # On compte combien de mots semblent invalides
-                unknown_count = 0
-                temp_line = stripped
-                
-                for w in words:
+                # (les mots réglés par les règles promues de la KB ne partent plus au LLM)
+                unknown_words = []
+                for w in stripped.split():
+                    if len(w) <= 3:
+                        continue
                     clean_w = w.strip(".,;:?!'\"()[]-")
-                    if not self.dictionary.validate(clean_w):
-                        # [V6] Tentative de Cache Hit (V7: avec confiance)
-                        cache_hit = self.knowledge.lookup(clean_w, stripped)
-                        if cache_hit and cache_hit.get('can_fast_track'):
-                            # print(f"      [FAST-TRACK] {clean_w} -> {cache_hit['mot_cible']}")
-                            temp_line = temp_line.replace(clean_w, cache_hit['mot_cible'])
-                        else:
-                            # Pas de cache ou confiance insuffisante -> Nécessite le LLM
-                            unknown_count += 1
+                    if clean_w not in settled and not self.dictionary.validate(clean_w):
+                        unknown_words.append(clean_w)
+                unknown_count = len(unknown_words)
                 
                 # 3. Décision : On appelle le LLM seulement si > 0 mot inconnu restant
-                if unknown_count > 0:
-                    corrected = self.semantic.correct_segment(line)
-                    final_lines.append(corrected)
-                elif temp_line != stripped:
-                    # Correction effectuée via Cache uniquement
-                    final_lines.append(temp_line)
-                else:
-                    # Tout est connu ou déjà ignoré
-                    final_lines.append(line)
+                # et si le score de suspicion confirme que la ligne est endommagée
+                unknown_ratio = unknown_count / len(words)
+                if unknown_count > 0 and self.suspicion.should_correct(stripped, unknown_ratio):
+                    # [Batching] Corrigé plus bas en un seul lot
+                    llm_indices.append(len(final_lines))
+                    llm_targets.append(unknown_words)
+                # Sinon tout est connu (ou corrigé par les règles promues)
+                final_lines.append(line)
+
+            if llm_indices:
+                # [Span-Window] Seules les fenêtres autour des inconnus partent au LLM si span_radius > 0
+                corrected = self.semantic.correct_spans([final_lines[i] for i in llm_indices], llm_targets)
+                for i, corrected_line in zip(llm_indices, corrected):
+                    final_lines[i] = corrected_line
+
+            self.suspicion.flush_decisions()
             
             cleaned_text = '\n'.join(final_lines)
         
@@ -166,6 +270,8 @@ class CompleteEPUBCleaner:
             return False
 
         self.detect_repeated_texts()
+        self.refresh_promoted_rules()
+        self.build_capitalization_profile()
 
         print(f"\n🧹 Nettoyage des chapitres (Workers: {max_workers})...")
         
@@ -179,18 +285,34 @@ class CompleteEPUBCleaner:
                 items_to_process.append(item)
                 limit_counter += 1
 
+        entity_indexes = self.build_entity_indexes(items_to_process)
+
         if max_workers <= 1:
             # Mode Séquentiel (Original)
             for item in items_to_process:
                 try:
                     content = item.get_content().decode('utf-8')
+                    NerGuardian.use_entity_index(entity_indexes.get(item.get_name()))
+                    NerGuardian.use_gazetteer(self.gazetteer)
+                    NerGuardian.use_capitalization_profile(self.capitalization_profile)
                     cleaned_content = self.clean_html_content(content)
                     item.set_content(cleaned_content.encode('utf-8'))
                     print(f"✓ Chapitre nettoyé: {item.get_name()}")
                 except Exception as e:
                     print(f"✗ Erreur sur {item.get_name()}: {e}")
+            NerGuardian.use_entity_index(None)
+            NerGuardian.use_gazetteer(None)
+            NerGuardian.use_capitalization_profile(None)
+            self.semantic.flush_session_log()
+            self.report_kb_lookups(self.promoted_rules.context_stats)
         else:
             # Mode Parallèle (V7)
+            # [Resource Planner] Chaque worker charge sa copie du modèle : le plan borne leur nombre
+            # (cœurs physiques, RAM) et attribue à chacun ses threads et ses cœurs
+            model_paths = [path for path, _ in getattr(self.semantic, '_tiers', [])]
+            plan = plan_resources(model_paths, requested=max_workers)
+            max_workers = plan.instances
+            print(f"🧮 Plan de ressources : {plan.describe()}")
             print(f"🚀 Lancement du pool de {max_workers} processus...")
             # On doit extraire les données pour les envoyer aux workers
             # car l'objet epub.Item n'est pas forcément picklable facilement sans perte.
@@ -200,17 +322,26 @@ class CompleteEPUBCleaner:
                     'name': item.get_name(),
                     'content': item.get_content().decode('utf-8'),
                     'repeated_texts': self.repeated_texts,
-                    'log_path': self.semantic.log_path # On transmet le chemin du log
+                    'log_path': self.semantic.log_path, # On transmet le chemin du log
+                    'promoted_rules_path': self.knowledge.promoted_rules_path,
+                    'entity_index': entity_indexes.get(item.get_name()),
+                    'gazetteer': self.gazetteer,
+                    'capitalization_profile': self.capitalization_profile
                 })
 
-            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
+            slots = multiprocessing.Value('i', 0) # Numéro d'instance pris par chaque worker au démarrage
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                                        initargs=(plan, slots)) as executor:
                 # Utilisation d'une fonction statique ou globale pour le worker
                 futures = {executor.submit(worker_clean_chapter, task): task['name'] for task in tasks}
+                lookup_stats = {}
                 
                 for future in concurrent.futures.as_completed(futures):
                     item_name = futures[future]
                     try:
-                        result_content = future.result()
+                        result_content, chapter_stats = future.result()
+                        for level, hits in chapter_stats.items():
+                            lookup_stats[level] = lookup_stats.get(level, 0) + hits
                         # On retrouve l'item original pour mettre à jour son contenu
                         for item in items_to_process:
                             if item.get_name() == item_name:
@@ -220,9 +351,30 @@ class CompleteEPUBCleaner:
                     except Exception as e:
                         print(f"✗ Erreur parallèle sur {item_name}: {e}")
 
+            # [Buffered Log] Fusion des logs partiels écrits par chaque worker
+            merged = SessionLogWriter.merge_parts(self.semantic.log_path)
+            print(f"📁 {merged} correction(s) fusionnée(s) dans {self.semantic.log_path}")
+            self.report_kb_lookups(lookup_stats)
+
         print(f"\n✓ {len(items_to_process)} chapitre(s) traité(s)")
         return True
 
+    def refresh_promoted_rules(self):
+        """[Rule Promotion] Recompile les règles promues si la KB a changé depuis la dernière promotion."""
+        if self.knowledge.rules_are_stale():
+            count = self.knowledge.promote_rules()
+            print(f"⚡ Promotion KB : {count} règle(s) contextuelle(s) compilée(s).")
+            self.promoted_rules = SmartRuleApplicator(self.knowledge.promoted_rules_path, dictionary=self.dictionary)
+
+    @staticmethod
+    def report_kb_lookups(lookup_stats):
+        """[Backoff] Affiche la répartition des résolutions KB par niveau (exact, ±1, mot seul)."""
+        total = sum(lookup_stats.values())
+        if not total:
+            return
+        details = ", ".join(f"{level}: {hits} ({hits / total:.1%})" for level, hits in lookup_stats.items())
+        print(f"🗂️ Recherches KB ({total}) -> {details}")
+
     def save_epub(self, output_path):
         """Sauvegarde l'EPUB nettoyé"""
         try:
@@ -246,15 +398,60 @@ class CompleteEPUBCleaner:
 
 # Global variable for worker processes
 ner_agent = None
+suspicion_scorer = None
+promoted_rules = None
+gazetteer = None
 
-def init_worker():
+def init_worker(plan=None, slots=None):
     """Initialise les ressources persistantes du worker (NER Agent, Corrector Singleton)."""
     import os
-    global ner_agent
+    global ner_agent, suspicion_scorer
+    if plan is not None:
+        # [Resource Planner] Threads et cœurs de cette instance, avant tout chargement de modèle
+        # (hérités par le daemon NER lancé ci-dessous)
+        with slots.get_lock():
+            index = slots.value
+            slots.value += 1
+        plan.apply(index)
+        print(f"🧮 Worker {os.getpid()} : instance {index}, {plan.threads} thread(s), CPU {plan.cpu_sets[index % len(plan.cpu_sets)]}")
     from core.ner_agent import NERAgent
     # Chaque worker lance son propre daemon (persistent)
     print(f"🔧 Worker {os.getpid()} initialise son NER Agent...")
     ner_agent = NERAgent(use_flaubert=True)
+    suspicion_scorer = SuspicionScorer()
+
+def needs_ner(clean_w, sentence_initial, gazetteer=None, capitalization_profile=None):
+    """
+    Mot capitalisé inconnu : None s'il faut interroger le NER, sinon la réponse déjà connue
+    (True : nom confirmé par le gazetteer ou le profil de casse ; False : mot commun en début de phrase).
+    """
+    if gazetteer and gazetteer.is_entity(clean_w):
+        return True
+    if capitalization_profile is not None:
+        return capitalization_profile.decide(clean_w, sentence_initial)
+    return None
+
+def ner_candidate_lines(lines, settled_words, dictionary, gazetteer=None, capitalization_profile=None):
+    """
+    [NER Cache] Lignes routables contenant un mot capitalisé inconnu (même filtre que le routage),
+    hors mots déjà tranchés par le gazetteer ou le profil de casse.
+    """
+    from core.utils import iter_words_with_offsets
+    candidates = []
+    for line, settled in zip(lines, settled_words):
+        stripped = line.strip()
+        if len(stripped) < 20:
+            continue
+        for w, start in iter_words_with_offsets(stripped):
+            if len(w) <= 3:
+                continue
+            clean_w = w.strip(".,;:?!'\"()[]-")
+            if (clean_w and clean_w[0].isupper() and clean_w not in settled and not dictionary.validate(clean_w)
+                    and needs_ner(clean_w, is_sentence_initial(stripped, start), gazetteer,
+                                  capitalization_profile) is None):
+                candidates.append(stripped)
+                break
+    return candidates
 
 def worker_clean_chapter(task):
     """
@@ -265,23 +462,24 @@ def worker_clean_chapter(task):
     from correctors.deterministic_corrector import DeterministicCorrector
     from correctors.semantic_corrector import SemanticCorrector
     from core.dictionary import FrenchDictionary
-    from core.knowledge_manager import KnowledgeManager
+    from core.smart_rule_applicator import SmartRuleApplicator
     from core.text_processor import TextProcessor
+    from core.utils import iter_words_with_offsets
     # [V8] Modules Immunitaires
     from core.immune_system import ImmuneSystem
     from core.macrophage import Macrophage
 
     # On récupère l'agent global
-    global ner_agent
+    global ner_agent, suspicion_scorer, promoted_rules, gazetteer
     
     # Init autres agents (Singletons ou légers)
     corrector = DeterministicCorrector()
     semantic = SemanticCorrector() # Singleton
     if task.get('log_path'):
         semantic.log_path = task['log_path']
+        semantic.log_per_worker = True # Fichier partiel par processus, fusionné par process_epub
     
     dictionary = FrenchDictionary()
-    knowledge = KnowledgeManager()
     immune = ImmuneSystem()
     macro = Macrophage()
     
@@ -289,9 +487,26 @@ def worker_clean_chapter(task):
     if ner_agent is None:
         from core.ner_agent import NERAgent
         ner_agent = NERAgent(use_flaubert=True)
+    if suspicion_scorer is None:
+        suspicion_scorer = SuspicionScorer()
+    # [Rule Promotion] Règles promues de la KB : chargées une fois par worker
+    if promoted_rules is None or promoted_rules.rules_path != task['promoted_rules_path']:
+        promoted_rules = SmartRuleApplicator(task['promoted_rules_path'], dictionary=dictionary)
+    promoted_rules.context_stats = dict.fromkeys(promoted_rules.context_stats, 0)
     
     html_content = task['content']
     repeated_texts = task['repeated_texts']
+    # [Entity Index] Index NER du chapitre (pré-passe de process_epub) : Guardians et routage
+    entity_index = task.get('entity_index')
+    NerGuardian.use_entity_index(entity_index)
+    # [Gazetteer] Noms confirmés de la série : consultés avant tout appel NER / Mistral
+    if task.get('gazetteer') is not None and (gazetteer is None or gazetteer.db_path != task['gazetteer'].db_path
+                                             or gazetteer.series != task['gazetteer'].series):
+        gazetteer = task['gazetteer']
+    NerGuardian.use_gazetteer(gazetteer)
+    # [Capitalization Profile] Statistiques de casse du livre : le NER ne voit que les profils ambigus
+    capitalization_profile = task.get('capitalization_profile')
+    NerGuardian.use_capitalization_profile(capitalization_profile)
     
     # Reproduction de la logique de clean_html_content (simplifiée pour le worker)
     text = TextProcessor.extract_from_html(html_content)
@@ -308,12 +523,29 @@ def worker_clean_chapter(task):
     # On applique la digestion sur chaque mot identifié par regex (préserve la ponctuation)
     cleaned_text = re.sub(r'\b\p{L}+\b' if False else r'\b\w+\b', lambda m: macro.digest(m.group(0)), cleaned_text)
 
+    # 3. [Rule Promotion] Règles promues de la KB, en une passe par ligne avant le routage LLM
+    lines = cleaned_text.split('\n')
+    settled_words = []
+    for i, line in enumerate(lines):
+        lines[i], settled = promoted_rules.apply_context_rules(line)
+        settled_words.append(settled)
+    cleaned_text = '\n'.join(lines)
+
     # Note: 'ner_agent' est déjà initialisé (global)
     
     if semantic._model:
-        lines = cleaned_text.split('\n')
+        # [NER Cache] Les lignes qui poseront une question au NER (absentes de l'index du chapitre)
+        # partent en lots avant le routage
+        ner_agent.prefetch(
+            line for line in ner_candidate_lines(lines, settled_words, dictionary, gazetteer, capitalization_profile)
+            if entity_index is None or entity_index.line_offset(line) is None
+        )
+
         final_lines = []
-        for line in lines:
+        # [Batching] Lignes à envoyer au LLM, groupées par mode (normal / fièvre)
+        llm_indices = {False: [], True: []}
+        llm_targets = {False: [], True: []}
+        for line, settled in zip(lines, settled_words):
             stripped = line.strip()
             if not stripped or len(stripped) < 20:
                 final_lines.append(line)
@@ -324,50 +556,81 @@ def worker_clean_chapter(task):
                 final_lines.append(line)
                 continue
 
-            unknown_count = 0
+            unknown_words = []
             word_count = len(words)
-            temp_line = stripped
-            for w in words:
+            # Les mots réglés par les règles promues ne sont plus sondés dans la KB ni envoyés au LLM
+            for w, start in iter_words_with_offsets(stripped):
+                if len(w) <= 3:
+                    continue
                 clean_w = w.strip(".,;:?!'\"()[]-")
-                if not dictionary.validate(clean_w):
+                if clean_w not in settled and not dictionary.validate(clean_w):
                     # [V8.1] NER Check 🕵️‍♂️ (Via ner_agent global)
                     # Si c'est un Nom Propre (Malko, Abdi, etc.), ce n'est PAS une erreur.
                     is_proper_noun = False
                     if clean_w[0].isupper(): 
-                        # On utilise l'agent global
-                        analysis = ner_agent.analyze(clean_w, stripped)
+                        # [Gazetteer] / [Capitalization Profile] Réponse connue : aucun appel de modèle
+                        known = needs_ner(clean_w, is_sentence_initial(stripped, start), gazetteer,
+                                          capitalization_profile)
+                        if known:
+                            continue
+                        # On utilise l'agent global ([Entity Index] : index du chapitre d'abord)
+                        analysis = {} if known is False else ner_agent.analyze(
+                            clean_w, stripped, index=entity_index, start=start + w.find(clean_w))
                         if analysis.get("is_proper_noun"):
                             is_proper_noun = True
+                            if (gazetteer and analysis.get("source") == "FlauBERT (Daemon)"
+                                    and analysis.get("confidence", 0) >= MIN_SCORE):
+                                # Seules les entités du modèle NER alimentent le gazetteer : les spans de
+                                # l'index sont déjà comptés par la pré-passe, et un « oui » de Mistral
+                                # (sans type) propagerait une coquille à toute la série
+                                gazetteer.record(clean_w, analysis["type"])
                     
                     if is_proper_noun:
                         continue # On passe (Validé par NER)
 
-                    cache_hit = knowledge.lookup(clean_w, stripped)
-                    if cache_hit and cache_hit.get('can_fast_track'):
-                        temp_line = temp_line.replace(clean_w, cache_hit['mot_cible'])
-                    else:
-                        unknown_count += 1
+                    unknown_words.append(clean_w)
+            unknown_count = len(unknown_words)
             
             # [V8] Calcul de la "Fièvre" (Taux d'erreur)
             unknown_ratio = unknown_count / word_count if word_count > 0 else 0
             fever_mode = unknown_ratio > 0.15 # Si + de 15% de mots inconnus -> Fièvre
             
-            if unknown_count > 0:
-                corrected = semantic.correct_segment(line, fever_mode=fever_mode)
-                final_lines.append(corrected)
-            elif temp_line != stripped:
-                final_lines.append(temp_line)
-            else:
-                final_lines.append(line)
+            # [Suspicion Gate] Le score combiné (LM caractères + inconnus + OCR) confirme le routage
+            if unknown_count > 0 and suspicion_scorer.should_correct(stripped, unknown_ratio):
+                llm_indices[fever_mode].append(len(final_lines))
+                llm_targets[fever_mode].append(unknown_words)
+            final_lines.append(line)
+
+        for fever_mode, indices in llm_indices.items():
+            if not indices:
+                continue
+            corrected = semantic.correct_spans(
+                [final_lines[i] for i in indices], llm_targets[fever_mode], fever_mode=fever_mode
+            )
+            for i, corrected_line in zip(indices, corrected):
+                final_lines[i] = corrected_line
+        suspicion_scorer.flush_decisions()
         cleaned_text = '\n'.join(final_lines)
 
-    return TextProcessor.rebuild_html(cleaned_text, html_content)
+    # Les processus du pool se terminent sans atexit : on vide le tampon à chaque chapitre
+    semantic.flush_session_log()
+    if gazetteer:
+        gazetteer.flush()
+
+    # [Backoff] Les compteurs par niveau remontent au processus principal avec le chapitre
+    return TextProcessor.rebuild_html(cleaned_text, html_content), promoted_rules.context_stats
 
 
 if __name__ == "__main__":
+    import os
     import sys
+    # [Span-Window] --span-radius N : fenêtres de N mots autour des inconnus (0 : ligne entière)
+    if "--span-radius" in sys.argv:
+        position = sys.argv.index("--span-radius")
+        os.environ["SCRINIUM_SPAN_RADIUS"] = sys.argv[position + 1] if position + 1 < len(sys.argv) else "0"
+        del sys.argv[position:position + 2]
     if len(sys.argv) < 3:
-        print("Usage: python epub_cleaner_complete.py <input.epub> <output.epub> [limit]")
+        print("Usage: python epub_cleaner_complete.py <input.epub> <output.epub> [limit] [--span-radius N]")
         sys.exit(1)
     
     cleaner = CompleteEPUBCleaner(sys.argv[1])
@@ -21,3 +21,629 @@ def test_dictionary_basic():
     d = FrenchDictionary()
     assert d.validate("maison") or not os.path.exists("dictionnaire_francais.pkl")
     assert d.validate("d'un")
+
+def test_text_processor_word_windows():
+    text = "Il marchait lentement vers la rnaison et puis le cbat le suivait."
+    # Fenêtres de 1 mot autour de chaque inconnu, fusionnées si elles se touchent
+    spans = TextProcessor.find_word_windows(text, ["rnaison", "cbat"], radius=1)
+    assert [text[s:e] for s, e in spans] == ["la rnaison et", "le cbat le"]
+    spans = TextProcessor.find_word_windows(text, ["rnaison", "cbat"], radius=2)
+    assert [text[s:e] for s, e in spans] == ["vers la rnaison et puis le cbat le suivait."]
+
+def test_suspicion_scorer_ranks_damaged_lines(tmp_path):
+    from core.suspicion_scorer import SuspicionScorer
+    corpus = tmp_path / "livre_CLEAN.txt"
+    corpus.write_text("Malko regarda la mer sans dire un mot, le visage fermé.\n" * 50, encoding="utf-8")
+    scorer = SuspicionScorer(model_path=str(tmp_path / "model.npz"),
+                             corpus_glob=str(tmp_path / "*_CLEAN.txt"),
+                             routing_log_path=str(tmp_path / "routing.jsonl"))
+    clean = "Malko regarda la mer sans dire un mot, le visage fermé."
+    damaged = "Ma1ko rcgarda 1a rner s@ns d1re un rnot."
+    assert scorer.score(damaged, unknown_ratio=0.5) > scorer.score(clean)
+    assert scorer.should_correct(damaged, unknown_ratio=0.5)
+    assert not scorer.should_correct(clean)
+    # Seuil par défaut : un seul mot inconnu sur dix suffit à router une ligne saine pour le modèle
+    assert scorer.should_correct("Malko regarda la rner sans dire un mot, le visage.", unknown_ratio=0.1)
+    scorer.flush_decisions()
+    assert len((tmp_path / "routing.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+
+def test_ratio_exceeds_matches_sequence_matcher():
+    from difflib import SequenceMatcher
+    from core.similarity import ratio_exceeds
+    words = ["miliciens", "militaires", "militiens", "pomme", "poire", "chéri", "cheri",
+             "traduit", "conduit", "rnaison", "maison", "a", "", "somalie", "sommalie"]
+    for a in words:
+        for b in words:
+            for threshold in (0.6, 0.8):
+                assert ratio_exceeds(a, b, threshold) == (SequenceMatcher(None, a, b).ratio() > threshold)
+
+def test_session_log_writer_batches_and_merges(tmp_path):
+    import json
+    from core.session_log_writer import SessionLogWriter
+    log_path = str(tmp_path / "session.jsonl")
+    writer = SessionLogWriter(log_path, batch_size=1000, flush_interval=60, per_worker=True)
+    for i in range(5):
+        writer.write({"key": f"k{i}", "timestamp": f"2026-01-01T00:00:0{4 - i}"})
+    writer.flush()
+    assert os.path.exists(writer.target_path) and not os.path.exists(log_path)
+    writer.close()
+
+    assert SessionLogWriter.merge_parts(log_path) == 5
+    with open(log_path, encoding="utf-8") as f:
+        keys = [json.loads(line)["key"] for line in f]
+    assert keys == ["k4", "k3", "k2", "k1", "k0"]  # Ordre chronologique
+    assert not os.path.exists(writer.target_path)
+
+    # Une fois fermé, le hook atexit ne retient plus l'écrivain
+    import gc
+    import weakref
+    ref = weakref.ref(writer)
+    del writer
+    gc.collect()
+    assert ref() is None
+
+def test_knowledge_manager_indexed_store(tmp_path):
+    import json
+    from core.knowledge_manager import KnowledgeManager
+    from core.utils import get_composite_key
+    kb_path = tmp_path / "kb.jsonl"
+    key = get_composite_key("rnaison", "la rnaison est vide")
+    kb_path.write_text(json.dumps({"key": key, "mot_source": "rnaison", "mot_cible": "maison",
+                                   "count": 2, "confidence": 1.0}) + "\n", encoding="utf-8")
+    km = KnowledgeManager(kb_path=str(kb_path))
+    assert km.lookup("rnaison", "la rnaison est vide")["can_fast_track"]
+    assert km.get_precedents("Une rnaison ici")[0]["mot_cible"] == "maison"
+
+    # Les workers ouvrent le même index en lecture seule, sans réimport
+    reader = KnowledgeManager(kb_path=str(kb_path), read_only=True)
+    assert reader.read_only and reader.lookup("rnaison", "la rnaison est vide")["mot_cible"] == "maison"
+
+def test_knowledge_store_ranks_precedents(tmp_path):
+    from core.knowledge_store import KnowledgeStore
+    store = KnowledgeStore(str(tmp_path / "kb.sqlite"))
+    store.upsert_many([
+        {"key": "lavenue|a", "mot_source": "lavenue", "mot_cible": "l'avenue", "contexte_brut": "il scruta lavenue vide"},
+        {"key": "rnaison|a", "mot_source": "rnaison", "mot_cible": "maison", "contexte_brut": "la rnaison est vide"},
+    ])
+    assert store.find_precedents("Malko scruta lavenue", k=1)[0]["mot_cible"] == "l'avenue"
+    # Mise à jour incrémentale : la nouvelle version de l'entrée remplace ses anciens termes
+    store.upsert({"key": "lavenue|a", "mot_source": "lavenue", "mot_cible": "l'avenue", "contexte_brut": "au bout de lavenue"})
+    assert store.find_precedents("scruta", k=3) == []
+    assert store.find_precedents("au bout", k=1)[0]["key"] == "lavenue|a"
+
+def test_line_keys_match_composite_key_and_disambiguate():
+    from core.utils import LineKeys, get_composite_key, iter_words_with_offsets
+    line = "Il vit la rnaison, puis la rnaison brula."
+    keys = LineKeys(line)
+    targets = [(w.strip(".,"), o) for w, o in iter_words_with_offsets(line) if w.startswith("rnaison")]
+    first, second = keys.keys(targets)
+    assert first == get_composite_key("rnaison", line)
+    assert second == "rnaison|puis+la+___+brula"
+    assert keys.keys()[0] == "il|___+vit+la"
+
+def test_consolidate_all_is_incremental(tmp_path):
+    import json
+    from tools.consolidate_memory import consolidate_all
+    from core.knowledge_manager import KnowledgeManager
+    entry = {"key": "poximité|par+la+___+de+l", "mot_source": "poximité", "mot_cible": "proximité"}
+    for name in ("session_a.jsonl", "session_b.jsonl"):
+        (tmp_path / name).write_text(json.dumps(entry) + "\n", encoding="utf-8")
+
+    assert consolidate_all(str(tmp_path), workers=2) == (1, 1)
+    assert consolidate_all(str(tmp_path)) == (0, 0)  # Sessions déjà fusionnées (manifeste)
+    with open(tmp_path / "session_b.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    assert consolidate_all(str(tmp_path)) == (0, 1)  # Seule la nouvelle ligne est fusionnée
+
+    hit = KnowledgeManager(kb_path=str(tmp_path / "master_kb.jsonl")).store.get(entry["key"])
+    assert hit["count"] == 3 and hit["confidence"] == 1.0
+
+def test_knowledge_manager_backoff_levels(tmp_path):
+    import json
+    from core.knowledge_manager import KnowledgeManager
+    entries = [
+        {"key": "rnaison|la+belle+___+est+vide", "mot_source": "rnaison", "mot_cible": "maison", "count": 2},
+        {"key": "rnaison|une+petite+___+au+bord", "mot_source": "rnaison", "mot_cible": "maison", "count": 1},
+    ]
+    kb_path = tmp_path / "kb.jsonl"
+    kb_path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+    km = KnowledgeManager(kb_path=str(kb_path))
+
+    assert km.lookup("rnaison", "la belle rnaison est vide")["match_level"] == 0
+    hit = km.lookup("rnaison", "toute la belle rnaison est pleine")  # Fenêtre ±1 seulement
+    assert hit["match_level"] == 1 and hit["mot_cible"] == "maison"
+    hit = km.lookup("Rnaison", "Rnaison inconnue ici")  # Mot seul (3 vues), casse reportée
+    assert hit["match_level"] == 2 and hit["mot_cible"] == "Maison"
+    assert km.report_lookup_stats()["window1"]["hits"] == 1
+
+def test_kb_record_round_trip_shares_contexts():
+    from core.kb_record import KBRecord, StringTable
+    contexts = StringTable()
+    context = "Les indigènes avaient beau prétendre que leur climat était adouci par la poximité de l'océan."
+    entries = [
+        {"key": "poximité|par+la+___+de+l", "mot_source": "poximité", "mot_cible": "proximité",
+         "contexte_brut": context, "timestamp": "2026-01-19T07:56:52.870886", "confidence": 1.0, "count": 2},
+        {"key": "indigènes|les+___+avaient+beau", "mot_source": "indigènes", "mot_cible": "indigènes",
+         "contexte_brut": context, "timestamp": "2026-01-19T07:56:52.870901", "confidence": 0.5, "count": 1,
+         "source": "ner"},
+    ]
+    records = [KBRecord.from_entry(e, contexts) for e in entries]
+    assert len(contexts) == 1 and records[0].context_id == records[1].context_id
+    assert isinstance(records[0].timestamp_us, int)
+    assert [r.to_entry(contexts) for r in records] == entries
+
+def test_promoted_kb_rules_apply_in_bulk(tmp_path):
+    import json
+    from core.knowledge_manager import KnowledgeManager
+    from core.smart_rule_applicator import SmartRuleApplicator
+    entries = [
+        {"key": "rnaison|la+belle+___+est+vide", "mot_source": "rnaison", "mot_cible": "maison", "count": 2},
+        {"key": "rnaison|une+petite+___+au+bord", "mot_source": "rnaison", "mot_cible": "maison", "count": 1},
+        {"key": "poximité|par+la+___+de+l", "mot_source": "poximité", "mot_cible": "proximité", "confidence": 0.5},
+    ]
+    kb_path = tmp_path / "kb.jsonl"
+    kb_path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+    km = KnowledgeManager(kb_path=str(kb_path))
+    assert km.rules_are_stale()
+    km.promote_rules()
+    assert not km.rules_are_stale()
+
+    class NoWords:
+        def validate(self, word):
+            return False
+
+    app = SmartRuleApplicator(km.promoted_rules_path, dictionary=NoWords())
+    line, settled = app.apply_context_rules("Une rnaison close, la belle rnaison est vide par la poximité de l'eau.")
+    # Mot seul (3 vues) ; fenêtre exacte ; entrée faible (une vue, confiance 0.5) ignorée
+    assert line == "Une maison close, la belle maison est vide par la poximité de l'eau."
+    assert settled == {"maison"}
+    assert app.context_stats["exact"] == 1 and app.context_stats["word"] == 1
+    # Sans contexte, un mot à majuscule reste protégé (NerGuardian)
+    assert app.apply_context_rules("Rnaison close.")[0] == "Rnaison close."
+
+def test_defender_daemon_coalesces_pipelined_segments():
+    from collections import deque
+    from core.defender_daemon import next_group
+    pending = deque([
+        {"id": 1, "command": "correct_segment", "text": "a"},
+        {"id": 2, "command": "correct_segment", "text": "b", "fever_mode": True},
+        {"id": 3, "command": "correct_segment", "text": "c"},
+        {"id": 4, "command": "save_stats"},
+        {"id": 5, "command": "correct_segment", "text": "d"},
+    ])
+    # Même fever_mode regroupé, l'autre mode garde sa place, save_stats fait barrière
+    assert [r["id"] for r in next_group(pending, limit=8)] == [1, 3]
+    assert [r["id"] for r in next_group(pending, limit=8)] == [2]
+    assert [r["id"] for r in next_group(pending, limit=8)] == [4]
+    assert [r["id"] for r in next_group(pending, limit=8)] == [5]
+
+def test_daemon_protocol_frames_round_trip():
+    import socket
+    from core.daemon_protocol import CODEC_JSON, recv_frame, send_frame
+    left, right = socket.socketpair()
+    try:
+        request = {"id": 7, "command": "correct_batch", "texts": ["Le dient a signé.", "l'œil"]}
+        send_frame(left, request)
+        send_frame(left, {"id": 8, "command": "ping"}, codec=CODEC_JSON)
+        assert recv_frame(right) == request
+        assert recv_frame(right, with_codec=True) == ({"id": 8, "command": "ping"}, CODEC_JSON)
+        left.close()
+        assert recv_frame(right) is None  # Connexion fermée
+    finally:
+        right.close()
+
+class FakeDefenderDaemon:
+    """
+    Daemon de test sur socket Unix, avec l'interface de subprocess.Popen utilisée par DefenderAgent.
+    mode 'ok' : corrige en majuscules ; 'crash' : coupe la connexion à la première correction ;
+    'hang' : ne répond plus aux corrections et signale un modèle occupé au ping.
+    """
+
+    def __init__(self, socket_path, mode="ok"):
+        import os
+        import socket
+        import threading
+        self.mode, self.busy_since, self.returncode = mode, None, None
+        self.connections = []
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Comme defender_daemon : socket périmé d'un daemon tué
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        import threading
+        while self.returncode is None:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        import time
+        from core.daemon_protocol import recv_frame, send_frame
+        try:
+            while True:
+                request = recv_frame(conn)
+                if request is None:
+                    return
+                if request["command"] == "ping":
+                    busy = time.time() - self.busy_since if self.busy_since else 0.0
+                    send_frame(conn, {"id": request["id"], "status": "ok", "data": {"pong": True, "busy": busy}})
+                elif self.mode == "crash":
+                    return self.kill()
+                elif self.mode == "hang":
+                    self.busy_since = self.busy_since or time.time()
+                else:
+                    send_frame(conn, {"id": request["id"], "status": "ok", "data": request["text"].upper()})
+        except OSError:
+            pass
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        import socket
+        self.returncode = -9
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)  # Réveille accept() : plus aucune connexion acceptée
+        except OSError:
+            pass
+        self.server.close()
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    terminate = kill
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+
+def fake_defender_agent(modes, **kwargs):
+    """DefenderAgent dont les daemons lancés sont des FakeDefenderDaemon (un mode par lancement)."""
+    from core.defender_agent import DefenderAgent
+
+    class Agent(DefenderAgent):
+        def _launch(self, socket_path):
+            launched.append(FakeDefenderDaemon(socket_path, modes.pop(0)))
+            return launched[-1]
+
+    launched = []
+    return Agent(**kwargs), launched
+
+
+def wait_until(condition, timeout=5.0):
+    import time
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_defender_failover_replays_on_standby():
+    agent, launched = fake_defender_agent(["crash", "ok", "ok"], standby=True, request_timeout=5, max_retries=1)
+    try:
+        assert wait_until(lambda: agent._standby is not None)
+        assert agent.correct_segment("le chat") == "LE CHAT"  # Rejouée sur le standby promu
+        assert agent.failovers == 1 and launched[0].poll() is not None
+        assert wait_until(lambda: agent._standby is not None)  # Nouveau standby en chargement
+    finally:
+        agent.close()
+
+
+def test_defender_does_not_replay_by_default():
+    agent, launched = fake_defender_agent(["crash", "crash", "ok"], standby=True, request_timeout=5)
+    try:
+        assert wait_until(lambda: agent._standby is not None)
+        # Requête empoisonnée : elle tue le daemon actif, mais pas le standby promu à sa place
+        assert agent.send_command("correct_segment", {"text": "le chat"}) is None
+        assert agent.failovers == 1 and launched[1].poll() is None
+    finally:
+        agent.close()
+
+
+def test_defender_restarts_dead_daemon_in_background():
+    import time
+    agent, launched = fake_defender_agent(["ok", "ok"], request_timeout=5)
+    try:
+        launch = agent._launch
+        agent._launch = lambda socket_path: time.sleep(0.3) or launch(socket_path)
+        launched[0].kill()
+        assert wait_until(lambda: agent._sock is None)
+        start = time.monotonic()
+        future = agent.submit("correct_segment", {"text": "le chat"})
+        assert time.monotonic() - start < 0.2  # Pas de relancement dans le thread appelant
+        assert future.result(timeout=5)["data"] == "LE CHAT"  # Envoyée une fois le nouveau daemon prêt
+        assert len(launched) == 2
+    finally:
+        agent.close()
+
+
+def test_defender_watchdog_kills_hung_daemon():
+    agent, launched = fake_defender_agent(["hang", "ok", "ok"], standby=True, request_timeout=5, max_retries=1,
+                                          heartbeat_interval=0.05, hang_timeout=0.2)
+    try:
+        assert wait_until(lambda: agent._standby is not None)
+        assert agent.correct_segment("la souris") == "LA SOURIS"
+        assert agent.failovers == 1 and launched[0].poll() is not None
+    finally:
+        agent.close()
+
+
+def test_defender_watchdog_neither_restarts_nor_pins_the_agent():
+    import gc
+    import time
+    import weakref
+    agent, launched = fake_defender_agent(["ok", "ok"], heartbeat_interval=0.05)
+    launched[0].kill()
+    assert wait_until(lambda: agent._sock is None)
+    time.sleep(0.3)  # Plusieurs battements sans daemon : aucun relancement depuis le watchdog
+    assert len(launched) == 1
+    ref = weakref.ref(agent)
+    del agent
+    gc.collect()
+    assert ref() is None  # Ni le watchdog ni le lecteur ne retiennent l'agent
+
+def test_llama_server_model_maps_completion_responses():
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from core.llama_server import LlamaServerModel
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append(body)
+            if body["prompt"] == "lent":
+                time.sleep(0.5)
+                status, reply = 200, {"content": "trop tard"}
+            elif body["prompt"] == "panne":
+                status, reply = 500, {"error": "slot indisponible"}
+            else:
+                status, reply = 200, {
+                    "content": "Le chat boit.", "stopped_word": True, "tokens_evaluated": 12, "tokens_predicted": 4,
+                    "completion_probabilities": [{"content": "Le", "logprob": -0.1},
+                                                 {"content": " chat", "probs": [{"tok_str": " chat", "prob": 0.5}]}],
+                }
+            data = json.dumps(reply).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        model = LlamaServerModel(f"http://127.0.0.1:{server.server_port}", timeout=5)
+        out = model("Le cbat boit.", max_tokens=8, stop=["\n"], temperature=0.1, logprobs=1)
+        choice = out["choices"][0]
+        assert choice["text"] == "Le chat boit." and choice["finish_reason"] == "stop"
+        assert choice["logprobs"]["token_logprobs"] == pytest.approx([-0.1, -0.6931], abs=1e-4)
+        assert out["usage"] == {"prompt_tokens": 12, "completion_tokens": 4}
+        assert requests[0]["n_predict"] == 8 and requests[0]["stop"] == ["\n"] and requests[0]["n_probs"] == 1
+        with pytest.raises(RuntimeError, match="HTTP 500"):
+            model("panne")
+        assert not model.health()  # GET non géré par le serveur de test : 501
+        # Timeout : la génération a pu avoir lieu, la requête n'est pas renvoyée
+        count = len(requests)
+        with pytest.raises(OSError):
+            LlamaServerModel(f"http://127.0.0.1:{server.server_port}", timeout=0.2)("lent")
+        time.sleep(0.8)  # Une reprise serait lue par le serveur après la première requête
+        assert len(requests) == count + 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_cluster_factory_streams_chunks_in_order():
+    import io
+    from core.cluster_orchestrator import ChunkScheduler, ClusterFactory
+
+    scheduler = ChunkScheduler(2)
+    for i in range(3):
+        scheduler.put(i)
+    scheduler.close()
+    # Worker 1 vide son deque puis vole la fin de celui du worker 0
+    assert [scheduler.get(1), scheduler.get(1), scheduler.get(0)] == [1, 2, 0]
+
+    class FlakyAgent:
+        def __init__(self, fail_first):
+            self.fail_first = fail_first
+        def send_command(self, command, payload=None, timeout=None, retries=None):
+            if self.fail_first:
+                self.fail_first = False
+                return None  # Daemon tombé : le bloc repart sur un autre worker
+            return {"status": "ok", "data": [t.upper() for t in payload["texts"]]}
+
+    factory = ClusterFactory(num_workers=2, min_chunk_lines=2, max_pending_chunks=2)
+    factory.agents = [FlakyAgent(True), FlakyAgent(False)]
+    lines = [f"ligne {i}\n" if i % 5 else "\n" for i in range(40)]
+    out = io.StringIO()
+    assert factory.process_stream(lines, out, total_lines=len(lines)) > 1
+    assert out.getvalue() == "".join(lines).upper()
+
+def test_cluster_factory_sizes_chunks_and_timeouts_from_latency():
+    import io
+    import time
+    from core.cluster_orchestrator import ClusterFactory
+
+    class SlowAgent:
+        def __init__(self):
+            self.calls = []
+        def send_command(self, command, payload=None, timeout=None, retries=None):
+            self.calls.append((len(payload["texts"]), timeout))
+            if len(self.calls) == 1:
+                time.sleep(timeout)
+                return None  # Timeout : le temps écoulé sert de borne basse
+            return {"status": "ok", "data": payload["texts"]}
+
+    factory = ClusterFactory(num_workers=1, min_chunk_lines=2, max_chunk_lines=50, chunk_retries=1,
+                             target_chunk_seconds=1.0, line_timeout=0.02, min_chunk_timeout=0.05)
+    factory.agents = [agent := SlowAgent()]
+    samples = []
+    record = factory._record_latency
+    factory._record_latency = lambda seconds, lines: (samples.append((seconds, lines)), record(seconds, lines))
+    # Sans mesure : premier bloc de min_chunk_lines lignes, timeout proportionnel
+    assert factory._chunk_size() == 2
+    assert factory._chunk_timeout(10) == pytest.approx(0.2)
+    lines = [f"ligne {i}\n" for i in range(6)]
+    out = io.StringIO()
+    factory.process_stream(lines, out, total_lines=len(lines))
+    assert out.getvalue() == "".join(lines)
+    assert agent.calls[0] == (2, pytest.approx(0.05))
+    assert samples[0][0] >= 0.05 and samples[0][1] == 2
+    assert len(samples) == 4  # Le timeout, puis les trois blocs corrigés
+
+def test_resource_planner_splits_physical_cores():
+    from core.resource_planner import ENV_CPUS, ENV_THREADS, plan_resources
+    # 8 cœurs physiques hyperthreadés (0/8, 1/9, ...) : les frères restent dans la même instance
+    groups = [[i, i + 8] for i in range(8)]
+    plan = plan_resources(requested=3, groups=groups)
+    assert (plan.instances, plan.threads) == (3, 2)
+    assert plan.cpu_sets[1] == [2, 3, 10, 11]
+    env = plan.env(1, base={})
+    assert env[ENV_THREADS] == "2" and env[ENV_CPUS] == "2,3,10,11"
+    # Pas assez de cœurs pour la demande : au moins 2 threads par instance
+    assert plan_resources(requested=16, groups=groups).instances == 4
+    assert plan_resources(shared=True, groups=groups).threads == 8
+
+def test_ner_agent_caches_and_batches_line_entities():
+    from collections import OrderedDict
+    from core.ner_agent import NERAgent
+    agent = object.__new__(NERAgent)  # Sans daemon ni Mistral : _query_daemon remplacé
+    agent._entity_cache, agent.daemon_process = OrderedDict(), True
+    agent.cache_stats = {"hits": 0, "misses": 0, "requests": 0}
+    agent.BATCH_LINES, agent.CACHE_SIZE = 2, 3
+    calls = []
+
+    def query(texts):
+        calls.append(list(texts))
+        return [[{"word": text, "entity_group": "PER", "score": 0.99}] for text in texts]
+
+    agent._query_daemon = query
+    results = agent.entities_batch(["Malko", "Abdi", "Malko", "Krisantem", "Elko"])
+    assert calls == [["Malko", "Abdi"], ["Krisantem", "Elko"]]  # Dédupliquées, par lots de BATCH_LINES
+    assert [r[0]["word"] for r in results] == ["Malko", "Abdi", "Malko", "Krisantem", "Elko"]
+    assert agent.cache_stats["misses"] == 4 and len(agent._entity_cache) == 3  # Malko évincé (LRU)
+
+    assert agent.entities("Abdi")[0]["word"] == "Abdi" and len(calls) == 2  # Succès de cache
+    agent.entities("Sophie")  # Évince Krisantem, le moins récemment utilisé
+    assert agent.entities_batch(["Abdi", "Elko"]) and len(calls) == 3
+    agent.entities("Krisantem")
+    assert calls[-1] == ["Krisantem"]
+
+    def dead(texts):
+        agent.daemon_process = None
+        return None
+
+    agent._query_daemon = dead
+    assert agent.entities_batch(["Inconnu", "Abdi"]) == [None, [{"word": "Abdi", "entity_group": "PER", "score": 0.99}]]
+    assert agent.prefetch(["Autre"]) == 1 and agent.entities("Autre") is None
+
+def test_entity_index_bisect_lookup_and_guardian():
+    from core.entity_index import EntityIndex, pack_sentences
+    from core.ner_guardian import NerGuardian
+    text = "Malko arriva à Mogadiscio. Personne ne l'attendait.\n  Puis Abdi entra."
+    segments = pack_sentences(text, 30)
+    assert all(end - start <= 30 for start, end in segments)
+    assert "".join(text[s:e] for s, e in segments).replace(" ", "") == text.replace(" ", "").replace("\n", "")
+    spans = [(0, 5, "PER", 0.99), (15, 25, "LOC", 0.97), (text.index("Abdi"), text.index("Abdi") + 4, "PER", 0.6)]
+    index = EntityIndex(text, spans)
+    assert index.entity_at(15, 18) == "LOC" and index.entity_at(5, 15) is None
+    assert index.lookup("Puis Abdi entra.", 5, 9) is False  # Score sous le seuil
+    assert index.lookup("Ligne modifiée depuis", 0, 5) is None
+
+    guardian = NerGuardian()
+    try:
+        NerGuardian.use_entity_index(index)
+        line = "Malko arriva à Mogadiscio. Personne ne l'attendait."
+        assert not guardian.is_safe_to_touch("Malko", "", line=line, start=0)
+        # Majuscule de début de phrase, pas une entité selon le NER : modifiable
+        assert guardian.is_safe_to_touch("Personne", "Mogadiscio.", line=line, start=27)
+        assert not guardian.is_safe_to_touch("Personne", "Mogadiscio.")  # Sans position : prudence
+    finally:
+        NerGuardian.use_entity_index(None)
+
+def test_gazetteer_confirms_series_entities(tmp_path):
+    from core.gazetteer import Gazetteer
+    db = str(tmp_path / "gazetteer.sqlite")
+    first = Gazetteer(db, series="SAS", book="Tome 1")
+    first.record_many([("Malko", "PER")] * 3 + [("Mogadiscio", "LOC")])
+    first.record("pierre", "PER")  # Minuscule : pas une observation de nom propre
+    assert first.is_entity("d'Malko") and not first.is_entity("Mogadiscio")  # Sous le seuil
+    first.flush()
+
+    second = Gazetteer(db, series="SAS", book="Tome 2")
+    assert second.lookup("MALKO")["type"] == "PER" and second.lookup("pierre") is None
+    assert second.is_entity("Malko") and not second.is_entity("malko")
+    assert Gazetteer(db, series="OSS 117").lookup("Malko") is None  # Autre série
+    second.record("Malko", "PER")
+    second.flush()
+    assert Gazetteer(db, series="SAS").lookup("Malko")["books"] == 2
+
+
+def test_antibody_learner_spares_entities_of_any_series(tmp_path, monkeypatch):
+    from core.antibody_learning import AntibodyLearner
+    from core.gazetteer import Gazetteer
+    monkeypatch.chdir(tmp_path)  # Chemins par défaut (data/knowledge/...) dans le dossier temporaire
+    sas = Gazetteer(series="SAS", book="Tome 1")
+    sas.record_many([("Malko", "PER")] * 3)
+    sas.flush()
+    learner = AntibodyLearner()  # Comme Arena : gazetteer par défaut, sans série
+    assert learner._is_toxic("malko") is False
+    assert learner.gazetteer.lookup_any_series("Malko")["type"] == "PER"
+
+def test_capitalization_profile_settles_proper_nouns():
+    from core.capitalization_profile import CapitalizationProfile, is_sentence_initial
+    from core.ner_guardian import NerGuardian
+    profile = CapitalizationProfile.from_texts([
+        "Malko regarda Abdi. Puis Malko sortit avec Abdi.\nIl ne vit personne, car personne ne venait.",
+        "Personne ne répondit à Malko. « Personne ? » demanda Abdi, puis il partit avec Pierre et la pierre.",
+        "Il lança une pierre vers Pierre.",
+    ])
+    assert profile.verdict("Malko") is True and profile.verdict("d'Abdi") is True
+    assert profile.verdict("Personne") is False
+    assert profile.verdict("Pierre") is None  # Profil mixte : le NER tranchera
+    assert profile.decide("Personne", sentence_initial=True) is False
+    assert profile.decide("Personne", sentence_initial=False) is None
+    assert is_sentence_initial("Il dit : Personne", 9) and not is_sentence_initial("Il vit Personne", 7)
+
+    guardian = NerGuardian()
+    try:
+        NerGuardian.use_capitalization_profile(profile)
+        assert not guardian.is_safe_to_touch("Malko", "regarda")
+        assert guardian.is_safe_to_touch("Personne", "venait.")
+        assert not guardian.is_safe_to_touch("Pierre", "")  # Ambigu : prudence
+    finally:
+        NerGuardian.use_capitalization_profile(None)
+
+def test_capitalization_profile_quotes_do_not_open_sentences():
+    from core.capitalization_profile import CapitalizationProfile, is_sentence_initial
+    from core.ner_guardian import NerGuardian
+    # Guillemet fermant en milieu de phrase : le mot suivant reste en milieu de phrase
+    profile = CapitalizationProfile.from_texts([
+        'Il entra au "bar" Hilton puis au " bar " Hilton.',
+        "« Arrête ! » Malko recula. Il cria : « Malko ! »",
+    ])
+    assert profile.counts["hilton"] == [2, 0, 0]
+    assert profile.counts["malko"][2] == 2  # Après « Arrête ! » et après « ouvrant une phrase
+    assert not is_sentence_initial('Il dit "oui" Personne', 13) and is_sentence_initial('Il partit. " Personne', 13)
+
+    guardian = NerGuardian()
+    try:
+        NerGuardian.use_capitalization_profile(CapitalizationProfile.from_texts(["il ne vit personne, personne ne vint."]))
+        line = 'Il dit "oui" Personne ne bouge.'
+        assert not guardian.is_safe_to_touch("Personne", '"oui"', line=line, start=13)
+        assert guardian.is_safe_to_touch("Personne", '»', line="« Vas-y. » Personne ne bouge.", start=11)
+    finally:
+        NerGuardian.use_capitalization_profile(None)
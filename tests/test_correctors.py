@@ -34,3 +34,196 @@ def test_weird_characters(corrector):
     assert corrector.correct("Ÿn") == "Mn"
     assert corrector.correct("chaufŒ") == "chauff"
     assert corrector.correct("Œ isolé") == "Oe isolé"
+
+
+class FakeModel:
+    """Modèle factice (interface llama_cpp.Llama) : renvoie les sorties prévues dans l'ordre, garde les prompts."""
+
+    def __init__(self, *outputs):
+        self.outputs = list(outputs)
+        self.prompts = []
+
+    def __call__(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return {"choices": [{"text": self.outputs.pop(0)}]}
+
+
+@pytest.fixture
+def semantic(tmp_path, monkeypatch):
+    """SemanticCorrector isolé (hors singleton), sans modèle, KB ni gardiens."""
+    from correctors.semantic_corrector import SemanticCorrector
+    monkeypatch.chdir(tmp_path)  # Logs et KB par défaut (data/knowledge/...) dans le dossier temporaire
+    instance = object.__new__(SemanticCorrector)
+    instance.__init__(model_path=[])
+    instance.knowledge = instance.dictionary = instance.guardian = instance.rule_applicator = None
+    yield instance
+    if instance.log_writer:
+        instance.log_writer.close()
+
+
+def use_model(instance, *outputs):
+    model = FakeModel(*outputs)
+    instance._model = model
+    instance._tiers = [("fake", model)]
+    return model
+
+
+def test_semantic_corrector_opens_knowledge_read_only(tmp_path, monkeypatch):
+    from core.knowledge_manager import KnowledgeManager
+    from correctors.semantic_corrector import SemanticCorrector
+    monkeypatch.chdir(tmp_path)
+    KnowledgeManager()  # Le parent crée l'index ; workers et daemons ne font que le lire
+    instance = object.__new__(SemanticCorrector)
+    instance.__init__(model_path=[])
+    try:
+        assert instance.knowledge.read_only
+        assert instance.knowledge.upsert_entries([{"key": "k", "mot_cible": "maison"}]) == 0
+    finally:
+        if instance.log_writer:
+            instance.log_writer.close()
+
+
+def test_parse_numbered_output_tolerates_chatter_and_duplicates():
+    from correctors.semantic_corrector import SemanticCorrector
+    raw = "Voici les lignes corrigées :\n2) deux\n[1] un\n2. doublon\n4. hors borne\nBonne lecture !"
+    assert SemanticCorrector._parse_numbered_output(raw, 3) == {1: "un", 2: "deux"}
+
+
+def test_correct_segments_retries_only_unparsed_items(semantic):
+    model = use_model(semantic, "Bien sûr !\n3. le chien\n1. le chat\n3. doublon\nFin.", "la souris")
+    assert semantic.correct_segments(["le cbat", "la sourls", "le chein"]) == ["le chat", "la souris", "le chien"]
+    # Un appel groupé, puis un appel unitaire pour le seul numéro manquant
+    assert len(model.prompts) == 2 and "Entrée: la sourls" in model.prompts[1]
+
+
+def test_batch_respects_suspicion_threshold(semantic):
+    model = use_model(semantic, "1. le chat\n2. la souris")
+    semantic.suspicion_threshold = 0.1
+    assert semantic.correct_segments(["le cbat", "la maison", "la sourls"], suspicion_scores=[0.3, 0.05, 0.2]) == \
+        ["le chat", "la maison", "la souris"]
+    assert "la maison" not in model.prompts[0]  # Ligne jugée saine : pas envoyée au LLM
+
+
+def test_edit_script_keeps_original_spacing():
+    from correctors.semantic_corrector import SemanticCorrector
+    text = "Le  cbat\tboit du lait."
+    assert SemanticCorrector._apply_edit_script(text, {1: "chat"}) == "Le  chat\tboit du lait."  # Remplacement
+    assert SemanticCorrector._apply_edit_script(text, {3: ""}) == "Le  cbat\tboit lait."  # Suppression
+    assert SemanticCorrector._apply_edit_script(text, {0: "Le gros"}) == "Le gros  cbat\tboit du lait."  # Insertion
+    assert SemanticCorrector._apply_edit_script(text, {9: "hors"}) == text  # Index hors bornes ignoré
+    assert SemanticCorrector._parse_edit_script("1=chat\n3 : \nFIN\n4=ignoré") == {1: "chat", 3: ""}
+    assert SemanticCorrector._parse_edit_script("FIN") == {}
+    assert SemanticCorrector._parse_edit_script('{"1": "chat"}') is None
+
+
+def test_malformed_edit_script_falls_back_to_full_text(semantic):
+    semantic.output_mode = "edits"
+    model = use_model(semantic, '{"edits": [{"1": "chat"}]}', "Le chat boit.")
+    assert semantic.correct_segment("Le cbat boit.") == "Le chat boit."
+    assert "Entrée: Le cbat boit." in model.prompts[1]  # Prompt complet, pas de mots numérotés
+
+
+def test_edit_script_escalates_through_tiers(semantic):
+    semantic.output_mode = "edits"
+    small, large = FakeModel("1=chot\nFIN"), FakeModel("1=chat\nFIN")
+    semantic._model, semantic._tiers = large, [("small", small), ("large", large)]
+    semantic._tier_accepts = lambda original, corrected, output, fever_mode=False: "chot" not in corrected
+    assert semantic.correct_segment("Le  cbat\tboit.") == "Le  chat\tboit."
+    assert len(small.prompts) == len(large.prompts) == 1
+    assert semantic.tier_stats["large"]["accepted"] == 1
+
+
+def test_logic_guards_lowercase_in_place(semantic):
+    class Vocabulary:
+        def validate(self, word):
+            return word.islower()
+
+    semantic.dictionary = Vocabulary()
+    text = "La  Lune\tbrille. « Puis\nla Mer, dit-il."
+    # Début de ligne, après ponctuation forte (guillemet compris) : majuscule gardée ; espacements intacts
+    assert semantic._apply_logic_guards(text, text) == "La  lune\tbrille. « Puis\nla mer, dit-il."
+
+
+def test_span_windows_fall_back_to_whole_segment(semantic):
+    semantic.span_radius = 1
+    model = use_model(semantic, "1. il boit du\n2. Le chat dort.")
+    # Ligne 1 : fenêtre autour de 'bolt' ; ligne 2 : mot ciblé introuvable -> segment entier
+    assert semantic.correct_spans(["Le chat il bolt du lait", "Le cbat dort."], [["bolt"], ["cbat,"]]) == \
+        ["Le chat il boit du lait", "Le chat dort."]
+    assert "1. il bolt du" in model.prompts[0] and "2. Le cbat dort." in model.prompts[0]
+
+
+def test_span_corrections_are_guarded_and_logged_on_whole_line(semantic):
+    from core.utils import LineKeys
+
+    class Vocabulary:
+        def validate(self, word):
+            return word.islower()
+
+    semantic.span_radius, semantic.dictionary = 1, Vocabulary()
+    use_model(semantic, "Lune brille ce")
+    line = "Il regarde la Lune brlle ce soir."
+    # 'Lune' ouvre la fenêtre mais pas la phrase : le garde-fou la voit en milieu de ligne
+    assert semantic.correct_spans([line], [["brlle"]]) == ["Il regarde la lune brille ce soir."]
+    [entry] = semantic.session_log
+    assert (entry["mot_source"], entry["mot_cible"], entry["contexte_brut"]) == ("brlle", "brille", line)
+    assert entry["key"] == LineKeys(line).key_for("brlle", line.index("brlle"))
+
+
+def test_tier_accepts_checks_safety_vocabulary_and_logprobs(semantic):
+    class Vocabulary:
+        def validate(self, word):
+            return word in {"chat", "boit", "lait"}
+
+    def output(*logprobs):
+        return {"choices": [{"logprobs": {"token_logprobs": [None, *logprobs]}}]}
+
+    assert semantic._tier_accepts("Le cbat boit.", "Le chat boit.", output(-0.1, -0.3))
+    assert not semantic._tier_accepts("Le cbat boit.", "", output(-0.1))
+    assert not semantic._tier_accepts("Le cbat boit.", "Le chat boit.", output(-2.0, -1.0))  # Modèle hésitant
+    assert semantic._tier_accepts("Le cbat boit.", "Le chat boit.", None)  # Sans log-probs : pas de veto
+    semantic.dictionary = Vocabulary()
+    assert not semantic._tier_accepts("Le cbat boit.", "Le chot boit.", output(-0.1))  # Mot inconnu restant
+
+
+def test_cascade_keeps_text_when_last_tier_output_is_unparsed(semantic):
+    small, large = FakeModel("1. le chot\n2. la soris"), FakeModel("Désolé.")
+    semantic._model, semantic._tiers = large, [("small", small), ("large", large)]
+    semantic._tier_accepts = lambda *args: False  # Le petit palier escalade tout
+    assert semantic.correct_segments(["le cbat", "la sourls"]) == ["le cbat", "la sourls"]
+    assert len(large.prompts) == 1  # Pas de nouveau passage dans la cascade
+
+
+def test_split_to_fit_keeps_separators(semantic):
+    base = semantic._count_tokens(semantic._build_prompt(""))
+    semantic.n_ctx = base + 200 + semantic.gen_margin_tokens + int(20 * (1 + semantic.gen_margin_ratio)) + 1
+    long_sentence = " ".join(["mot"] * 60) + "."
+    text = f"Une phrase courte. Une autre.\n  Ligne   suivante,\tavec espaces.  {long_sentence}\nFin."
+    spans = semantic._split_to_fit(text)
+    assert len(spans) > 3
+    assert all("\n" not in text[s:e] for s, e in spans)
+    assert all(semantic._count_tokens(text[s:e]) <= 20 for s, e in spans)
+    # Les morceaux corrigés sont recollés avec les séparateurs d'origine
+    semantic.correct_segments = lambda chunks, **kwargs: [chunk.upper() for chunk in chunks]
+    assert semantic._correct_oversize(text) == text.upper()
+
+
+def test_pack_batches_respects_budget_and_count(semantic):
+    assert semantic._generation_budget(100) == int(100 * semantic.gen_margin_ratio) + semantic.gen_margin_tokens
+    pending = [(i, f"ligne {i}", f"ligne {i}") for i in range(5)] + [(5, "deux\nlignes", "deux\nlignes")]
+    semantic.batch_max_segments = 2
+    assert [[item[0] for item in batch] for batch in semantic._pack_batches(pending)] == [[0, 1], [2, 3], [5], [4]]
+    semantic.batch_max_segments = 16
+    semantic.n_ctx = semantic._count_tokens(semantic._build_batch_prompt([])) + 200 + 30  # ~1 ligne par lot
+    assert all(len(batch) == 1 for batch in semantic._pack_batches(pending))
+
+
+def test_remote_model_token_counts_are_estimated(semantic):
+    class RemoteModel(FakeModel):
+        remote = True
+
+        def tokenize(self, text, add_bos=True):
+            raise AssertionError("aucun appel /tokenize attendu")
+
+    semantic._model = RemoteModel()
+    assert semantic._count_tokens("Le chat boit du lait.") == semantic._estimate_tokens("Le chat boit du lait.")
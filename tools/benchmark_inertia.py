@@ -0,0 +1,64 @@
+import glob
+import json
+import os
+import re
+import sys
+import time
+from difflib import SequenceMatcher
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.similarity import ratio_exceeds
+
+def tokenize(text):
+    """Même tokenisation que SemanticCorrector._is_safe_correction."""
+    return set(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+def load_cases(pattern="data/knowledge/session_*.jsonl"):
+    """Reconstruit des paires (original, corrigé) à partir des logs de session enregistrés."""
+    cases = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                original = entry.get("contexte_brut", "")
+                src, tgt = entry.get("mot_source", ""), entry.get("mot_cible", "")
+                if original and src and src in original:
+                    cases.append((original, original.replace(src, tgt, 1)))
+    return cases
+
+def benchmark(pattern="data/knowledge/session_*.jsonl"):
+    """
+    Rejoue le Principe d'Inertie (mot original x mot corrigé) sur les logs de session :
+    compare les décisions SequenceMatcher et celles du noyau rapide, puis les temps.
+    """
+    cases = load_cases(pattern)
+    pairs = []
+    for original, corrected in cases:
+        orig_tokens, corr_tokens = tokenize(original), tokenize(corrected)
+        for word in orig_tokens:
+            if len(word) > 3 and word not in corr_tokens:
+                pairs.extend((word, c_word) for c_word in corr_tokens)
+    print(f"📂 {len(cases)} corrections rejouées, {len(pairs)} paires comparées.")
+
+    for threshold in (0.8, 0.6):
+        start = time.time()
+        reference = [SequenceMatcher(None, a, b).ratio() > threshold for a, b in pairs]
+        t_ref = time.time() - start
+
+        ratio_exceeds.cache_clear()
+        start = time.time()
+        fast = [ratio_exceeds(a, b, threshold) for a, b in pairs]
+        t_fast = time.time() - start
+
+        mismatches = sum(1 for r, f in zip(reference, fast) if r != f)
+        print(f"\n⚓ Seuil {threshold} (Fièvre={threshold < 0.8})")
+        print(f"   SequenceMatcher : {t_ref:.3f}s")
+        print(f"   Noyau rapide    : {t_fast:.3f}s (x{t_ref / max(t_fast, 1e-9):.1f})")
+        print(f"   Décisions divergentes : {mismatches}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,127 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.kb_record import KBRecord, StringTable
+from core.knowledge_store import KnowledgeStore
+from core.utils import LineKeys
+
+LETTERS = "abcdefghijklmnopqrstuvwxyzéèàç"
+
+
+def synthetic_entries(n, seed=0, vocab_size=50000, entries_per_context=2):
+    """
+    KB synthétique réaliste : phrases d'une trentaine de mots (~170 caractères) partagées
+    par plusieurs corrections, clés composites, horodatages ISO et confiances.
+    """
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 10))) for _ in range(vocab_size)]
+    start = datetime(2026, 1, 19, 7, 56, 18)
+    context = ""
+    words = []
+    for i in range(n):
+        if i % entries_per_context == 0:
+            words = [rng.choice(vocab) for _ in range(30)]
+            context = " ".join(words).capitalize() + "."
+        position = rng.randrange(len(words))
+        source = words[position]
+        yield {
+            "key": LineKeys(context).key_for(source, None) + f"#{i}",
+            "mot_source": source,
+            "mot_cible": source[:-1] + rng.choice(LETTERS),
+            "contexte_brut": context,
+            "timestamp": (start + timedelta(microseconds=i * 1731)).isoformat(),
+            "confidence": rng.choice((0.5, 1.0)),
+        }
+
+
+def measure(label, build):
+    """Temps et mémoire Python allouée (tracemalloc) pour construire une structure."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    result = build()
+    elapsed = time.time() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label:<28} {elapsed:7.2f}s  {current / 1e6:9.1f} Mo")
+    return result, current
+
+
+def benchmark(n_entries=1_000_000, n_lookups=100_000, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="kb_bench_")
+    jsonl_path = os.path.join(workdir, "synthetic_kb.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for entry in synthetic_entries(n_entries):
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"📂 KB synthétique : {n_entries} entrées, {os.path.getsize(jsonl_path) / 1e6:.0f} Mo ({jsonl_path})")
+
+    def load_dicts():
+        with open(jsonl_path, encoding="utf-8") as f:
+            return {e["key"]: e for e in map(json.loads, f)}
+
+    def load_records():
+        contexts = StringTable()
+        with open(jsonl_path, encoding="utf-8") as f:
+            records = {}
+            for line in f:
+                record = KBRecord.from_entry(json.loads(line), contexts)
+                records[record.key] = record
+        return records, contexts
+
+    print("\n🧠 Chargement en mémoire (par processus worker)")
+    dicts, dict_bytes = measure("dict par entrée", load_dicts)
+    keys = list(dicts)
+    del dicts
+    (records, contexts), record_bytes = measure("KBRecord + table de contextes", load_records)
+    print(f"   Gain mémoire : x{dict_bytes / max(record_bytes, 1):.1f} ({len(contexts)} contextes distincts)")
+
+    rng = random.Random(1)
+    sample = [rng.choice(keys) for _ in range(n_lookups)]
+    start = time.time()
+    for key in sample:
+        records[key].to_entry(contexts)
+    print(f"   Lookup + reconstruction  : {(time.time() - start) / n_lookups * 1e6:.2f} µs/entrée")
+    del records, contexts
+
+    print("\n🗂️ Store SQLite (index partagé entre workers)")
+    store = KnowledgeStore(os.path.join(workdir, "synthetic_kb.sqlite"))
+    start = time.time()
+    store.sync_from_jsonl(jsonl_path)
+    print(f"   Import complet           : {time.time() - start:7.2f}s, "
+          f"{os.path.getsize(store.db_path) / 1e6:.0f} Mo sur disque")
+
+    start = time.time()
+    reader = KnowledgeStore(store.db_path, read_only=True)
+    len(reader)
+    print(f"   Ouverture lecture seule  : {(time.time() - start) * 1e3:.2f} ms")
+    batches = [sample[i:i + 8] for i in range(0, min(len(sample), 20000), 8)]
+    start = time.time()
+    for batch in batches:
+        reader.get_many(batch)
+    print(f"   Lookup par ligne (8 clés): {(time.time() - start) / len(batches) * 1e3:.3f} ms/ligne")
+
+    queries = [reader.get(key)["contexte_brut"] for key in sample[:200]]
+    start = time.time()
+    for query in queries:
+        reader.find_precedents(query, 3)
+    print(f"   Précédents (top-3)       : {(time.time() - start) / len(queries) * 1e3:.2f} ms/requête")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark mémoire/lookup de la KB (entrées synthétiques).")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+    benchmark(args.entries, args.lookups, args.workdir)
@@ -0,0 +1,86 @@
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.llama_server import LlamaServerModel, LlamaServerProcess
+
+SAMPLE_LINES = [
+    "Le dient a signé le contrat sans rnême le lire jusqu'au bout.",
+    "Il marchait lentement vers la rnaison et puis le cbat le suivait.",
+    "Les indigènes avaient beau prétendre que leur climat était adouci par la poximité de l'océan.",
+    "Malko regarda l'bomme qui se tenait devant la porte, immobile.",
+    "Elle n'avait jamais vu un tel spectade de toute sa vie.",
+    "La voiture s'arrêta brusquernent au milieu de la route déserte.",
+    "Il faudrait prévenir la police avant qu'il ne soit trop tard.",
+    "Le soleil se couchait derrière les collines, rougeoyant comme une braise.",
+]
+
+PROMPT = "[INST] Corrige les fautes OCR du texte suivant. Renvoie UNIQUEMENT le texte corrigé.\n{text} [/INST]"
+
+
+def run_load(model, lines, concurrency):
+    """Envoie toutes les lignes avec `concurrency` requêtes en vol ; débit et latence moyenne."""
+    latencies = []
+    generated = 0
+
+    def one(line):
+        start = time.time()
+        out = model(PROMPT.format(text=line), max_tokens=len(line) // 2 + 16, stop=["\n", "[/INST]"],
+                    temperature=0.1)
+        return time.time() - start, out["usage"]["completion_tokens"]
+
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, tokens in executor.map(one, lines):
+            latencies.append(latency)
+            generated += tokens
+    elapsed = time.time() - start
+    return {
+        "lines_per_s": len(lines) / elapsed,
+        "tokens_per_s": generated / elapsed,
+        "avg_latency": sum(latencies) / len(latencies),
+    }
+
+
+def benchmark(model_path=None, url=None, batch_sizes=(1, 2, 4, 8), n_lines=64):
+    """
+    [Model Server] Débit en fonction de la taille de lot (séquences parallèles du serveur).
+    Avec --url, un serveur existant est mesuré tel quel (ses slots bornent le lot effectif) ;
+    avec --model, un llama-server est lancé pour chaque taille de lot (--parallel = taille).
+    """
+    lines = [SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(n_lines)]
+    print(f"📊 Model Server : {n_lines} lignes par mesure")
+    print(f"   {'lot':>4} {'lignes/s':>10} {'tokens/s':>10} {'latence':>9} {'gain':>6}")
+    baseline = None
+    for batch in batch_sizes:
+        server = None
+        try:
+            if url:
+                model = LlamaServerModel(url)
+            else:
+                server = LlamaServerProcess(model_path, parallel=batch).start()
+                model = LlamaServerModel(server.url)
+            model(PROMPT.format(text=lines[0]), max_tokens=4) # Chauffe (prompt en cache)
+            stats = run_load(model, lines, batch)
+        finally:
+            if server:
+                server.stop()
+        baseline = baseline or stats["lines_per_s"]
+        print(f"   {batch:>4} {stats['lines_per_s']:>10.2f} {stats['tokens_per_s']:>10.1f} "
+              f"{stats['avg_latency']:>8.2f}s {stats['lines_per_s'] / baseline:>5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit du serveur de modèle partagé selon la taille de lot.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--model", help="Modèle GGUF (un llama-server est lancé par taille de lot)")
+    group.add_argument("--url", help="llama-server déjà lancé (ex: http://127.0.0.1:8080)")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--lines", type=int, default=64)
+    args = parser.parse_args()
+    benchmark(args.model, args.url, [int(b) for b in args.batch_sizes.split(",")], args.lines)
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.resource_planner import ResourcePlan, configured_threads, core_groups, pin_from_env, plan_resources
+from tools.benchmark_model_server import PROMPT, SAMPLE_LINES
+
+
+def run_instance(model_path, n_lines):
+    """Processus enfant : une instance llama.cpp réglée par l'environnement, débit mesuré en lignes/s."""
+    pin_from_env()
+    from llama_cpp import Llama
+    threads = configured_threads()
+    model = Llama(model_path=model_path, n_ctx=2048, n_threads=threads, n_threads_batch=threads, verbose=False)
+    model(PROMPT.format(text=SAMPLE_LINES[0]), max_tokens=4) # Chauffe
+    generated = 0
+    start = time.time()
+    for i in range(n_lines):
+        line = SAMPLE_LINES[i % len(SAMPLE_LINES)]
+        out = model(PROMPT.format(text=line), max_tokens=len(line) // 2 + 16, stop=["\n", "[/INST]"],
+                    temperature=0.1)
+        generated += out["usage"]["completion_tokens"]
+    elapsed = time.time() - start
+    print(json.dumps({"lines": n_lines, "tokens": generated, "elapsed": elapsed}))
+
+
+def run_plan(model_path, plan, n_lines):
+    """Lance les instances du plan en même temps ; débit agrégé (toutes instances confondues)."""
+    processes = [
+        subprocess.Popen([sys.executable, __file__, "--child", "--model", model_path, "--lines", str(n_lines)],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=plan.env(i))
+        for i in range(plan.instances)
+    ]
+    results = []
+    for process in processes:
+        out, _ = process.communicate()
+        if process.returncode != 0 or not out.strip():
+            raise RuntimeError(f"instance en échec (code {process.returncode})")
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    slowest = max(r["elapsed"] for r in results)
+    return {
+        "lines_per_s": sum(r["lines"] for r in results) / slowest,
+        "tokens_per_s": sum(r["tokens"] for r in results) / slowest,
+    }
+
+
+def candidate_plans(groups, max_instances=None):
+    """Toutes les répartitions régulières des cœurs physiques : 1 x N, 2 x N/2, ..., N x 1."""
+    cores = len(groups)
+    plans = []
+    for instances in range(1, min(cores, max_instances or cores) + 1):
+        threads = cores // instances
+        cpu_sets = [sorted(cpu for group in groups[i * threads:(i + 1) * threads] for cpu in group)
+                    for i in range(instances)]
+        plans.append(ResourcePlan(instances, threads, cpu_sets, "candidat"))
+    return plans
+
+
+def benchmark(model_path, n_lines=16, max_instances=None):
+    """
+    [Resource Planner] Compare le débit agrégé de chaque répartition instances x threads avec
+    celle retenue par plan_resources() (la RAM borne aussi le nombre d'instances).
+    """
+    groups = core_groups()
+    chosen = plan_resources(model_path)
+    print(f"📊 Thread Scaling : {len(groups)} cœur(s) physique(s), {n_lines} lignes par instance")
+    print(f"   Plan retenu : {chosen.describe()}")
+    print(f"   {'instances':>9} {'threads':>8} {'lignes/s':>10} {'tokens/s':>10}")
+    best = None
+    # Au-delà du plan aussi (jusqu'à 1 thread par instance, tant que la RAM suit) : le plan doit gagner
+    limit = max_instances or plan_resources(model_path, min_threads=1).instances
+    for plan in candidate_plans(groups, limit):
+        stats = run_plan(model_path, plan, n_lines)
+        mark = " ◀ plan" if (plan.instances, plan.threads) == (chosen.instances, chosen.threads) else ""
+        print(f"   {plan.instances:>9} {plan.threads:>8} {stats['lines_per_s']:>10.2f} {stats['tokens_per_s']:>10.1f}{mark}")
+        if best is None or stats["lines_per_s"] > best[1]:
+            best = (plan, stats["lines_per_s"])
+    if best:
+        verdict = "✅" if (best[0].instances, best[0].threads) == (chosen.instances, chosen.threads) else "⚠️"
+        print(f"{verdict} Meilleur débit mesuré : {best[0].instances} x {best[0].threads}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit agrégé selon la répartition instances x threads.")
+    parser.add_argument("--model", default="models/mistral-7b-instruct-v0.3.Q4_K_M.gguf")
+    parser.add_argument("--lines", type=int, default=16)
+    parser.add_argument("--max-instances", type=int, help="Défaut : autant que la RAM le permet (1 thread minimum)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_instance(args.model, args.lines)
+    else:
+        benchmark(args.model, args.lines, args.max_instances)
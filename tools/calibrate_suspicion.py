@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.suspicion_scorer import SuspicionScorer
+
+def calibrate(log_path="data/audit/suspicion_routing.jsonl", retrain=False):
+    """
+    Ré-entraîne (optionnel) le modèle n-grammes et résume les décisions de routage
+    enregistrées, pour choisir le seuil du SuspicionScorer.
+    """
+    scorer = SuspicionScorer()
+    if retrain:
+        scorer.train()
+
+    if not os.path.exists(log_path):
+        print(f"Aucune décision enregistrée ({log_path}).")
+        return
+
+    decisions = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                decisions.append(json.loads(line))
+
+    routed = sum(1 for d in decisions if d.get("routed"))
+    print(f"\n📊 {len(decisions)} décisions, {routed} envoyées au LLM ({routed / max(1, len(decisions)) * 100:.1f}%)")
+
+    # Histogramme des scores (pas de 0.1) et part de lignes routées par seuil candidat
+    buckets = [0] * 11
+    for d in decisions:
+        buckets[min(10, int(d["score"] * 10))] += 1
+    for i, count in enumerate(buckets):
+        print(f"   {i / 10:.1f} | {'#' * min(60, count)} {count}")
+
+    print("\nSeuil -> lignes envoyées au LLM")
+    for threshold in (0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5):
+        kept = sum(1 for d in decisions if d["score"] >= threshold)
+        print(f"   {threshold:.2f} -> {kept} ({kept / max(1, len(decisions)) * 100:.1f}%)")
+
+    # Lignes limites à relire pour ajuster le seuil
+    print("\nLignes proches du seuil actuel :")
+    borderline = sorted(decisions, key=lambda d: abs(d["score"] - scorer.threshold))[:10]
+    for d in borderline:
+        print(f"   [{d['score']:.3f}] {d['text'][:100]}")
+
+if __name__ == "__main__":
+    calibrate(retrain="--retrain" in sys.argv)
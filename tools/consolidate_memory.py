@@ -1,58 +1,179 @@
+import concurrent.futures
+import glob
 import json
 import os
 import sys
+from datetime import datetime
+
+# Ajout du root au path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.knowledge_manager import KnowledgeManager
+from core.kb_record import KBRecord, StringTable
+
+MANIFEST_NAME = "consolidation_manifest.json"
+
+
+def map_session(session_path, start_offset=0):
+    """
+    [Map] Agrège un log de session à partir d'un offset (octets) :
+    {clé: KBRecord de la première entrée vue, `count` = occurrences}, avec sa table
+    de contextes (format compact, moins coûteux à renvoyer au processus principal).
+    Retourne aussi l'offset de fin (une ligne incomplète est laissée pour la prochaine fois).
+    """
+    partial = {}
+    contexts = StringTable()
+    end_offset = start_offset
+    with open(session_path, 'rb') as f:
+        f.seek(start_offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # Ligne en cours d'écriture
+            end_offset += len(raw)
+            line = raw.decode('utf-8').strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            key = entry.get('key')
+            if not key:
+                continue
+            if key in partial:
+                partial[key].count += 1
+            else:
+                record = partial[key] = KBRecord.from_entry(entry, contexts)
+                record.count = 1
+    return session_path, (partial, contexts), end_offset
+
+
+def reduce_partials(partials):
+    """
+    [Reduce] Fusionne les agrégats dans l'ordre des sessions (la première entrée vue est gardée) :
+    {clé: [occurrences, entrée]}.
+    """
+    merged = {}
+    for partial, contexts in partials:
+        for key, record in partial.items():
+            if key in merged:
+                merged[key][0] += record.count
+            else:
+                merged[key] = [record.count, record.to_entry(contexts)]
+    return merged
+
+
+def apply_counts(km, merged):
+    """
+    Upsert incrémental dans la KB : le compteur s'ajoute aux vues déjà connues.
+    Nouvelle entrée : confiance 0.5 ; vue 2 fois ou plus : 1.0 (Fast-Trackable).
+    """
+    existing = km.store.get_many(merged.keys())
+    updates = []
+    new_entries = updated_entries = 0
+    for key, (occurrences, entry) in merged.items():
+        if key in existing:
+            target = existing[key]
+            target['count'] = target.get('count', 1) + occurrences
+            updated_entries += occurrences
+        else:
+            target = dict(entry)
+            target['count'] = occurrences
+            new_entries += 1
+            updated_entries += occurrences - 1
+        target['confidence'] = 1.0 if target['count'] >= 2 else 0.5
+        updates.append(target)
+    km.upsert_entries(updates)
+    return new_entries, updated_entries
+
 
 def consolidate(session_path, master_path):
+    """Consolide un log de session complet dans la Master KB (sans manifeste)."""
     if not os.path.exists(session_path):
         print(f"No session log found at {session_path}")
         return
 
     print(f"Consolidating {session_path} into {master_path}...")
-    
-    # Load master to memory
-    master_data = {}
-    if os.path.exists(master_path):
-        with open(master_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    entry = json.loads(line)
-                    master_data[entry['key']] = entry
-
-    new_entries = 0
-    updated_entries = 0
-    
-    if os.path.exists(session_path):
-        with open(session_path, 'r', encoding='utf-8') as f_sess:
-            for line in f_sess:
-                if line.strip():
-                    entry = json.loads(line)
-                    key = entry['key']
-                    
-                    if key in master_data:
-                        # On incrémente le compteur
-                        master_data[key].setdefault('count', 1)
-                        master_data[key]['count'] += 1
-                        # Si vu 2 fois, la confiance passe à 1.0 (Fast-Trackable)
-                        if master_data[key]['count'] >= 2:
-                            master_data[key]['confidence'] = 1.0
-                        updated_entries += 1
-                    else:
-                        # Nouvelle entrée : confiance initiale 0.5 (Nécessite 2 vues pour Fast-Track)
-                        entry['count'] = 1
-                        entry['confidence'] = 0.5
-                        master_data[key] = entry
-                        new_entries += 1
-
-    # Réécriture complète de la Master KB (plus propre pour les mises à jour)
-    with open(master_path, 'w', encoding='utf-8') as f_mast:
-        for entry in master_data.values():
-            f_mast.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    km = KnowledgeManager(kb_path=master_path)
+    _, partial, _ = map_session(session_path)
+    new_entries, updated_entries = apply_counts(km, reduce_partials([partial]))
+    print(f"Success: {new_entries} new, {updated_entries} updated corrections in Master KB.")
+
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"sessions": {}}
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def consolidate_all(knowledge_dir="data/knowledge", master_path=None, workers=None, compaction_ratio=2.0):
+    """
+    [KB Consolidation] Consolide en parallèle tous les logs de session non encore fusionnés.
+    - Le manifeste retient, par session, l'offset déjà fusionné : un log qui a grandi
+      n'apporte que ses nouvelles lignes, un log inchangé est ignoré.
+    - Map (un processus par fichier) -> Reduce (comptes) -> upsert incrémental dans l'index,
+      les entrées modifiées étant ajoutées au journal JSONL.
+    - Compaction du journal seulement quand il dépasse compaction_ratio × le nombre de clés.
+    - Promotion des entrées stables en règles contextuelles (KnowledgeManager.promote_rules).
+    """
+    master_path = master_path or os.path.join(knowledge_dir, "master_kb.jsonl")
+    manifest_path = os.path.join(knowledge_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    merged_sessions = manifest.setdefault("sessions", {})
+
+    pending = []
+    for path in sorted(glob.glob(os.path.join(knowledge_dir, "session_*.jsonl"))):
+        name = os.path.basename(path)
+        offset = merged_sessions.get(name, {}).get("offset", 0)
+        if offset > os.path.getsize(path):
+            offset = 0  # Log réécrit depuis la dernière fusion
+        if os.path.getsize(path) > offset:
+            pending.append((path, offset))
+
+    if not pending:
+        print("✅ Aucune nouvelle session à consolider.")
+        return 0, 0
+
+    print(f"🧠 Consolidation de {len(pending)} session(s) dans {master_path}...")
+    workers = workers or min(len(pending), os.cpu_count() or 1)
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(map_session, *zip(*pending)))
+    else:
+        results = [map_session(path, offset) for path, offset in pending]
+
+    km = KnowledgeManager(kb_path=master_path)
+    merged = reduce_partials(partial for _, partial, _ in results)
+    new_entries, updated_entries = apply_counts(km, merged)
+
+    now = datetime.now().isoformat()
+    for path, partial, end_offset in results:
+        name = os.path.basename(path)
+        previous = merged_sessions.get(name, {})
+        merged_sessions[name] = {
+            "offset": end_offset,
+            "entries": previous.get("entries", 0) + sum(record.count for record in partial[0].values()),
+            "merged_at": now,
+        }
+    save_manifest(manifest, manifest_path)
+
+    if km.needs_compaction(compaction_ratio):
+        print(f"🗜️ Compaction du journal : {km.compact()} entrées.")
+
+    # [Rule Promotion] Les entrées devenues stables rejoignent les règles appliquées avant le LLM
+    print(f"⚡ Promotion KB : {km.promote_rules()} règle(s) contextuelle(s).")
 
     print(f"Success: {new_entries} new, {updated_entries} updated corrections in Master KB.")
-    # Optional: Clear session log after consolidation
-    # os.remove(session_path)
+    return new_entries, updated_entries
+
 
 if __name__ == "__main__":
-    session = "data/knowledge/session_corrections.jsonl"
-    master = "data/knowledge/master_kb.jsonl"
-    consolidate(session, master)
+    consolidate_all()
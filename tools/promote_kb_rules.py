@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+
+# Ajout du root au path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.knowledge_manager import KnowledgeManager
+
+
+def promote(master_path="data/knowledge/master_kb.jsonl", rules_path=None, force=False):
+    """
+    [Rule Promotion] Compile les entrées stables de la KB en SmartRules contextuelles
+    (fenêtre exacte, fenêtre ±1, mot seul), appliquées en masse avant le routage LLM.
+    """
+    km = KnowledgeManager(kb_path=master_path)
+    if not force and not km.rules_are_stale(rules_path):
+        print("✅ Règles promues à jour.")
+        return 0
+    count = km.promote_rules(rules_path)
+    print(f"⚡ {count} règle(s) promue(s) dans {rules_path or km.promoted_rules_path}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Promotion des entrées KB stables en règles contextuelles.")
+    parser.add_argument("--kb", default="data/knowledge/master_kb.jsonl")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    promote(args.kb, args.output, args.force)